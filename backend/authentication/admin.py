@@ -2,7 +2,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
-from .models import TestUser
+from .models import TestUser, ImportJob, ImportRowError, SessionPrepJob
 
 
 class TestUserAdmin(UserAdmin):
@@ -159,3 +159,40 @@ admin.site.register(TestUser, TestUserAdmin)
 admin.site.site_header = "Administration HSE Tests"
 admin.site.site_title = "HSE Tests Admin"
 admin.site.index_title = "Tableau de bord"
+
+
+class ImportRowErrorInline(admin.TabularInline):
+    model = ImportRowError
+    extra = 0
+    can_delete = False
+    readonly_fields = ('line', 'cin', 'message')
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    """Suivi des imports Excel en arrière-plan"""
+    list_display = ('original_name', 'dry_run', 'status', 'rows_processed', 'created', 'updated', 'failed', 'created_at', 'finished_at')
+    list_filter = ('status', 'dry_run')
+    readonly_fields = (
+        'file', 'original_name', 'dry_run', 'submitted_by', 'rows_total', 'rows_processed', 'created', 'updated', 'failed',
+        'last_line', 'tries', 'error', 'created_at', 'started_at', 'finished_at'
+    )
+    inlines = [ImportRowErrorInline]
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        """Remettre en attente les imports sélectionnés (reprise après la dernière ligne validée)"""
+        updated = queryset.exclude(status='done').update(status='pending', tries=0, error='')
+        self.message_user(request, f'{updated} import(s) remis en attente.')
+    requeue.short_description = "Remettre en attente"
+
+
+@admin.register(SessionPrepJob)
+class SessionPrepJobAdmin(admin.ModelAdmin):
+    """Suivi des préparations de séance en arrière-plan"""
+    list_display = ('__str__', 'status', 'submitted_by', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = (
+        'submitted_by', 'entreprise', 'entite', 'cins', 'test_ids', 'langues', 'tries', 'error', 'result',
+        'created_at', 'started_at', 'finished_at'
+    )
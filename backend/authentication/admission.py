@@ -0,0 +1,194 @@
+# authentication/admission.py
+"""
+Contrôle d'admission de la connexion CIN + démarrage du test.
+
+Quand une salle entière scanne le QR à la même seconde, toutes les
+connexions arrivent ensemble sur MySQL. Un seau à jetons (token bucket)
+par processus limite la rafale: AUTH_ADMISSION_RATE connexions par
+seconde, avec une réserve de AUTH_ADMISSION_BURST. Une requête sans jeton
+disponible est refusée tout de suite (429) avec un délai `retry_after`:
+le worker n'est jamais bloqué à attendre, c'est le client qui réessaie.
+
+Désactivé par défaut (AUTH_ADMISSION_RATE = 0): à activer et régler avec
+`bench_induction` pour le serveur cible.
+
+Optionnellement, un seau par test (AUTH_ADMISSION_PER_TEST_RATE) évite
+qu'une salle ne prenne tous les jetons des autres. Au plus
+AUTH_ADMISSION_MAX_TESTS seaux par test sont gardés (les moins récemment
+utilisés sont oubliés). Les compteurs (admis, refusés) sont exposés par
+`snapshot()`.
+
+Les limites s'appliquent par processus: avec N workers gunicorn, le débit
+total admis est N fois AUTH_ADMISSION_RATE.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULTS = {
+    'AUTH_ADMISSION_RATE': 0,           # connexions / seconde (0 = désactivé)
+    'AUTH_ADMISSION_BURST': 40,         # jetons disponibles d'un coup
+    'AUTH_ADMISSION_PER_TEST_RATE': 0,  # seau par test (0 = désactivé)
+    'AUTH_ADMISSION_PER_TEST_BURST': 20,
+    'AUTH_ADMISSION_MAX_TESTS': 256,    # seaux par test gardés en mémoire
+}
+
+
+def _setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+class TokenBucket:
+    """Seau à jetons"""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """
+        Prend un jeton s'il y en a un. Retourne (accordé, délai en secondes
+        avant qu'un jeton ne soit disponible si refusé).
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, 0.0
+            return False, (1 - self.tokens) / self.rate
+
+    def cancel(self):
+        """Rend un jeton pris mais non utilisé"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class ScopeStats:
+    """Compteurs d'un seau (global ou par test)"""
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+
+    def as_dict(self):
+        return {
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+        }
+
+
+class AdmissionController:
+
+    def __init__(self, rate, burst, per_test_rate=0, per_test_burst=20, max_tests=256):
+        self.rate = rate
+        self.burst = burst
+        self.per_test_rate = per_test_rate
+        self.per_test_burst = per_test_burst
+        self.max_tests = max(1, max_tests)
+
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        # test_id -> (seau, compteurs), du moins au plus récemment utilisé
+        self.test_scopes = OrderedDict()
+        self.stats = ScopeStats()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.bucket is not None
+
+    def _test_scope(self, test_id):
+        with self._lock:
+            scope = self.test_scopes.get(test_id)
+            if scope is None:
+                scope = (TokenBucket(self.per_test_rate, self.per_test_burst), ScopeStats())
+                self.test_scopes[test_id] = scope
+                while len(self.test_scopes) > self.max_tests:
+                    self.test_scopes.popitem(last=False)
+            else:
+                self.test_scopes.move_to_end(test_id)
+            return scope
+
+    def admit(self, test_id=None):
+        """
+        Prend un jeton sans attendre. Retourne (admis, retry_after):
+        retry_after en secondes entières si la requête est refusée.
+        """
+        if not self.enabled:
+            return True, 0
+
+        scopes = []
+        if self.per_test_rate and test_id is not None:
+            scopes.append(self._test_scope(test_id))
+        scopes.append((self.bucket, self.stats))
+
+        taken = []
+        for bucket, stats in scopes:
+            granted, wait = bucket.take()
+            if not granted:
+                for taken_bucket in taken:
+                    taken_bucket.cancel()
+                with self._lock:
+                    stats.rejected += 1
+                return False, max(1, math.ceil(wait))
+            taken.append(bucket)
+
+        with self._lock:
+            for _bucket, stats in scopes:
+                stats.admitted += 1
+        return True, 0
+
+    def snapshot(self):
+        """Configuration et compteurs, pour l'endpoint de métriques"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'config': {
+                    'rate': self.rate,
+                    'burst': self.burst,
+                    'per_test_rate': self.per_test_rate,
+                    'per_test_burst': self.per_test_burst,
+                    'max_tests': self.max_tests,
+                },
+                'global': self.stats.as_dict(),
+                'tests': {str(test_id): stats.as_dict() for test_id, (_bucket, stats) in self.test_scopes.items()},
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Contrôleur du processus, construit depuis les settings au premier appel"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    rate=_setting('AUTH_ADMISSION_RATE'),
+                    burst=_setting('AUTH_ADMISSION_BURST'),
+                    per_test_rate=_setting('AUTH_ADMISSION_PER_TEST_RATE'),
+                    per_test_burst=_setting('AUTH_ADMISSION_PER_TEST_BURST'),
+                    max_tests=_setting('AUTH_ADMISSION_MAX_TESTS'),
+                )
+    return _controller
+
+
+@receiver(setting_changed)
+def reset_admission_controller(setting, **kwargs):
+    """override_settings des AUTH_ADMISSION_*: reconstruire le contrôleur"""
+    global _controller
+    if setting in DEFAULTS:
+        _controller = None
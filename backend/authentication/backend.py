@@ -1,8 +1,19 @@
 from django.contrib.auth.backends import BaseBackend
+from django.core.exceptions import PermissionDenied
+from django.db import transaction, IntegrityError
 from authentication.models import TestUser
+from authentication.tickets import read_qr_ticket, InvalidQRTicket
+from authentication.user_cache import get_cached_user
 
 
-class AdminBackend(BaseBackend):
+class CachedUserBackend(BaseBackend):
+    """get_user commun: utilisateur de session servi par le cache (user_cache)"""
+
+    def get_user(self, user_id):
+        return get_cached_user(user_id)
+
+
+class AdminBackend(CachedUserBackend):
     """Auth pour /admin : username + password"""
 
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -17,14 +28,42 @@ class AdminBackend(BaseBackend):
         except TestUser.DoesNotExist:
             return None
 
-    def get_user(self, user_id):
+
+class QRTicketBackend(CachedUserBackend):
+    """
+    Authentification des utilisateurs HSE via ticket QR signé + CIN.
+    Signature vérifiée sans accès base, puis une seule lecture par CIN pour
+    un compte pré-provisionné (ni hachage ni création). Un participant pas
+    encore provisionné est créé à la volée, comme avec HSEUserBackend: seul
+    un ticket invalide ou expiré est refusé.
+    """
+
+    def authenticate(self, request, cin=None, ticket=None, test_id=None, **kwargs):
+        if cin is None or ticket is None:
+            return None
+        try:
+            read_qr_ticket(ticket, test_id=test_id)
+        except InvalidQRTicket:
+            # Ne pas retomber sur HSEUserBackend avec un ticket refusé
+            raise PermissionDenied
+
         try:
-            return TestUser.objects.get(pk=user_id)
+            return TestUser.objects.get(cin=cin, user_type='user', is_active=True)
         except TestUser.DoesNotExist:
-            return None
+            pass
 
+        try:
+            with transaction.atomic():
+                user, _created = TestUser.objects.authenticate_hse_user(cin)
+        except IntegrityError:
+            # CIN déjà pris par un compte manager
+            raise PermissionDenied
+        if not user.is_active:
+            raise PermissionDenied
+        return user
 
-class HSEUserBackend(BaseBackend):
+
+class HSEUserBackend(CachedUserBackend):
     """Authentification des utilisateurs HSE via CIN uniquement."""
 
     def authenticate(self, request, cin=None, **kwargs):
@@ -36,14 +75,8 @@ class HSEUserBackend(BaseBackend):
         except Exception:
             return None
 
-    def get_user(self, user_id):
-        try:
-            return TestUser.objects.get(pk=user_id)
-        except TestUser.DoesNotExist:
-            return None
-
 
-class HSEManagerBackend(BaseBackend):
+class HSEManagerBackend(CachedUserBackend):
     """Authentification des managers HSE via nom complet + CIN."""
 
     def authenticate(self, request, full_name=None, cin=None, **kwargs):
@@ -53,9 +86,3 @@ class HSEManagerBackend(BaseBackend):
             return TestUser.objects.authenticate_manager(full_name, cin)
         except Exception:
             return None
-
-    def get_user(self, user_id):
-        try:
-            return TestUser.objects.get(pk=user_id)
-        except TestUser.DoesNotExist:
-            return None
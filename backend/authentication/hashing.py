@@ -0,0 +1,22 @@
+# authentication/hashing.py
+"""
+Hachage des mots de passe dans les processus fils de hash_passwords.
+
+Les processus sont démarrés en 'spawn': ils réimportent le module de la
+fonction à exécuter avant django.setup(). Ce module ne doit donc importer
+aucun modèle (contrairement à provisioning.py).
+"""
+import os
+
+import django
+from django.contrib.auth.hashers import make_password
+
+
+def init_hash_worker(settings_module):
+    """Configurer Django dans le processus fils avant de hacher"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def hash_chunk(raw_passwords):
+    return [make_password(raw_password) for raw_password in raw_passwords]
@@ -1,65 +1,82 @@
-import pandas as pd
-from django.db import transaction
-from authentication.models import TestUser  
+from authentication.provisioning import bulk_provision
+from hse_app.excel_cache import open_excel
 
-def importexcel(excel_file):
+REQUIRED_COLUMNS = {"cin", "full_name"}
+MISSING_COLUMNS_MESSAGE = "Le fichier doit contenir les colonnes CIN et FULL_NAME."
+CIN_MAX_LENGTH = 20
+
+
+def iter_apprenants(excel_rows, seen):
     """
-    Importer une liste d'apprenants (HSE Users) depuis un fichier Excel.
-    Le fichier doit contenir les colonnes : CIN, FULL_NAME
+    Lignes d'apprenants d'un fichier ouvert (ExcelRows, en-têtes en
+    minuscules): (ligne, cin, full_name, erreur). `erreur` est None pour
+    une ligne valide; `seen` (CIN déjà lus) écarte les doublons.
     """
-    try:
-        # Lecture du fichier Excel
-        df = pd.read_excel(excel_file)
+    for line, row in excel_rows.numbered():
+        cin = row["cin"]
+        full_name = row["full_name"]
+
+        if not cin:
+            yield line, cin, full_name, "CIN manquant"
+            continue
+        if len(cin) > CIN_MAX_LENGTH:
+            yield line, cin, full_name, f"CIN trop long ({CIN_MAX_LENGTH} caractères maximum)"
+            continue
+        if cin in seen:
+            yield line, cin, full_name, f"CIN={cin} en double"
+            continue
+        seen.add(cin)
+        yield line, cin, full_name, None
+
 
-        # Vérification des colonnes obligatoires
-        if not {"cin", "full_name"}.issubset(df.columns.str.lower()):
-            return {
-                "status": "error",
-                "message": "Le fichier doit contenir les colonnes CIN et FULL_NAME."
-            }
+def importexcel(excel_file, batch_size=500, workers=None):
+    """
+    Importer une liste d'apprenants (HSE Users) depuis un fichier Excel.
+    Le fichier doit contenir les colonnes : CIN, FULL_NAME
 
-        # Normalisation des noms de colonnes
-        df.columns = df.columns.str.lower()
+    Le fichier est lu en flux (ExcelRows, openpyxl en lecture seule), sans
+    charger tout le classeur en mémoire; un fichier déjà importé est relu
+    depuis le cache (open_excel), sans rouvrir le classeur.
 
-        created_count = 0
-        updated_count = 0
+    Import groupé: une lecture des CIN existants, hachage des mots de passe
+    en parallèle (plusieurs processus), insertions par lots (bulk_create)
+    et noms manquants complétés en une passe (bulk_update).
+    """
+    try:
         errors = []
+        rows = []
+        seen = set()
 
-        # Transaction => si une ligne pose problème, rien n'est enregistré
-        with transaction.atomic():
-            for _, row in df.iterrows():
-                cin = str(row.get("cin", "")).strip()
-                full_name = str(row.get("full_name", "")).strip()
+        # Lecture du fichier Excel (en-têtes normalisés en minuscules)
+        with open_excel(excel_file, lowercase=True, as_text=True) as excel_rows:
 
-                if not cin:
-                    errors.append(f"Ligne invalide : CIN manquant")
-                    continue
+            # Vérification des colonnes obligatoires
+            if not REQUIRED_COLUMNS.issubset(excel_rows.headers):
+                return {
+                    "status": "error",
+                    "message": MISSING_COLUMNS_MESSAGE
+                }
 
-                try:
-                    # Vérifier si l'utilisateur existe déjà
-                    user = TestUser.objects.filter(cin=cin).first()
+            for line, cin, full_name, error in iter_apprenants(excel_rows, seen):
+                if error:
+                    errors.append(f"Ligne {line} ignorée : {error}")
+                    continue
+                rows.append((cin, full_name))
 
-                    if user:
-                        # Mise à jour du nom complet si vide
-                        if not user.full_name and full_name:
-                            user.full_name = full_name
-                            user.save()
-                            updated_count += 1
-                        else:
-                            # L'utilisateur existe déjà → ne pas recréer
-                            updated_count += 1
-                    else:
-                        # Création d'un nouvel apprenant (user_type='user')
-                        TestUser.objects.create_hse_user(cin=cin, full_name=full_name)
-                        created_count += 1
+        # Transaction => si l'insertion échoue, rien n'est enregistré
+        result = bulk_provision(rows, batch_size=batch_size, workers=workers)
 
-                except Exception as e:
-                    errors.append(f"Erreur ligne CIN={cin} : {str(e)}")
+        for cin in result["skipped"]:
+            errors.append(f"Erreur ligne CIN={cin} : compte non créé (nom d'utilisateur déjà pris)")
 
         return {
             "status": "success",
-            "created": created_count,
-            "updated": updated_count,
+            "created": result["created"],
+            "updated": result["existing"],
+            "full_names_completed": result["updated"],
+            "rows": len(rows),
+            "duration_seconds": result["duration_seconds"],
+            "rows_per_second": result["rows_per_second"],
             "errors": errors
         }
 
@@ -0,0 +1,365 @@
+# authentication/import_jobs.py
+"""
+Imports Excel d'apprenants en arrière-plan.
+
+L'import synchrone (importexcel) hache les mots de passe et insère tout le
+fichier pendant la requête: un gros fichier dépasse le délai du serveur et
+garde la transaction ouverte longtemps. Ici la requête enregistre le
+fichier dans un ImportJob et répond tout de suite; un worker (commande
+`process_imports`, file d'attente en base comme les soumissions) lit le
+fichier en flux et le traite par lots de `chunk_size` lignes.
+
+Chaque lot est validé séparément (bulk_provision, une courte transaction),
+puis la progression du job est enregistrée: lignes traitées, comptes créés
+ou existants, lignes en erreur (table ImportRowError). Un job repris après
+l'arrêt d'un worker recommence après la dernière ligne validée. Le
+fichier n'est analysé qu'une fois (open_excel): reprise, application d'un
+aperçu ou nouvel envoi du même fichier relisent le cache.
+
+Le même worker traite les préparations de séance demandées par l'API
+(SessionPrepJob): création des comptes et hachage des mots de passe hors
+de la requête.
+
+En aperçu (dry_run), chaque lot est comparé aux comptes existants en une
+requête (provision_diff) et les changements prévus sont enregistrés
+(ImportDiffRow) sans rien créer. `apply_import` remet ensuite le job en
+attente pour l'appliquer par le même chemin que l'import normal.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import F, Count
+from django.utils import timezone
+
+from authentication.models import ImportJob, ImportRowError, ImportDiffRow, SessionPrepJob
+from authentication.importExcel import iter_apprenants, REQUIRED_COLUMNS, MISSING_COLUMNS_MESSAGE
+from authentication.provisioning import bulk_provision, provision_diff, prepare_session, LANGUES
+from hse_app.excel_cache import open_excel
+from hse_app.excel_reader import ExcelFormatError
+from tests.models import Test
+
+logger = logging.getLogger(__name__)
+
+MAX_TRIES = 3
+DEFAULT_CHUNK_SIZE = 500
+
+
+def import_chunk_size():
+    return getattr(settings, 'IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+# ==================== SOUMISSION ====================
+
+def enqueue_import(excel_file, submitted_by=None, chunk_size=None, dry_run=False):
+    """Enregistre le fichier et crée le job (traité par process_imports)"""
+    return ImportJob.objects.create(
+        file=excel_file,
+        original_name=getattr(excel_file, 'name', '')[:255],
+        submitted_by=submitted_by,
+        chunk_size=chunk_size or import_chunk_size(),
+        dry_run=dry_run,
+    )
+
+
+def apply_import(job):
+    """
+    Applique un aperçu: le job repart en attente, hors aperçu, compteurs
+    remis à zéro. Retourne False si le job n'est pas un aperçu terminé.
+    Les erreurs de l'aperçu sont supprimées dans la même transaction, job
+    verrouillé: un worker ne peut pas le réserver avant qu'elles le soient.
+    """
+    with transaction.atomic():
+        locked = ImportJob.objects.select_for_update().filter(id=job.id, status='previewed').exists()
+        if not locked:
+            return False
+        ImportRowError.objects.filter(job_id=job.id).delete()
+        ImportJob.objects.filter(id=job.id).update(
+            status='pending',
+            dry_run=False,
+            tries=0,
+            error='',
+            rows_processed=0,
+            created=0,
+            updated=0,
+            failed=0,
+            last_line=0,
+            started_at=None,
+            finished_at=None,
+        )
+    job.refresh_from_db()
+    return True
+
+
+def job_status(job):
+    """Progression et compteurs d'un job, pour l'endpoint de suivi"""
+    return {
+        'job_id': str(job.id),
+        'file': job.original_name,
+        'dry_run': job.dry_run,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_total': job.rows_total,
+        'rows_processed': job.rows_processed,
+        'created': job.created,
+        'updated': job.updated,
+        'failed': job.failed,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# ==================== TRAITEMENT PAR LOTS ====================
+
+def _commit_chunk(job, rows, row_errors, last_line, workers=None):
+    """
+    Valide un lot: comptes créés (bulk_provision, sa propre transaction),
+    puis erreurs et compteurs du job. Rejouer un lot interrompu entre les
+    deux ne crée rien deux fois (CIN déjà existants).
+    """
+    processed = len(rows) + len(row_errors)
+    result = bulk_provision([(cin, full_name) for _line, cin, full_name in rows], workers=workers)
+
+    lines = {cin: line for line, cin, _full_name in rows}
+    for cin in result['skipped']:
+        row_errors.append(ImportRowError(
+            job=job, line=lines[cin], cin=cin,
+            message="Compte non créé (nom d'utilisateur déjà pris)"
+        ))
+    ImportRowError.objects.bulk_create(row_errors)
+
+    ImportJob.objects.filter(id=job.id).update(
+        rows_processed=F('rows_processed') + processed,
+        created=F('created') + result['created'],
+        updated=F('updated') + result['existing'],
+        failed=F('failed') + len(row_errors),
+        last_line=last_line,
+    )
+
+
+def _preview_chunk(job, rows, row_errors, last_line, workers=None):
+    """Aperçu d'un lot: changements prévus enregistrés, aucun compte touché"""
+    lines = {cin: line for line, cin, _full_name in rows}
+    diff = provision_diff([(cin, full_name) for _line, cin, full_name in rows])
+
+    to_create = sum(1 for *_values, action in diff if action == 'create')
+
+    # Rien n'est écrit hors des tables du job: le lot entier en une transaction
+    with transaction.atomic():
+        ImportDiffRow.objects.bulk_create([
+            ImportDiffRow(
+                job=job, line=lines[cin], cin=cin, full_name=full_name[:255],
+                current_full_name=current_full_name, action=action
+            )
+            for cin, full_name, current_full_name, action in diff
+        ])
+        ImportRowError.objects.bulk_create(row_errors)
+        ImportJob.objects.filter(id=job.id).update(
+            rows_processed=F('rows_processed') + len(rows) + len(row_errors),
+            created=F('created') + to_create,
+            updated=F('updated') + len(diff) - to_create,
+            failed=F('failed') + len(row_errors),
+            last_line=last_line,
+        )
+
+
+def run_import(job, workers=None):
+    """Lit le fichier du job en flux et le traite (ou le compare, en aperçu) lot par lot"""
+    chunk_size = max(1, job.chunk_size)
+    process_chunk = _preview_chunk if job.dry_run else _commit_chunk
+    seen = set()
+
+    with job.file.open('rb') as excel_file, open_excel(excel_file, lowercase=True, as_text=True) as excel_rows:
+        if not REQUIRED_COLUMNS.issubset(excel_rows.headers):
+            raise ExcelFormatError(MISSING_COLUMNS_MESSAGE)
+
+        if job.rows_total is None and excel_rows.row_count_hint is not None:
+            job.rows_total = excel_rows.row_count_hint
+            job.save(update_fields=['rows_total'])
+
+        rows = []
+        row_errors = []
+        last_line = job.last_line
+        for line, cin, full_name, error in iter_apprenants(excel_rows, seen):
+            if line <= job.last_line:
+                continue  # déjà validé avant l'arrêt du worker
+            last_line = line
+            if error:
+                row_errors.append(ImportRowError(job=job, line=line, cin=cin[:20], message=error))
+            else:
+                rows.append((line, cin, full_name))
+
+            if len(rows) + len(row_errors) >= chunk_size:
+                process_chunk(job, rows, row_errors, last_line, workers=workers)
+                rows, row_errors = [], []
+
+        if rows or row_errors:
+            process_chunk(job, rows, row_errors, last_line, workers=workers)
+
+
+def diff_summary(job):
+    """Nombre de lignes par action prévue (une requête GROUP BY)"""
+    counts = dict(job.diff_rows.values_list('action').annotate(count=Count('id')).order_by())
+    return {action: counts.get(action, 0) for action, _label in ImportDiffRow.ACTION_CHOICES}
+
+
+# ==================== PRÉPARATION DE SÉANCE ====================
+
+def enqueue_session_prep(submitted_by=None, entreprise=None, entite=None, cins=None, test_ids=None, langues=LANGUES):
+    """Enregistre une préparation de séance (traitée par process_imports)"""
+    return SessionPrepJob.objects.create(
+        submitted_by=submitted_by,
+        entreprise=entreprise or '',
+        entite=entite or '',
+        cins=list(cins) if cins is not None else None,
+        test_ids=list(test_ids) if test_ids is not None else None,
+        langues=list(langues),
+    )
+
+
+def session_prep_status(job):
+    """Statut et résultat d'une préparation, pour l'endpoint de suivi"""
+    return {
+        'job_id': str(job.id),
+        'status': job.status,
+        'entreprise': job.entreprise,
+        'entite': job.entite,
+        'roster_size': len(job.cins) if job.cins is not None else None,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def claim_session_prep():
+    """Réserve la plus ancienne préparation en attente (UPDATE conditionnel)"""
+    for job_id in SessionPrepJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:2]:
+        taken = SessionPrepJob.objects.filter(id=job_id, status='pending').update(
+            status='processing',
+            started_at=timezone.now(),
+            tries=F('tries') + 1
+        )
+        if taken:
+            return job_id
+    return None
+
+
+def process_session_prep(job_id, workers=None):
+    """Prépare la séance réservée et enregistre son résultat"""
+    job = SessionPrepJob.objects.get(id=job_id)
+    tests = list(Test.objects.filter(id__in=job.test_ids)) if job.test_ids is not None else None
+
+    try:
+        result = prepare_session(
+            entreprise=job.entreprise or None,
+            entite=job.entite or None,
+            cins=job.cins,
+            tests=tests,
+            langues=job.langues or LANGUES,
+            workers=workers
+        )
+    except Exception as e:
+        logger.exception("Préparation de séance %s en échec", job_id)
+        job.refresh_from_db()
+        job.status = 'failed' if job.tries >= MAX_TRIES else 'pending'
+        job.error = str(e)
+        job.finished_at = timezone.now() if job.status == 'failed' else None
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+
+    job.status = 'done'
+    job.result = result
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+    return job
+
+
+# ==================== FILE D'ATTENTE (BASE DE DONNÉES) ====================
+
+def claim_import():
+    """Réserve le plus ancien import en attente (UPDATE conditionnel)"""
+    for job_id in ImportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:2]:
+        taken = ImportJob.objects.filter(id=job_id, status='pending').update(
+            status='processing',
+            started_at=timezone.now(),
+            tries=F('tries') + 1
+        )
+        if taken:
+            return job_id
+    return None
+
+
+def process_import(job_id, workers=None):
+    """Traite un import réservé et enregistre son statut final"""
+    job = ImportJob.objects.get(id=job_id)
+
+    try:
+        run_import(job, workers=workers)
+    except ExcelFormatError as e:
+        # Fichier illisible ou colonnes manquantes: inutile de réessayer
+        job.refresh_from_db()
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+    except Exception as e:
+        logger.exception("Import %s en échec", job_id)
+        job.refresh_from_db()
+        job.status = 'failed' if job.tries >= MAX_TRIES else 'pending'
+        job.error = str(e)
+        job.finished_at = timezone.now() if job.status == 'failed' else None
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+
+    job.refresh_from_db()
+    job.status = 'previewed' if job.dry_run else 'done'
+    job.rows_total = job.rows_processed
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'rows_total', 'error', 'finished_at'])
+    return job
+
+
+def requeue_stale_imports(older_than_seconds=1800):
+    """Remet en attente les imports et préparations d'un worker arrêté en cours de traitement"""
+    limit = timezone.now() - timedelta(seconds=older_than_seconds)
+    return sum(
+        model.objects.filter(status='processing', started_at__lt=limit).update(status='pending')
+        for model in (ImportJob, SessionPrepJob)
+    )
+
+
+def run_import_worker(stop_event, poll_interval=2.0, once=False, workers=None):
+    """
+    Boucle du worker: un import ou une préparation de séance à la fois (le
+    hachage est déjà parallèle), imports d'abord
+    """
+    processed = 0
+    while not stop_event.is_set():
+        close_old_connections()
+
+        job_id = claim_import()
+        if job_id is not None:
+            process_import(job_id, workers=workers)
+            processed += 1
+            continue
+
+        job_id = claim_session_prep()
+        if job_id is not None:
+            process_session_prep(job_id, workers=workers)
+            processed += 1
+            continue
+
+        if once:
+            break
+        stop_event.wait(poll_interval)
+
+    close_old_connections()
+    return processed
@@ -0,0 +1,57 @@
+# authentication/management/commands/prepare_session.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.provisioning import prepare_session, read_roster
+from tests.models import Test
+
+
+class Command(BaseCommand):
+    help = (
+        "Prépare une séance: crée et relie les comptes TestUser des participants (entreprise, entité "
+        "ou liste d'émargement) et chauffe les caches des utilisateurs et des questions"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entreprise', help="Participants de cette entreprise")
+        parser.add_argument('--entite', help="Participants de cette entité")
+        parser.add_argument('--roster', help="Liste d'émargement Excel (colonne CIN)")
+        parser.add_argument('--all', action='store_true', help="Tous les participants HSE")
+        parser.add_argument('--test-version', type=int, nargs='*',
+                            help="Versions de test à chauffer (versions actives par défaut)")
+        parser.add_argument('--langue', nargs='*', default=['ar', 'fr', 'en'], choices=['ar', 'fr', 'en'],
+                            help="Langues des paquets de questions à chauffer")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processus de hachage des mots de passe (un par cœur par défaut)")
+
+    def handle(self, *args, **options):
+        cins = read_roster(options['roster']) if options['roster'] else None
+        if not (options['entreprise'] or options['entite'] or cins or options['all']):
+            raise CommandError("Indiquez --entreprise, --entite, --roster ou --all")
+
+        tests = None
+        if options['test_version']:
+            tests = list(Test.objects.filter(version__in=options['test_version']))
+
+        started = time.perf_counter()
+        result = prepare_session(
+            entreprise=options['entreprise'],
+            entite=options['entite'],
+            cins=cins,
+            tests=tests,
+            langues=options['langue'],
+            workers=options['workers'],
+        )
+
+        self.stdout.write(
+            f"{result['participants']} participant(s): {result['accounts_created']} compte(s) créé(s), "
+            f"{result['accounts_linked']} relié(s), {result['users_cached']} mis en cache"
+        )
+        self.stdout.write(f"Questions chauffées pour les versions: {result['tests_warmed'] or '-'}")
+        if result['unknown_cins']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(result['unknown_cins'])} CIN de la liste absents des participants HSE: "
+                f"{', '.join(result['unknown_cins'][:20])}"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Séance prête en {time.perf_counter() - started:.1f} s"))
@@ -0,0 +1,32 @@
+# authentication/management/commands/print_qr_sheet.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.qr_sheet import build_qr_sheet, sheet_tests
+
+
+class Command(BaseCommand):
+    help = "Génère un PDF imprimable des QR codes de séance (une page par test et par salle)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tests', type=int, nargs='*', help="Ids des tests (toutes les versions par défaut)")
+        parser.add_argument('--rooms', nargs='*', help="Libellés des salles (une page par salle et par test)")
+        parser.add_argument('--output', default='qr_codes.pdf', help="Fichier PDF de sortie")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processus de rendu des images (un par cœur par défaut)")
+
+    def handle(self, *args, **options):
+        tests = sheet_tests(options['tests'])
+        if not tests:
+            raise CommandError("Aucun test trouvé")
+
+        started = time.perf_counter()
+        pdf = build_qr_sheet(tests, rooms=options['rooms'], workers=options['workers'])
+        with open(options['output'], 'wb') as output:
+            output.write(pdf)
+
+        pages = len(tests) * max(1, len(options['rooms'] or []))
+        self.stdout.write(self.style.SUCCESS(
+            f"{pages} page(s) écrite(s) dans {options['output']} en {time.perf_counter() - started:.1f} s"
+        ))
@@ -0,0 +1,42 @@
+# authentication/management/commands/process_imports.py
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from authentication.import_jobs import run_import_worker, requeue_stale_imports
+
+
+class Command(BaseCommand):
+    help = "Worker des imports Excel d'apprenants et des préparations de séance (file d'attente en base)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processus de hachage des mots de passe (un par cœur par défaut)")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Attente (s) quand la file est vide")
+        parser.add_argument('--stale-after', type=int, default=1800,
+                            help="Remettre en attente les imports bloqués en traitement depuis N secondes")
+        parser.add_argument('--once', action='store_true', help="Vider la file puis s'arrêter")
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write("Arrêt demandé, fin du lot en cours...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        requeued = requeue_stale_imports(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"{requeued} import(s) bloqué(s) remis en attente")
+
+        processed = run_import_worker(
+            stop_event,
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+            workers=options['workers']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} import(s) traité(s)"))
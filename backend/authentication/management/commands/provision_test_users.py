@@ -0,0 +1,53 @@
+# authentication/management/commands/provision_test_users.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.provisioning import provision_test_users, provision_managers, unprovisioned_count
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée à l'avance les comptes TestUser des participants HSE (hachage des mots de passe "
+        "hors séance) pour la connexion par ticket QR"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('cins', nargs='*', help="CIN à provisionner (tous les participants par défaut)")
+        parser.add_argument('--batch-size', type=int, default=500, help="Taille des lots d'insertion")
+        parser.add_argument('--managers', action='store_true',
+                            help="Créer aussi les comptes des managers HSE (HSEManager)")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Processus de hachage des mots de passe (un par cœur par défaut)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = provision_test_users(
+            cins=options['cins'] or None,
+            batch_size=options['batch_size'],
+            workers=options['workers']
+        )
+        if options['managers']:
+            managers = provision_managers(
+                cins=options['cins'] or None,
+                batch_size=options['batch_size'],
+                workers=options['workers']
+            )
+            self.stdout.write(
+                f"{managers['created']} compte(s) manager créé(s), {managers['existing']} existant(s)"
+            )
+            if managers['skipped']:
+                self.stdout.write(self.style.WARNING(
+                    f"{len(managers['skipped'])} manager(s) non créé(s) (conflit): {', '.join(managers['skipped'])}"
+                ))
+        duration = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{result['created']} compte(s) créé(s), {result['existing']} existant(s), "
+            f"{result['linked']} participant(s) relié(s) en {duration:.1f} s"
+        )
+        remaining = unprovisioned_count()
+        if remaining:
+            self.stdout.write(self.style.WARNING(f"{remaining} participant(s) sans compte"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Tous les participants ont un compte"))
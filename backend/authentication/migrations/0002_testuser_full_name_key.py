@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:05
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize_full_name(full_name):
+    """Copie figée de authentication.models.normalize_full_name (à ne pas modifier)"""
+    if not full_name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', full_name)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())[:255]
+
+
+def backfill_full_name_key(apps, schema_editor):
+    TestUser = apps.get_model('authentication', 'TestUser')
+    users = list(TestUser.objects.only('id', 'full_name'))
+    for user in users:
+        user.full_name_key = normalize_full_name(user.full_name)
+    TestUser.objects.bulk_update(users, ['full_name_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testuser',
+            name='full_name_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='Clé du nom complet'),
+        ),
+        migrations.RunPython(backfill_full_name_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_testuser_full_name_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='imports/%Y/%m/', verbose_name='Fichier Excel')),
+                ('original_name', models.CharField(blank=True, max_length=255, verbose_name='Nom du fichier')),
+                ('chunk_size', models.PositiveIntegerField(default=500, verbose_name='Lignes par lot')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En traitement'), ('done', 'Terminé'), ('failed', 'Échoué')], default='pending', max_length=20, verbose_name='Statut')),
+                ('tries', models.IntegerField(default=0, verbose_name="Nombre d'essais")),
+                ('error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('rows_total', models.IntegerField(blank=True, null=True, verbose_name='Lignes (estimation)')),
+                ('rows_processed', models.IntegerField(default=0, verbose_name='Lignes traitées')),
+                ('created', models.IntegerField(default=0, verbose_name='Comptes créés')),
+                ('updated', models.IntegerField(default=0, verbose_name='Comptes existants')),
+                ('failed', models.IntegerField(default=0, verbose_name='Lignes en erreur')),
+                ('last_line', models.IntegerField(default=0, verbose_name='Dernière ligne validée')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Traitement débuté à')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Traitement terminé à')),
+                ('submitted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Soumis par')),
+            ],
+            options={
+                'verbose_name': "Import d'apprenants",
+                'verbose_name_plural': "Imports d'apprenants",
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='authenticat_status_5dcdd7_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRowError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.IntegerField(blank=True, null=True, verbose_name='Ligne Excel')),
+                ('cin', models.CharField(blank=True, max_length=20, verbose_name='CIN')),
+                ('message', models.CharField(max_length=255, verbose_name='Erreur')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_errors', to='authentication.importjob', verbose_name='Import')),
+            ],
+            options={
+                'verbose_name': "Erreur d'import",
+                'verbose_name_plural': "Erreurs d'import",
+                'ordering': ['job', 'line'],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0003_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='dry_run',
+            field=models.BooleanField(default=False, verbose_name='Aperçu seulement'),
+        ),
+        migrations.AlterField(
+            model_name='importjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('processing', 'En traitement'), ('previewed', 'Aperçu prêt'), ('done', 'Terminé'), ('failed', 'Échoué')], default='pending', max_length=20, verbose_name='Statut'),
+        ),
+        migrations.CreateModel(
+            name='ImportDiffRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.IntegerField(verbose_name='Ligne Excel')),
+                ('cin', models.CharField(max_length=20, verbose_name='CIN')),
+                ('full_name', models.CharField(blank=True, max_length=255, verbose_name='Nom du fichier')),
+                ('current_full_name', models.CharField(blank=True, max_length=255, verbose_name='Nom actuel')),
+                ('action', models.CharField(choices=[('create', 'Compte à créer'), ('complete_name', 'Nom à compléter'), ('name_differs', 'Nom différent (conservé)'), ('unchanged', 'Inchangé')], max_length=20, verbose_name='Action')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='diff_rows', to='authentication.importjob', verbose_name='Import')),
+            ],
+            options={
+                'verbose_name': "Changement d'import",
+                'verbose_name_plural': "Changements d'import",
+                'ordering': ['job', 'line'],
+                'indexes': [models.Index(fields=['job', 'action', 'line'], name='authenticat_job_id_db19d9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:33
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_importjob_dry_run_importdiffrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionPrepJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('entreprise', models.CharField(blank=True, max_length=200, verbose_name='Entreprise')),
+                ('entite', models.CharField(blank=True, max_length=200, verbose_name='Entité')),
+                ('cins', models.JSONField(blank=True, null=True, verbose_name="CIN de la liste d'émargement")),
+                ('test_ids', models.JSONField(blank=True, null=True, verbose_name='Tests à préparer')),
+                ('langues', models.JSONField(default=list, verbose_name='Langues')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En traitement'), ('done', 'Terminé'), ('failed', 'Échoué')], default='pending', max_length=20, verbose_name='Statut')),
+                ('tries', models.IntegerField(default=0, verbose_name="Nombre d'essais")),
+                ('error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Résultat')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Traitement débuté à')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Traitement terminé à')),
+                ('submitted_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='session_prep_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Demandé par')),
+            ],
+            options={
+                'verbose_name': 'Préparation de séance',
+                'verbose_name_plural': 'Préparations de séance',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='authenticat_status_e4e249_idx')],
+            },
+        ),
+    ]
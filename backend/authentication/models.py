@@ -1,10 +1,61 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 import uuid
 import re
+import unicodedata
 
 
-class TestUserManager(BaseUserManager):
+def normalize_full_name(full_name):
+    """
+    Clé de recherche d'un nom complet: sans accents, casefold, espaces
+    normalisés ("  Fatima  ZOHRA " et "fatima zohra" → "fatima zohra").
+    Stockée dans `full_name_key` (TestUser, HSEManager) et indexée.
+    """
+    if not full_name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', full_name)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())[:255]
+
+
+class TestUserQuerySet(models.QuerySet):
+
+    def _filtered_pks(self):
+        """
+        pk visés si la requête est filtrée par pk (filter(pk=...),
+        pk__in=[...] comme dans bulk_update), sans relire la base; sinon None.
+        """
+        where = self.query.where
+        if where.negated or (where.connector != 'AND' and len(where.children) > 1):
+            return None
+        for lookup in where.children:
+            if getattr(getattr(lookup, 'lhs', None), 'target', None) != self.model._meta.pk:
+                continue
+            if lookup.lookup_name == 'exact' and not hasattr(lookup.rhs, 'resolve_expression'):
+                return [lookup.rhs]
+            if lookup.lookup_name == 'in' and isinstance(lookup.rhs, (list, tuple, set, frozenset)):
+                return list(lookup.rhs)
+        return None
+
+    def update(self, **kwargs):
+        """
+        update() groupé (is_active, etc.): purge aussi le cache des utilisateurs
+        de session. Filtre par pk: ces entrées seulement; autre filtre: tout
+        le cache (génération incrémentée), plutôt qu'un SELECT des pk.
+        """
+        from authentication.user_cache import invalidate_users, invalidate_all_users
+
+        user_ids = self._filtered_pks()
+        rows = super().update(**kwargs)
+        if user_ids is None:
+            invalidate_all_users()
+        else:
+            invalidate_users(user_ids)
+        return rows
+
+
+class TestUserManager(BaseUserManager.from_queryset(TestUserQuerySet)):
     """Manager pour TestUser avec deux types d'authentification."""
 
     def create_user(self, cin, username=None, full_name=None, user_type='user', password=None):
@@ -51,10 +102,11 @@ class TestUserManager(BaseUserManager):
             user_type='user'
         )
 
-    def generate_username_from_full_name(self, full_name):
-        """Générer un username unique à partir du full_name."""
+    @staticmethod
+    def username_base(full_name):
+        """Username de base (sans suffixe) dérivé du full_name, ou None"""
         if not full_name:
-            return f"user_{uuid.uuid4().hex[:8]}"
+            return None
 
         username = full_name.strip().lower()
         username = re.sub(r'[^\w\s-]', '', username)
@@ -64,16 +116,54 @@ class TestUserManager(BaseUserManager):
         if len(username) > 150:
             username = username[:150]
 
-        if not username:
-            username = f"user_{uuid.uuid4().hex[:8]}"
+        return username or None
 
-        base_username = username
-        counter = 1
-        while self.model.objects.filter(username=username).exists():
-            username = f"{base_username}_{counter}"
-            counter += 1
+    def allocate_usernames(self, full_names):
+        """
+        Usernames uniques pour une liste de full_name, dans le même ordre.
+        Une seule requête (préfixe LIKE 'base%' sur l'index unique) pour tous
+        les noms: les suffixes déjà pris sont résolus en mémoire, y compris
+        entre noms du lot (mohamed_amine, mohamed_amine_1, ... et un nom dont
+        la base est elle-même mohamed_amine_1).
+        """
+        bases = [self.username_base(full_name) for full_name in full_names]
+
+        # Usernames pris, en minuscules: l'index unique est insensible à la
+        # casse sous MySQL (collation *_ci), d'où istartswith et non startswith
+        # (LIKE BINARY, sensible à la casse)
+        used = set()
+        distinct = sorted(set(base for base in bases if base))
+        if distinct:
+            prefixes = models.Q()
+            for base in distinct:
+                prefixes |= models.Q(username__istartswith=base)
+            # Seuls comptent les usernames de la forme base ou base_N
+            wanted = set(distinct)
+            for username in self.model.objects.filter(prefixes).values_list('username', flat=True):
+                username = username.lower()
+                if username in wanted or re.sub(r'_\d+$', '', username) in wanted:
+                    used.add(username)
+
+        usernames = []
+        next_counter = {}
+        for base in bases:
+            if not base:
+                usernames.append(f"user_{uuid.uuid4().hex[:8]}")
+                continue
+            # Plus petit suffixe libre (0 = sans suffixe), comme l'ancienne
+            # boucle; les usernames déjà attribués dans le lot comptent aussi
+            counter = next_counter.get(base, 0)
+            while (base if counter == 0 else f"{base}_{counter}") in used:
+                counter += 1
+            username = base if counter == 0 else f"{base}_{counter}"
+            used.add(username)
+            next_counter[base] = counter + 1
+            usernames.append(username)
+        return usernames
 
-        return username
+    def generate_username_from_full_name(self, full_name):
+        """Générer un username unique à partir du full_name."""
+        return self.allocate_usernames([full_name])[0]
 
     def create_superuser(self, cin, username=None, full_name=None, password=None):
         if not username:
@@ -122,27 +212,23 @@ class TestUserManager(BaseUserManager):
         - Username: full_name (depuis la table HSEManager)
         - Mot de passe: CIN
         """
-        # Chercher par full_name (insensible à la casse)
+        # Chercher par clé du nom (index, insensible à la casse et aux accents)
+        key = normalize_full_name(full_name)
+        users = list(self.filter(full_name_key=key, user_type='manager'))
+        if users:
+            # Vérifier le mot de passe (CIN); homonymes départagés par le CIN
+            for user in users:
+                if user.check_password(cin):
+                    return user
+            return None
+
+        # Auto-créer depuis la table HSEManager si existe
         try:
-            user = self.get(
-                full_name__iexact=full_name.strip(),
-                user_type='manager'
-            )
-            # Vérifier le mot de passe (CIN)
-            if user.check_password(cin):
-                return user
+            from hse_app.models import HSEManager as HSEManagerModel
+            manager = HSEManagerModel.objects.get(full_name_key=key, cin=cin)
+            return self.create_manager(cin=cin, full_name=manager.full_name)
+        except (ImportError, Exception):
             return None
-        except self.model.DoesNotExist:
-            # Auto-créer depuis la table HSEManager si existe
-            try:
-                from hse_app.models import HSEManager as HSEManagerModel
-                manager = HSEManagerModel.objects.get(
-                    full_name__iexact=full_name.strip(),
-                    cin=cin
-                )
-                return self.create_manager(cin=cin, full_name=manager.full_name)
-            except (ImportError, Exception):
-                return None
 
 
 class TestUser(AbstractBaseUser, PermissionsMixin):
@@ -177,6 +263,15 @@ class TestUser(AbstractBaseUser, PermissionsMixin):
         blank=True,
         verbose_name="Nom complet"
     )
+    # Maintenu par save() (normalize_full_name): connexion manager indexée
+    full_name_key = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True,
+        verbose_name="Clé du nom complet"
+    )
     user_type = models.CharField(
         max_length=10,
         choices=USER_TYPE_CHOICES,
@@ -201,6 +296,21 @@ class TestUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return f"{self.full_name or self.username} ({self.get_user_type_display()})"
 
+    def save(self, *args, **kwargs):
+        self.full_name_key = normalize_full_name(self.full_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'full_name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'full_name_key'}
+        super().save(*args, **kwargs)
+
+    def get_session_auth_hash(self):
+        # Utilisateur servi par user_cache: hash du mot de passe non chargé,
+        # empreinte de session calculée à la mise en cache
+        cached_hash = getattr(self, 'cached_session_auth_hash', None)
+        if cached_hash is not None and 'password' in self.get_deferred_fields():
+            return cached_hash
+        return super().get_session_auth_hash()
+
     def get_full_name(self):
         return self.full_name or self.username
 
@@ -214,3 +324,191 @@ class TestUser(AbstractBaseUser, PermissionsMixin):
     @property
     def is_hse_user(self):
         return self.user_type == 'user'
+
+
+class ImportJob(models.Model):
+    """
+    Import Excel d'apprenants, traité en arrière-plan par lots (commande
+    process_imports). En aperçu (dry_run), le worker calcule les
+    changements (ImportDiffRow) sans rien écrire; l'import peut ensuite
+    être appliqué.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En traitement'),
+        ('previewed', 'Aperçu prêt'),
+        ('done', 'Terminé'),
+        ('failed', 'Échoué'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    file = models.FileField(upload_to='imports/%Y/%m/', verbose_name="Fichier Excel")
+    original_name = models.CharField(max_length=255, blank=True, verbose_name="Nom du fichier")
+    submitted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='import_jobs',
+        verbose_name="Soumis par"
+    )
+    chunk_size = models.PositiveIntegerField(default=500, verbose_name="Lignes par lot")
+    dry_run = models.BooleanField(default=False, verbose_name="Aperçu seulement")
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Statut"
+    )
+    tries = models.IntegerField(default=0, verbose_name="Nombre d'essais")
+    error = models.TextField(blank=True, verbose_name="Dernière erreur")
+
+    # Progression (mise à jour après chaque lot validé)
+    rows_total = models.IntegerField(null=True, blank=True, verbose_name="Lignes (estimation)")
+    rows_processed = models.IntegerField(default=0, verbose_name="Lignes traitées")
+    created = models.IntegerField(default=0, verbose_name="Comptes créés")
+    updated = models.IntegerField(default=0, verbose_name="Comptes existants")
+    failed = models.IntegerField(default=0, verbose_name="Lignes en erreur")
+    last_line = models.IntegerField(default=0, verbose_name="Dernière ligne validée")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Traitement débuté à")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Traitement terminé à")
+
+    class Meta:
+        verbose_name = "Import d'apprenants"
+        verbose_name_plural = "Imports d'apprenants"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Import {self.original_name or self.id} ({self.get_status_display()})"
+
+    @property
+    def progress(self):
+        """Pourcentage traité (100 une fois terminé)"""
+        if self.status in ('done', 'previewed'):
+            return 100
+        if not self.rows_total:
+            return 0
+        return min(99, int(self.rows_processed * 100 / self.rows_total))
+
+
+class ImportRowError(models.Model):
+    """Ligne rejetée d'un import (CIN manquant, doublon, compte non créé...)"""
+
+    job = models.ForeignKey(
+        ImportJob,
+        on_delete=models.CASCADE,
+        related_name='row_errors',
+        verbose_name="Import"
+    )
+    line = models.IntegerField(null=True, blank=True, verbose_name="Ligne Excel")
+    cin = models.CharField(max_length=20, blank=True, verbose_name="CIN")
+    message = models.CharField(max_length=255, verbose_name="Erreur")
+
+    class Meta:
+        verbose_name = "Erreur d'import"
+        verbose_name_plural = "Erreurs d'import"
+        ordering = ['job', 'line']
+
+    def __str__(self):
+        return f"Ligne {self.line} : {self.message}"
+
+
+class ImportDiffRow(models.Model):
+    """Changement prévu par l'aperçu d'un import, pour une ligne du fichier"""
+
+    ACTION_CHOICES = [
+        ('create', 'Compte à créer'),
+        ('complete_name', 'Nom à compléter'),
+        ('name_differs', 'Nom différent (conservé)'),
+        ('unchanged', 'Inchangé'),
+    ]
+
+    job = models.ForeignKey(
+        ImportJob,
+        on_delete=models.CASCADE,
+        related_name='diff_rows',
+        verbose_name="Import"
+    )
+    line = models.IntegerField(verbose_name="Ligne Excel")
+    cin = models.CharField(max_length=20, verbose_name="CIN")
+    full_name = models.CharField(max_length=255, blank=True, verbose_name="Nom du fichier")
+    current_full_name = models.CharField(max_length=255, blank=True, verbose_name="Nom actuel")
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES, verbose_name="Action")
+
+    class Meta:
+        verbose_name = "Changement d'import"
+        verbose_name_plural = "Changements d'import"
+        ordering = ['job', 'line']
+        indexes = [
+            models.Index(fields=['job', 'action', 'line']),
+        ]
+
+    def __str__(self):
+        return f"Ligne {self.line} : {self.cin} ({self.get_action_display()})"
+
+
+class SessionPrepJob(models.Model):
+    """
+    Préparation de séance demandée par l'API (comptes créés et reliés,
+    caches chauffés), traitée en arrière-plan par process_imports: le
+    hachage des mots de passe ne se fait pas pendant la requête.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En traitement'),
+        ('done', 'Terminé'),
+        ('failed', 'Échoué'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    submitted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='session_prep_jobs',
+        verbose_name="Demandé par"
+    )
+    entreprise = models.CharField(max_length=200, blank=True, verbose_name="Entreprise")
+    entite = models.CharField(max_length=200, blank=True, verbose_name="Entité")
+    # None: pas de liste d'émargement
+    cins = models.JSONField(null=True, blank=True, verbose_name="CIN de la liste d'émargement")
+    # None: versions actives
+    test_ids = models.JSONField(null=True, blank=True, verbose_name="Tests à préparer")
+    langues = models.JSONField(default=list, verbose_name="Langues")
+
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Statut"
+    )
+    tries = models.IntegerField(default=0, verbose_name="Nombre d'essais")
+    error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    result = models.JSONField(null=True, blank=True, verbose_name="Résultat")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Traitement débuté à")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Traitement terminé à")
+
+    class Meta:
+        verbose_name = "Préparation de séance"
+        verbose_name_plural = "Préparations de séance"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        target = self.entreprise or self.entite or f"{len(self.cins or [])} CIN"
+        return f"Préparation {target} ({self.get_status_display()})"
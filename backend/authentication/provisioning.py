@@ -0,0 +1,291 @@
+# authentication/provisioning.py
+"""
+Pré-provisionnement des comptes participants (TestUser).
+
+Le hachage PBKDF2 du mot de passe (set_password) coûte plusieurs
+centaines de millisecondes de CPU par compte. Créer les comptes à la
+volée au premier scan concentre ce coût au début de la séance; on le
+déplace ici, hors séance (commande `provision_test_users`, import Excel),
+pour que le jour J la connexion par ticket QR ne fasse qu'une lecture.
+
+Les créations en nombre se font en trois temps: une lecture des CIN
+existants, le hachage des nouveaux mots de passe réparti sur plusieurs
+processus, puis des insertions groupées (bulk_create par lots).
+
+`prepare_session` prépare une séance complète (entreprise, entité ou
+liste d'émargement): comptes créés et reliés, caches des utilisateurs et
+des questions chauffés, pour que les connexions au scan soient de
+simples lectures.
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+
+from authentication.hashing import init_hash_worker, hash_chunk
+from authentication.models import TestUser, normalize_full_name
+from authentication.user_cache import remember_users
+from hse_app.excel_cache import open_excel
+from hse_app.models import HSEUser, HSEManager
+from tests.models import Test
+from tests.answer_key import get_answer_key
+from tests.question_bundle import get_question_bundle, LANGUES
+
+# En dessous, démarrer des processus coûte plus cher que hacher sur place
+PARALLEL_HASH_THRESHOLD = 50
+
+
+# ==================== HACHAGE ====================
+
+def hash_passwords(raw_passwords, workers=None):
+    """
+    Hache une liste de mots de passe, en parallèle sur `workers` processus
+    (un par cœur par défaut). Retourne les hachés dans le même ordre.
+    Processus démarrés en 'spawn' (pas de fork d'un processus qui tient des
+    connexions et des threads), avec Django configuré par init_hash_worker.
+    """
+    raw_passwords = list(raw_passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(raw_passwords) < PARALLEL_HASH_THRESHOLD:
+        return hash_chunk(raw_passwords)
+
+    chunk_size = -(-len(raw_passwords) // (workers * 4))
+    chunks = [raw_passwords[start:start + chunk_size] for start in range(0, len(raw_passwords), chunk_size)]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_hash_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'),)
+    ) as pool:
+        return [hashed for chunk in pool.map(hash_chunk, chunks) for hashed in chunk]
+
+
+# ==================== CRÉATION EN NOMBRE ====================
+
+def bulk_provision(rows, batch_size=500, workers=None):
+    """
+    Crée les comptes participants de `rows` ([(cin, full_name), ...]) qui
+    n'existent pas encore (mot de passe = CIN, comme create_hse_user) et
+    complète le nom des comptes existants qui n'en ont pas.
+
+    Retourne {'created', 'updated', 'existing', 'skipped', 'duration_seconds',
+    'rows_per_second'}: `skipped` liste les CIN non créés (conflit de
+    username ou insertion concurrente).
+    """
+    started = time.perf_counter()
+
+    # Premier nom non vide par CIN
+    names = {}
+    for cin, full_name in rows:
+        if cin and (cin not in names or not names[cin]):
+            names[cin] = full_name or ''
+
+    existing = {
+        user.cin: user
+        for user in TestUser.objects.filter(cin__in=list(names)).only('id', 'cin', 'full_name')
+    }
+
+    to_update = []
+    for cin, user in existing.items():
+        if not user.full_name and names[cin]:
+            user.full_name = names[cin]
+            user.full_name_key = normalize_full_name(user.full_name)
+            to_update.append(user)
+
+    new_cins = [cin for cin in names if cin not in existing]
+    hashed = hash_passwords(new_cins, workers=workers)
+    new_users = [
+        TestUser(
+            cin=cin,
+            username=f"user_{cin}",
+            full_name=names[cin] or f"user_{cin}",
+            full_name_key=normalize_full_name(names[cin] or f"user_{cin}"),
+            user_type='user',
+            password=password,
+        )
+        for cin, password in zip(new_cins, hashed)
+    ]
+
+    with transaction.atomic():
+        TestUser.objects.bulk_create(new_users, batch_size=batch_size, ignore_conflicts=True)
+        TestUser.objects.bulk_update(to_update, ['full_name', 'full_name_key'], batch_size=batch_size)
+        created = set(TestUser.objects.filter(cin__in=new_cins).values_list('cin', flat=True)) if new_cins else set()
+
+    duration = time.perf_counter() - started
+    return {
+        'created': len(created),
+        'updated': len(to_update),
+        'existing': len(existing),
+        'skipped': [cin for cin in new_cins if cin not in created],
+        'duration_seconds': round(duration, 3),
+        'rows_per_second': round(len(names) / duration, 1) if duration > 0 else 0,
+    }
+
+
+def provision_diff(rows):
+    """
+    Aperçu de bulk_provision sans rien écrire: pour chaque (cin, full_name)
+    de `rows` (CIN uniques), l'action qui serait faite, en une requête pour
+    tout le lot (pas de lecture par ligne). Retourne
+    [(cin, full_name, nom actuel, action), ...] dans l'ordre de `rows`:
+    - 'create': compte à créer;
+    - 'complete_name': compte existant sans nom, le nom sera complété;
+    - 'name_differs': compte existant avec un autre nom (conservé);
+    - 'unchanged': compte existant, rien à faire.
+    """
+    current_names = dict(TestUser.objects.filter(
+        cin__in=[cin for cin, _full_name in rows]
+    ).values_list('cin', 'full_name'))
+
+    diff = []
+    for cin, full_name in rows:
+        if cin not in current_names:
+            action = 'create'
+        elif not current_names[cin]:
+            action = 'complete_name' if full_name else 'unchanged'
+        elif full_name and normalize_full_name(full_name) != normalize_full_name(current_names[cin]):
+            action = 'name_differs'
+        else:
+            action = 'unchanged'
+        diff.append((cin, full_name, current_names.get(cin, ''), action))
+    return diff
+
+
+def provision_test_users(cins=None, batch_size=500, workers=None):
+    """
+    Crée les TestUser manquants des participants HSE (tous, ou ceux de
+    `cins`) et relie chaque HSEUser à son compte.
+    Retourne {'created': n, 'linked': n, 'existing': n}.
+    """
+    hse_users = HSEUser.objects.all()
+    if cins is not None:
+        hse_users = hse_users.filter(cin__in=list(cins))
+    hse_users = list(hse_users.only('id', 'cin', 'nom', 'prénom', 'test_user_id'))
+
+    result = bulk_provision(
+        [(hse_user.cin, hse_user.full_name) for hse_user in hse_users],
+        batch_size=batch_size,
+        workers=workers
+    )
+
+    user_ids = dict(TestUser.objects.filter(
+        cin__in=[hse_user.cin for hse_user in hse_users]
+    ).values_list('cin', 'id'))
+    to_link = []
+    for hse_user in hse_users:
+        user_id = user_ids.get(hse_user.cin)
+        if user_id and hse_user.test_user_id != user_id:
+            hse_user.test_user_id = user_id
+            to_link.append(hse_user)
+    HSEUser.objects.bulk_update(to_link, ['test_user'], batch_size=batch_size)
+
+    return {
+        'created': result['created'],
+        'linked': len(to_link),
+        'existing': result['existing'],
+    }
+
+
+def provision_managers(cins=None, batch_size=500, workers=None):
+    """
+    Crée les comptes TestUser manquants des managers HSE (tous, ou ceux de
+    `cins`): usernames alloués en une requête pour tout le lot
+    (allocate_usernames), mots de passe (= CIN) hachés en parallèle.
+    Retourne {'created': n, 'existing': n, 'skipped': [cin, ...]}: comme
+    pour bulk_provision, `skipped` liste les CIN non créés (conflit de
+    username ou insertion concurrente).
+    """
+    managers = HSEManager.objects.all()
+    if cins is not None:
+        managers = managers.filter(cin__in=list(cins))
+    managers = [manager for manager in managers if manager.cin]
+
+    existing = set(TestUser.objects.filter(
+        cin__in=[manager.cin for manager in managers]
+    ).values_list('cin', flat=True))
+    new_managers = [manager for manager in managers if manager.cin not in existing]
+
+    usernames = TestUser.objects.allocate_usernames([manager.full_name for manager in new_managers])
+    hashed = hash_passwords([manager.cin for manager in new_managers], workers=workers)
+    new_cins = [manager.cin for manager in new_managers]
+
+    with transaction.atomic():
+        TestUser.objects.bulk_create(
+            [
+                TestUser(
+                    cin=manager.cin,
+                    username=username,
+                    full_name=manager.full_name,
+                    full_name_key=normalize_full_name(manager.full_name),
+                    user_type='manager',
+                    password=password,
+                )
+                for manager, username, password in zip(new_managers, usernames, hashed)
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        created = set(TestUser.objects.filter(cin__in=new_cins).values_list('cin', flat=True)) if new_cins else set()
+
+    return {
+        'created': len(created),
+        'existing': len(existing),
+        'skipped': [cin for cin in new_cins if cin not in created],
+    }
+
+
+def unprovisioned_count():
+    """Participants HSE sans compte TestUser (connexion par ticket impossible)"""
+    return HSEUser.objects.exclude(cin__in=TestUser.objects.values('cin')).count()
+
+
+# ==================== PRÉPARATION DE SÉANCE ====================
+
+def read_roster(roster_file):
+    """CIN d'une liste d'émargement Excel (colonne CIN obligatoire)"""
+    with open_excel(roster_file, lowercase=True, as_text=True) as rows:
+        if 'cin' not in rows.headers:
+            raise ValueError("La liste doit contenir une colonne CIN.")
+        return [row['cin'] for row in rows if row['cin']]
+
+
+def prepare_session(entreprise=None, entite=None, cins=None, tests=None, langues=LANGUES, workers=None):
+    """
+    Prépare les participants d'une séance: ceux de l'entreprise / l'entité
+    et/ou de la liste `cins`. Crée et relie les TestUser manquants, met les
+    comptes en cache, puis compile corrigés et paquets de questions des
+    `tests` (versions actives par défaut) pour chaque langue.
+    """
+    hse_users = HSEUser.objects.all()
+    if entreprise:
+        hse_users = hse_users.filter(entreprise__iexact=entreprise)
+    if entite:
+        hse_users = hse_users.filter(entite__iexact=entite)
+    if cins is not None:
+        hse_users = hse_users.filter(cin__in=list(cins))
+    participant_cins = list(hse_users.values_list('cin', flat=True))
+
+    accounts = provision_test_users(cins=participant_cins, workers=workers)
+
+    users = list(TestUser.objects.filter(cin__in=participant_cins))
+    remember_users(users)
+
+    if tests is None:
+        tests = Test.objects.filter(is_active=True)
+    warmed = []
+    for test in tests:
+        get_answer_key(test)
+        for langue in langues:
+            get_question_bundle(test, langue)
+        warmed.append(test.version)
+
+    return {
+        'participants': len(participant_cins),
+        'accounts_created': accounts['created'],
+        'accounts_linked': accounts['linked'],
+        'users_cached': len(users),
+        'unknown_cins': sorted(set(cins) - set(participant_cins)) if cins is not None else [],
+        'tests_warmed': warmed,
+    }
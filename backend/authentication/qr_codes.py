@@ -0,0 +1,137 @@
+# authentication/qr_codes.py
+"""
+QR codes de séance mis en cache.
+
+Les tableaux de bord des managers interrogent la génération du QR en
+boucle. Le contenu du QR (payload, ticket signé compris) et ses images
+PNG/SVG sont donc construits une fois par (test, version du payload) puis
+gardés dans le cache Django, avec un ETag stable servi par l'endpoint
+image.
+
+La version du payload change quand le test est modifié (updated_at), quand
+QR_PAYLOAD_VERSION change (format du payload), ou à chaque demi-durée de
+validité du ticket: un QR servi depuis le cache reste valable au moins
+QR_TICKET_MAX_AGE / 2 secondes.
+"""
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import qrcode
+import qrcode.image.svg
+from django.core.cache import cache
+
+from authentication.tickets import issue_qr_ticket, ticket_max_age
+
+CACHE_PREFIX = 'authentication:qr'
+QR_PAYLOAD_VERSION = 1
+
+FRONTEND_QR_LOGIN_URL = "http://10.26.31.10:5173/qr-login/{test_id}?ticket={ticket}"
+
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def _payload_key(test_id, test):
+    updated_at = test.updated_at.timestamp() if test is not None and test.updated_at else 0
+    # Nouveau ticket à chaque demi-durée de validité
+    window = int(time.time() // max(1, ticket_max_age() // 2))
+    return f'{CACHE_PREFIX}:{test_id}:{updated_at}:{window}:v{QR_PAYLOAD_VERSION}'
+
+
+def _build_payload(test_id, test):
+    """Données encodées dans le QR (communes à tous les managers)"""
+    ticket = issue_qr_ticket(test_id)
+    return {
+        'test_id': test_id,
+        'test_title': str(test) if test is not None else f"Test #{test_id}",
+        'action': 'access_test',
+        'ticket': ticket,
+        'generated_at': datetime.now().isoformat(),
+        'expires_in': ticket_max_age(),
+        'url': FRONTEND_QR_LOGIN_URL.format(test_id=test_id, ticket=ticket),
+    }
+
+
+def get_qr_payload(test_id, test=None):
+    """
+    Payload du QR de `test_id` et sa clé de cache (version du payload).
+    `test` est None si le test n'existe pas (QR générique, comme avant).
+    """
+    key = _payload_key(test_id, test)
+    payload = cache.get(key)
+    if payload is None:
+        payload = _build_payload(test_id, test)
+        cache.set(key, payload, ticket_max_age() // 2 + 60)
+    return payload, key
+
+
+def qr_etag(payload_key, image_format):
+    digest = hashlib.sha1(f'{payload_key}:{image_format}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def render_qr(payload, image_format):
+    """Image du QR (octets) au format 'png' ou 'svg'"""
+    data = json.dumps(payload)
+    buffer = io.BytesIO()
+    if image_format == 'svg':
+        qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qrcode.make(data).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _render_qr_args(args):
+    return render_qr(*args)
+
+
+def get_qr_images(tests, image_format='png', workers=None):
+    """
+    Images du QR de plusieurs tests ({test_id: octets}), dans l'ordre de
+    `tests` ([(test_id, test ou None), ...]). Les images absentes du cache
+    sont rendues en parallèle sur `workers` processus puis mises en cache.
+    """
+    keys = {}
+    payloads = {}
+    for test_id, test in tests:
+        payload, payload_key = get_qr_payload(test_id, test)
+        payloads[test_id] = payload
+        keys[test_id] = f'{payload_key}:{image_format}'
+
+    images = cache.get_many(list(keys.values()))
+    missing = [test_id for test_id, key in keys.items() if key not in images]
+
+    workers = workers or os.cpu_count() or 1
+    jobs = [(payloads[test_id], image_format) for test_id in missing]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            rendered = list(pool.map(_render_qr_args, jobs))
+    else:
+        rendered = [render_qr(*job) for job in jobs]
+
+    fresh = {keys[test_id]: image for test_id, image in zip(missing, rendered)}
+    cache.set_many(fresh, ticket_max_age() // 2 + 60)
+    images.update(fresh)
+
+    return {test_id: images[key] for test_id, key in keys.items()}
+
+
+def get_qr_image(test_id, image_format, test=None):
+    """
+    Image du QR de `test_id` (cache → rendu).
+    Retourne (octets, content type, ETag).
+    """
+    payload, payload_key = get_qr_payload(test_id, test)
+    key = f'{payload_key}:{image_format}'
+    image = cache.get(key)
+    if image is None:
+        image = render_qr(payload, image_format)
+        cache.set(key, image, ticket_max_age() // 2 + 60)
+    return image, IMAGE_FORMATS[image_format], qr_etag(payload_key, image_format)
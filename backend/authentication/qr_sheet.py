@@ -0,0 +1,68 @@
+# authentication/qr_sheet.py
+"""
+Planche imprimable des QR codes de séance (PDF, une page par QR).
+
+Avant une journée d'induction sur plusieurs salles, on imprime le QR de
+chaque version de test pour chaque salle. Les QR sont ceux de
+`manager_generate_test_qr` (même payload, même cache); les images
+manquantes sont rendues en parallèle (qr_codes.get_qr_images).
+"""
+import io
+from datetime import datetime, timedelta
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from tests.models import Test
+from authentication.qr_codes import get_qr_payload, get_qr_images
+
+QR_SIZE = 14 * cm
+
+
+def sheet_tests(test_ids=None):
+    """Tests à imprimer (tous par défaut), par version"""
+    tests = Test.objects.order_by('version')
+    if test_ids:
+        tests = tests.filter(id__in=test_ids)
+    return list(tests)
+
+
+def build_qr_sheet(tests, rooms=None, workers=None):
+    """
+    PDF (octets) avec une page par (test, salle). `rooms` est une liste de
+    libellés de salle imprimés sous le QR (une page par test si vide).
+    """
+    rooms = rooms or [None]
+    images = get_qr_images([(test.id, test) for test in tests], 'png', workers=workers)
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle("QR codes - séance HSE")
+    width, height = A4
+
+    for test in tests:
+        payload, _payload_key = get_qr_payload(test.id, test)
+        qr_image = ImageReader(io.BytesIO(images[test.id]))
+        expires_at = datetime.fromisoformat(payload['generated_at']) + timedelta(seconds=payload['expires_in'])
+
+        for room in rooms:
+            pdf.setFont('Helvetica-Bold', 24)
+            pdf.drawCentredString(width / 2, height - 3 * cm, payload['test_title'])
+            if room:
+                pdf.setFont('Helvetica-Bold', 18)
+                pdf.drawCentredString(width / 2, height - 4.2 * cm, f"Salle : {room}")
+
+            pdf.drawImage(qr_image, (width - QR_SIZE) / 2, height - 5 * cm - QR_SIZE, QR_SIZE, QR_SIZE)
+
+            pdf.setFont('Helvetica', 13)
+            pdf.drawCentredString(width / 2, height - 6 * cm - QR_SIZE,
+                                  "Scannez ce QR code puis entrez votre CIN pour commencer le test.")
+            pdf.setFont('Helvetica', 10)
+            pdf.drawCentredString(width / 2, 2 * cm,
+                                  f"Version {test.version} - valable jusqu'au {expires_at.strftime('%d/%m/%Y %H:%M')}")
+            pdf.showPage()
+
+    pdf.save()
+    return buffer.getvalue()
@@ -0,0 +1,27 @@
+# authentication/signals.py
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import TestUser
+from .user_cache import invalidate_user, remember_user
+
+
+@receiver(post_save, sender=TestUser)
+@receiver(post_delete, sender=TestUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Compte modifié (is_active, mot de passe, ...) ou supprimé: l'entrée en cache est périmée"""
+    invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def invalidate_user_on_logout(sender, user=None, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
+
+
+@receiver(user_logged_in)
+def cache_user_on_login(sender, user=None, **kwargs):
+    """Après update_last_login: la première requête de la session est servie par le cache"""
+    if user is not None:
+        remember_user(user)
@@ -1,3 +1,425 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from authentication import provisioning, views
+from authentication.admission import AdmissionController, get_admission_controller
+from authentication.backend import HSEManagerBackend, QRTicketBackend
+from authentication.import_jobs import claim_import, process_import, run_import_worker
+from authentication.models import ImportJob, TestUser, normalize_full_name
+from authentication.tickets import issue_qr_ticket
+from authentication.user_cache import get_cached_user, remember_user
+from hse_app.models import HSEManager
+from hse_app.testing import excel_upload
+from tests.models import Test
+
+
+class AllocateUsernamesTests(TestCase):
+    """Usernames uniques en une requête: casse, doublons du lot et bases suffixées"""
+
+    def test_existing_usernames_are_skipped_whatever_their_case(self):
+        TestUser.objects.create(cin='AA1', username='Ali_Ben', full_name='Ali Ben')
+        TestUser.objects.create(cin='AA2', username='ali_ben_1', full_name='Ali Ben')
+
+        self.assertEqual(TestUser.objects.allocate_usernames(['Ali Ben']), ['ali_ben_2'])
+
+    def test_batch_duplicates_and_suffixed_bases_do_not_collide(self):
+        usernames = TestUser.objects.allocate_usernames(['Ali', 'Ali', 'Ali 1', 'Ali', None])
+
+        self.assertEqual(usernames[:4], ['ali', 'ali_1', 'ali_1_1', 'ali_2'])
+        self.assertTrue(usernames[4].startswith('user_'))
+        self.assertEqual(len(set(usernames)), len(usernames))
+
+    def test_suffixed_base_first_in_batch(self):
+        self.assertEqual(TestUser.objects.allocate_usernames(['Ali 1', 'Ali', 'Ali']), ['ali_1', 'ali', 'ali_2'])
+
+
+class ProvisioningTests(TestCase):
+    """Création en nombre: hachage parallèle et conflits ignorés"""
+
+    def test_hash_passwords_in_spawned_processes_keeps_order(self):
+        # Processus 'spawn': ils hachent avec les réglages du projet, pas ceux du test
+        raw_passwords = ['CIN1', 'CIN2']
+        with mock.patch.object(provisioning, 'PARALLEL_HASH_THRESHOLD', 2):
+            hashed = provisioning.hash_passwords(raw_passwords, workers=2)
+
+        self.assertEqual(len(hashed), len(raw_passwords))
+        for raw_password, encoded in zip(raw_passwords, hashed):
+            self.assertTrue(check_password(raw_password, encoded))
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_bulk_provision_creates_and_completes_names(self):
+        TestUser.objects.create(cin='B1', username='user_B1', full_name='')
+
+        result = provisioning.bulk_provision([('B1', 'Amine Ali'), ('B2', 'Sara Ben'), ('B2', ''), ('', 'Sans CIN')])
+
+        self.assertEqual((result['created'], result['updated'], result['existing']), (1, 1, 1))
+        self.assertEqual(result['skipped'], [])
+        self.assertEqual(TestUser.objects.get(cin='B1').full_name, 'Amine Ali')
+        created = TestUser.objects.get(cin='B2')
+        self.assertEqual((created.username, created.full_name_key), ('user_B2', 'sara ben'))
+        self.assertTrue(created.check_password('B2'))
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_provision_managers_skips_conflicts(self):
+        TestUser.objects.create(cin='M0', username='pris', full_name='Pris')
+        HSEManager.objects.create(full_name='Manager Deux', cin='M2')
+        HSEManager.objects.create(full_name='Manager Un', cin='M1')
+
+        # Username pris entre l'allocation et l'insertion: compte ignoré, pas d'erreur
+        with mock.patch.object(TestUser.objects, 'allocate_usernames', return_value=['manager_deux', 'pris']):
+            result = provisioning.provision_managers(workers=1)
+
+        self.assertEqual(result, {'created': 1, 'existing': 0, 'skipped': ['M1']})
+        self.assertEqual(TestUser.objects.get(cin='M2').user_type, 'manager')
+
+
+class QRTicketBackendTests(TestCase):
+    """Connexion ticket QR + CIN: une lecture si le compte existe, refus sans repli si le ticket est mauvais"""
+
+    def setUp(self):
+        self.user = TestUser.objects.create(cin='QR001', username='user_QR001', full_name='Participant QR', password='!')
+        self.backend = QRTicketBackend()
+
+    def test_valid_ticket_is_a_single_read(self):
+        ticket = issue_qr_ticket(7)
+        with self.assertNumQueries(1):
+            user = self.backend.authenticate(None, cin='QR001', ticket=ticket, test_id=7)
+        self.assertEqual(user, self.user)
+
+    def test_bad_tickets_are_refused(self):
+        tickets = {
+            'falsifié': issue_qr_ticket(7)[:-2] + 'xx',
+            'autre test': issue_qr_ticket(8),
+            'vide': '',
+        }
+        for label, ticket in tickets.items():
+            with self.subTest(ticket=label), self.assertNumQueries(0):
+                with self.assertRaises(PermissionDenied):
+                    self.backend.authenticate(None, cin='QR001', ticket=ticket, test_id=7)
+
+    @override_settings(QR_TICKET_MAX_AGE=-1)
+    def test_expired_ticket_is_refused(self):
+        with self.assertRaises(PermissionDenied):
+            self.backend.authenticate(None, cin='QR001', ticket=issue_qr_ticket(7), test_id=7)
+
+    def test_without_ticket_other_backends_decide(self):
+        self.assertIsNone(self.backend.authenticate(None, cin='QR001'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserCacheTests(TestCase):
+    """Cache des utilisateurs de session: servi sans requête, purgé par les update() groupés"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = TestUser.objects.create(cin='UC001', username='user_UC001', full_name='Cache', password='!')
+        self.user.set_password('UC001')
+        self.user.save()
+        remember_user(self.user)
+
+    def test_cached_user_without_password_hash(self):
+        with self.assertNumQueries(0):
+            cached = get_cached_user(self.user.pk)
+        self.assertEqual((cached.pk, cached.cin), (self.user.pk, 'UC001'))
+        self.assertNotIn('password', cached.__dict__)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached.get_session_auth_hash(), self.user.get_session_auth_hash())
+
+    def test_update_filtered_by_pk_invalidates_entry(self):
+        TestUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertNumQueries(1):
+            self.assertFalse(get_cached_user(self.user.pk).is_active)
+
+    def test_update_on_other_filter_invalidates_everything(self):
+        other = TestUser.objects.create(cin='UC002', username='user_UC002', full_name='Autre', password='!')
+        remember_user(other)
+
+        with self.assertNumQueries(1):  # l'UPDATE seul, pas de SELECT des pk
+            TestUser.objects.filter(cin__startswith='UC').update(full_name='Renommé')
+
+        for user in (self.user, other):
+            with self.assertNumQueries(1):
+                self.assertEqual(get_cached_user(user.pk).full_name, 'Renommé')
+
+
+class QRImageTests(TestCase):
+    """Image du QR: rendue une fois par version, 304 sur If-None-Match, nouvel ETag si le test change"""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = TestUser.objects.create(cin='MQR1', username='manager_qr', full_name='Manager QR',
+                                               user_type='manager', password='!')
+        self.test = Test.objects.create(version=3, ordre_questions=[], mandatory_questions=[])
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        request = self.factory.get('/', **headers)
+        request.user = self.manager
+        return views.manager_test_qr_image(request, test_id=self.test.id, image_format='svg')
+
+    def test_etag_and_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        etag = response['ETag']
+
+        with mock.patch('authentication.qr_codes.render_qr') as render_qr:
+            cached = self.get()
+            not_modified = self.get(HTTP_IF_NONE_MATCH=etag)
+        render_qr.assert_not_called()
+        self.assertEqual((cached.status_code, cached['ETag']), (200, etag))
+        self.assertEqual((not_modified.status_code, not_modified['ETag']), (304, etag))
+        self.assertIn('private', not_modified['Cache-Control'])
+
+        self.test.version = 4
+        self.test.save()
+        self.assertNotEqual(self.get(HTTP_IF_NONE_MATCH=etag)['ETag'], etag)
+
+    def test_unknown_format_and_non_manager(self):
+        request = self.factory.get('/')
+        request.user = self.manager
+        self.assertEqual(views.manager_test_qr_image(request, test_id=self.test.id, image_format='gif').status_code, 400)
+
+        request.user = TestUser.objects.create(cin='P1', username='user_P1', full_name='Participant', password='!')
+        self.assertEqual(views.manager_test_qr_image(request, test_id=self.test.id, image_format='png').status_code, 403)
+
+
+class AdmissionControlTests(TestCase):
+    """Contrôle d'admission: 429 immédiat avec retry_after, seaux par test bornés"""
+
+    @override_settings(AUTH_ADMISSION_RATE=0.5, AUTH_ADMISSION_BURST=2)
+    def test_burst_then_429_with_retry_after(self):
+        factory = RequestFactory()
+
+        def post():
+            request = factory.post('/', json.dumps({'cin': ''}), content_type='application/json')
+            return views.authenticate_hse_user_and_start_test(request, test_id=1)
+
+        # Admises (puis refusées pour CIN vide), la troisième est refusée sans être traitée
+        self.assertEqual([post().status_code for _ in range(2)], [400, 400])
+        with self.assertNumQueries(0):
+            response = post()
+        self.assertEqual(response.status_code, 429)
+        retry_after = json.loads(response.content)['retry_after']
+        self.assertGreaterEqual(retry_after, 1)
+        self.assertEqual(response['Retry-After'], str(retry_after))
+        self.assertEqual(get_admission_controller().snapshot()['global'], {'admitted': 2, 'rejected': 1})
+
+    def test_disabled_by_default(self):
+        self.assertEqual(get_admission_controller().admit(1), (True, 0))
+
+    def test_per_test_buckets(self):
+        controller = AdmissionController(rate=0.5, burst=10, per_test_rate=0.5, per_test_burst=1, max_tests=2)
+
+        self.assertTrue(controller.admit(1)[0])
+        self.assertFalse(controller.admit(1)[0])  # seau du test 1 vide, seau global intact
+        self.assertTrue(controller.admit(2)[0])
+        self.assertTrue(controller.admit(3)[0])
+
+        snapshot = controller.snapshot()
+        self.assertEqual(snapshot['global'], {'admitted': 3, 'rejected': 0})
+        self.assertEqual(list(snapshot['tests']), ['2', '3'])  # le test 1, le plus ancien, est oublié
+        self.assertAlmostEqual(controller.bucket.tokens, 7, places=1)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ManagerLoginTests(TestCase):
+    """Connexion manager par nom complet: clé normalisée indexée, homonymes départagés par le CIN"""
+
+    def setUp(self):
+        self.backend = HSEManagerBackend()
+        self.fatima = TestUser.objects.create_manager(cin='FZ001', full_name='Fâtima Zohra')
+        self.homonym = TestUser.objects.create_manager(cin='FZ002', full_name='FATIMA ZOHRA')
+
+    def test_full_name_key(self):
+        self.assertEqual(normalize_full_name('  Fâtima   ZOHRA '), 'fatima zohra')
+        self.assertEqual(self.fatima.full_name_key, 'fatima zohra')
+
+    def test_login_ignores_case_accents_and_spaces(self):
+        with self.assertNumQueries(1):
+            user = self.backend.authenticate(None, full_name=' fatima  zohra', cin='FZ002')
+        self.assertEqual(user, self.homonym)
+        self.assertEqual(self.backend.authenticate(None, full_name='Fatima Zohra', cin='FZ001'), self.fatima)
+        self.assertIsNone(self.backend.authenticate(None, full_name='Fatima Zohra', cin='FZ003'))
+
+    def test_first_login_creates_account_from_hse_manager(self):
+        HSEManager.objects.create(full_name='Karim El Amrani', cin='KE001')
+
+        user = self.backend.authenticate(None, full_name='karim el amrani', cin='KE001')
+
+        self.assertEqual((user.cin, user.user_type, user.full_name_key), ('KE001', 'manager', 'karim el amrani'))
+        self.assertIsNone(self.backend.authenticate(None, full_name='karim el amrani', cin='WRONG'))
+
+
+class ImportJobTestMixin:
+    """Imports d'apprenants: fichiers et cache dans un dossier temporaire, appels d'API en manager"""
+
+    ROWS = [
+        ['CIN', 'FULL_NAME'],
+        ['IM001', 'Apprenant Un'],
+        ['', 'Sans CIN'],
+        ['IM002', 'Apprenant Deux'],
+        ['IM001', 'Doublon'],
+        ['IM003', 'Apprenant Trois'],
+    ]
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=media_root,
+            EXCEL_CACHE_DIR=f'{media_root}/excel_cache',
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.factory = APIRequestFactory()
+        self.manager = TestUser.objects.create(cin='IMGR1', username='import_manager', full_name='Manager Import',
+                                               user_type='manager', password='!')
+
+    def call(self, view, user=None, method='get', data=None, **kwargs):
+        if method == 'get':
+            request = self.factory.get('/', data or {})
+        else:
+            request = self.factory.post('/', data or {}, format='multipart')
+        force_authenticate(request, user=user or self.manager)
+        response = view(request, **kwargs)
+        response.render()
+        return response
+
+    def upload(self, rows=None, **data):
+        response = self.call(views.UploadApprenantsView.as_view(), method='post',
+                             data={'file': excel_upload(rows or self.ROWS), **data})
+        self.assertEqual(response.status_code, 202)
+        return ImportJob.objects.get(id=response.data['job_id'])
+
+    def run_worker(self):
+        return run_import_worker(threading.Event(), once=True, workers=1)
+
+
+class ImportJobTests(ImportJobTestMixin, TestCase):
+    """Import en arrière-plan: lots validés un à un, reprise après le dernier lot, accès réservé"""
+
+    def test_import_in_chunks_with_row_errors(self):
+        job = self.upload(chunk_size=2)
+        self.assertEqual(job.status, 'pending')
+
+        with mock.patch('authentication.import_jobs.bulk_provision', wraps=provisioning.bulk_provision) as provision:
+            self.run_worker()
+        self.assertEqual(provision.call_count, 3)  # 5 lignes par lots de 2
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed, job.created, job.failed), ('done', 5, 3, 2))
+        self.assertEqual(set(TestUser.objects.filter(cin__startswith='IM0').values_list('cin', flat=True)),
+                         {'IM001', 'IM002', 'IM003'})
+
+        response = self.call(views.ImportStatusView.as_view(), data={'page_size': 1}, job_id=job.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['errors'], [{'line': 3, 'cin': '', 'message': 'CIN manquant'}])
+        self.assertEqual(response.data['pagination']['total_count'], 2)
+
+    def test_resume_after_last_committed_chunk(self):
+        job = self.upload(chunk_size=2)
+        real_provision = provisioning.bulk_provision
+        calls = []
+
+        def crash_on_second_chunk(rows, **kwargs):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError('worker arrêté')
+            return real_provision(rows, **kwargs)
+
+        # Un seul passage (le worker reprendrait aussitôt le job remis en attente)
+        with mock.patch('authentication.import_jobs.bulk_provision', side_effect=crash_on_second_chunk), \
+                self.assertLogs('authentication.import_jobs', 'ERROR'):
+            process_import(claim_import(), workers=1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_line, job.rows_processed, job.created), ('pending', 3, 2, 1))
+
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed, job.created, job.failed), ('done', 5, 3, 2))
+        self.assertEqual(job.row_errors.count(), 2)
+
+    def test_managers_only_and_own_jobs(self):
+        participant = TestUser.objects.create(cin='P2', username='user_P2', full_name='Participant', password='!')
+        response = self.call(views.UploadApprenantsView.as_view(), participant, method='post',
+                             data={'file': excel_upload(self.ROWS)})
+        self.assertEqual(response.status_code, 403)
+
+        job = self.upload()
+        other = TestUser.objects.create(cin='IMGR2', username='other_manager', full_name='Autre', user_type='manager',
+                                        password='!')
+        staff = TestUser.objects.create(cin='STF2', username='staff2', full_name='Staff', is_staff=True, password='!')
+        statuses = {
+            user.cin: self.call(views.ImportStatusView.as_view(), user, job_id=job.id).status_code
+            for user in (participant, other, staff, self.manager)
+        }
+        self.assertEqual(statuses, {'P2': 403, 'IMGR2': 403, 'STF2': 200, 'IMGR1': 200})
+
+    def test_missing_columns_rejected_before_enqueue(self):
+        response = self.call(views.UploadApprenantsView.as_view(), method='post',
+                             data={'file': excel_upload([['CIN', 'NOM'], ['X1', 'Nom']])})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+
+class ImportDiffTests(ImportJobTestMixin, TestCase):
+    """Aperçu d'import: changements prévus sans rien écrire, puis application par le même traitement"""
+
+    def setUp(self):
+        super().setUp()
+        TestUser.objects.create(cin='IM001', username='user_IM001', full_name='', password='!')
+        TestUser.objects.create(cin='IM002', username='user_IM002', full_name='Autre Nom', password='!')
+
+    def test_preview_then_apply(self):
+        job = self.upload(dry_run='true')
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'previewed')
+        self.assertFalse(TestUser.objects.filter(cin='IM003').exists())
+        self.assertEqual(TestUser.objects.get(cin='IM001').full_name, '')
+
+        response = self.call(views.ImportDiffView.as_view(), data={'action': 'name_differs'}, job_id=job.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'],
+                         {'create': 1, 'complete_name': 1, 'name_differs': 1, 'unchanged': 0})
+        self.assertEqual(response.data['rows'], [{
+            'line': 4, 'cin': 'IM002', 'full_name': 'Apprenant Deux',
+            'current_full_name': 'Autre Nom', 'action': 'name_differs'
+        }])
+
+        response = self.call(views.ImportApplyView.as_view(), method='post', job_id=job.id)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(job.row_errors.count(), 0)  # erreurs de l'aperçu supprimées, recalculées à l'application
+
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.dry_run, job.created, job.failed), ('done', False, 1, 2))
+        self.assertEqual(TestUser.objects.get(cin='IM001').full_name, 'Apprenant Un')
+        self.assertEqual(TestUser.objects.get(cin='IM002').full_name, 'Autre Nom')
+
+        # Déjà appliqué: 409
+        response = self.call(views.ImportApplyView.as_view(), method='post', job_id=job.id)
+        self.assertEqual(response.status_code, 409)
+
+    def test_managers_only(self):
+        job = self.upload(dry_run='true')
+        participant = TestUser.objects.create(cin='P3', username='user_P3', full_name='Participant', password='!')
+
+        self.assertEqual(self.call(views.ImportDiffView.as_view(), participant, job_id=job.id).status_code, 403)
+        self.assertEqual(
+            self.call(views.ImportApplyView.as_view(), participant, method='post', job_id=job.id).status_code, 403
+        )
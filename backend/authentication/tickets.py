@@ -0,0 +1,52 @@
+# authentication/tickets.py
+"""
+Tickets QR signés pour les séances d'induction.
+
+Le QR généré par le manager contient un ticket signé (HMAC, SECRET_KEY)
+qui porte la version de test et expire après QR_TICKET_MAX_AGE secondes.
+Le participant présente ce ticket avec son CIN: la signature se vérifie
+sans accès base, puis un seul SELECT sur le CIN (index unique) suffit à
+ouvrir la session (voir `QRTicketBackend`).
+"""
+from django.conf import settings
+from django.core import signing
+
+TICKET_SALT = 'authentication.qr-ticket'
+
+# Durée de validité par défaut: une journée de séances
+DEFAULT_MAX_AGE = 12 * 3600
+
+
+class InvalidQRTicket(Exception):
+    """Ticket falsifié, expiré ou émis pour un autre test"""
+
+
+def ticket_max_age():
+    return getattr(settings, 'QR_TICKET_MAX_AGE', DEFAULT_MAX_AGE)
+
+
+def issue_qr_ticket(test_id, issued_by=None):
+    """Ticket signé et horodaté pour le test `test_id`"""
+    payload = {'test_id': test_id}
+    if issued_by is not None:
+        payload['issued_by'] = issued_by
+    return signing.dumps(payload, salt=TICKET_SALT, compress=True)
+
+
+def read_qr_ticket(ticket, test_id=None):
+    """
+    Vérifie la signature et l'expiration d'un ticket et retourne son contenu.
+    Si `test_id` est fourni, le ticket doit avoir été émis pour ce test.
+    """
+    if not ticket:
+        raise InvalidQRTicket("Ticket manquant")
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=ticket_max_age())
+    except signing.SignatureExpired:
+        raise InvalidQRTicket("QR code expiré")
+    except signing.BadSignature:
+        raise InvalidQRTicket("QR code invalide")
+
+    if test_id is not None and str(payload.get('test_id')) != str(test_id):
+        raise InvalidQRTicket("QR code émis pour un autre test")
+    return payload
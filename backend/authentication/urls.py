@@ -1,15 +1,23 @@
 # authentication/urls.py
 from django.urls import path
 from . import views
-from .views import UploadApprenantsView
+from .views import UploadApprenantsView, ImportStatusView, ImportDiffView, ImportApplyView, PrepareSessionView, SessionPrepStatusView
 
 app_name = 'auth'
 
 urlpatterns = [
     path('test/<int:test_id>/auth/', views.authenticate_hse_user_and_start_test, name='auth_start_test'),
     path('manager/generate-qr/<int:test_id>/', views.manager_generate_test_qr, name='manager_generate_qr'),
+    path('manager/qr/<int:test_id>/<str:image_format>/', views.manager_test_qr_image, name='manager_qr_image'),
+    path('manager/qr-sheet/', views.manager_print_qr_sheet, name='manager_qr_sheet'),
     path('decode-qr/', views.decode_qr_and_prepare_test, name='decode_qr'),
     path('current-user/', views.get_current_user, name='current_user'),
+    path('admission-metrics/', views.admission_metrics, name='admission_metrics'),
     path('logout/', views.logout_user, name='logout'),
     path("import-apprenants/", UploadApprenantsView.as_view()),
+    path("import-apprenants/<uuid:job_id>/", ImportStatusView.as_view(), name='import_status'),
+    path("import-apprenants/<uuid:job_id>/diff/", ImportDiffView.as_view(), name='import_diff'),
+    path("import-apprenants/<uuid:job_id>/apply/", ImportApplyView.as_view(), name='import_apply'),
+    path("prepare-session/", PrepareSessionView.as_view(), name='prepare_session'),
+    path("prepare-session/<uuid:job_id>/", SessionPrepStatusView.as_view(), name='prepare_session_status'),
 ]
@@ -0,0 +1,112 @@
+# authentication/user_cache.py
+"""
+Résolution des utilisateurs de session avec un cache court.
+
+Django appelle `get_user` du backend d'authentification à chaque requête
+authentifiée: sans cache, un SELECT sur TestUser par appel API et par
+tablette. Les trois backends passent par `get_cached_user`, qui garde
+l'utilisateur AUTH_USER_CACHE_TIMEOUT secondes (60 par défaut) dans le
+cache Django.
+
+Seuls les champs utiles à request.user sont mis en cache, pas le hash du
+mot de passe: l'empreinte de session (vérifiée par Django à chaque
+requête) est calculée à la mise en cache et gardée à côté. L'utilisateur
+relu du cache a son mot de passe différé (save() n'écrit que les champs
+chargés).
+
+L'utilisateur est mis en cache dès la connexion. L'entrée est supprimée
+à chaque sauvegarde ou suppression du TestUser, à chaque `update()`
+groupé filtré par pk (bulk_update compris) et à la déconnexion
+(authentication/signals.py). Un `update()` sur un autre filtre incrémente
+la génération du cache: toutes les entrées sont périmées d'un coup, sans
+relire les pk concernés. Le délai court borne la durée pendant laquelle
+un autre processus (cache local non partagé) peut servir une version
+périmée.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from authentication.models import TestUser
+
+CACHE_PREFIX = 'authentication:user'
+GENERATION_KEY = f'{CACHE_PREFIX}:generation'
+DEFAULT_TIMEOUT = 60
+
+# Champs mis en cache: tous sauf le hash du mot de passe
+CACHED_FIELDS = tuple(
+    field.attname for field in TestUser._meta.concrete_fields if field.attname != 'password'
+)
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Départ daté: une génération évincée du cache ne ressert pas d'anciennes entrées
+        cache.add(GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(GENERATION_KEY, 0)
+    return generation
+
+
+def _cache_key(user_id, generation):
+    return f'{CACHE_PREFIX}:{generation}:{user_id}'
+
+
+def _entry(user):
+    return tuple(getattr(user, name) for name in CACHED_FIELDS), user.get_session_auth_hash()
+
+
+def _user(entry):
+    values, session_auth_hash = entry
+    user = TestUser.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, values)
+    user.cached_session_auth_hash = session_auth_hash
+    return user
+
+
+def user_cache_timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def get_cached_user(user_id):
+    """Utilisateur `user_id` (cache → base), ou None s'il n'existe pas"""
+    entry = cache.get(_cache_key(user_id, _generation()))
+    if entry is not None:
+        return _user(entry)
+
+    try:
+        user = TestUser.objects.get(pk=user_id)
+    except (TestUser.DoesNotExist, ValueError, TypeError):
+        return None
+
+    remember_user(user)
+    return user
+
+
+def remember_user(user):
+    """Met en cache un utilisateur déjà chargé (à la connexion)"""
+    cache.set(_cache_key(user.pk, _generation()), _entry(user), user_cache_timeout())
+
+
+def remember_users(users):
+    """Met en cache un lot d'utilisateurs (préparation de séance), en un appel"""
+    generation = _generation()
+    cache.set_many({_cache_key(user.pk, generation): _entry(user) for user in users}, user_cache_timeout())
+
+
+def invalidate_user(user_id):
+    cache.delete(_cache_key(user_id, _generation()))
+
+
+def invalidate_users(user_ids):
+    generation = _generation()
+    cache.delete_many([_cache_key(user_id, generation) for user_id in user_ids])
+
+
+def invalidate_all_users():
+    """Périme toutes les entrées (update() groupé sans filtre par pk)"""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        _generation()
@@ -1,18 +1,28 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 import json
-import qrcode
-import io
-import base64
 from datetime import datetime
 from authentication.models import TestUser
+from authentication.tickets import read_qr_ticket, InvalidQRTicket
+from authentication.qr_codes import get_qr_payload, get_qr_image, qr_etag, IMAGE_FORMATS
+from authentication.qr_sheet import build_qr_sheet, sheet_tests
+from authentication.admission import get_admission_controller
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from authentication.importExcel import importexcel
+from django.core.paginator import Paginator
+from authentication.models import ImportJob, SessionPrepJob
+from authentication.importExcel import REQUIRED_COLUMNS, MISSING_COLUMNS_MESSAGE
+from authentication.import_jobs import (
+    enqueue_import, job_status, apply_import, diff_summary, enqueue_session_prep, session_prep_status
+)
+from hse_app.excel_reader import ExcelRows, ExcelFormatError
+from authentication.provisioning import read_roster, LANGUES
 
 # ==================== API POUR MANAGER (PC) ====================
 # Authentification: full_name (username) + CIN (mot de passe)
@@ -73,11 +83,21 @@ def manager_login(request):
     }, status=405)
 
 
+def _get_test_or_none(test_id):
+    try:
+        from tests.models import Test
+        return Test.objects.get(id=test_id)
+    except Exception:
+        return None
+
+
 @login_required
 def manager_generate_test_qr(request, test_id):
     """
     API pour le MANAGER sur PC: génère un QR code pour un test
-    GET: /api/manager/tests/123/generate-qr/
+    GET: /api/auth/manager/generate-qr/123/
+    Le QR (payload et ticket signé) est mis en cache par test: les images
+    PNG/SVG sont servies par manager_test_qr_image, pas en base64 ici.
     """
     if not request.user.is_manager:
         return JsonResponse({
@@ -88,43 +108,22 @@ def manager_generate_test_qr(request, test_id):
     if request.method == 'GET':
         try:
             # Vérifier si le test existe
-            try:
-                from tests.models import Test
-                test = Test.objects.get(id=test_id)
-                test_title = test.title
-                test_duration = test.duration_minutes
-            except:
-                test_title = f"Test #{test_id}"
-                test_duration = 30
-
-            # Données à encoder dans le QR
-            qr_payload = {
-                'test_id': test_id,
-                'test_title': test_title,
-                'action': 'access_test',
-                'generated_at': datetime.now().isoformat(),
-                'generated_by': request.user.full_name,
-                'url': f"http://10.26.31.10:5173/qr-login/{test_id}"
-} 
+            test = _get_test_or_none(test_id)
+            test_duration = test.duration_minutes if test is not None else 30
 
-            # Convertir en JSON
-            qr_string = json.dumps(qr_payload)
-
-            # Générer QR code
-            qr = qrcode.make(qr_string)
-            buffer = io.BytesIO()
-            qr.save(buffer, format="PNG")
-            qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+            qr_payload, _payload_key = get_qr_payload(test_id, test)
 
             return JsonResponse({
                 'success': True,
-                'qr_code': f"data:image/png;base64,{qr_base64}",
+                'qr_code_url': reverse('auth:manager_qr_image', args=[test_id, 'png']),
+                'qr_code_svg_url': reverse('auth:manager_qr_image', args=[test_id, 'svg']),
                 'test_info': {
                     'id': test_id,
-                    'title': test_title,
+                    'title': qr_payload['test_title'],
                     'duration': test_duration
                 },
                 'qr_payload': qr_payload,
+                'generated_by': request.user.full_name,
                 'instructions': "Affichez ce QR code aux employés. Ils devront le scanner et entrer leur CIN."
             })
 
@@ -140,6 +139,88 @@ def manager_generate_test_qr(request, test_id):
     }, status=405)
 
 
+@login_required
+def manager_test_qr_image(request, test_id, image_format):
+    """
+    Image du QR code d'un test (PNG ou SVG), depuis le cache.
+    GET: /api/auth/manager/qr/123/png/
+    ETag stable par version du QR: If-None-Match → 304 sans rendu.
+    """
+    if not request.user.is_manager:
+        return JsonResponse({
+            'success': False,
+            'error': 'Accès réservé aux managers'
+        }, status=403)
+
+    if request.method != 'GET':
+        return JsonResponse({
+            'success': False,
+            'error': 'Méthode non autorisée'
+        }, status=405)
+
+    if image_format not in IMAGE_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'error': f"Format d'image inconnu: {image_format} (png ou svg)"
+        }, status=400)
+
+    test = _get_test_or_none(test_id)
+    _payload, payload_key = get_qr_payload(test_id, test)
+    etag = qr_etag(payload_key, image_format)
+
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+    else:
+        image, content_type, etag = get_qr_image(test_id, image_format, test)
+        response = HttpResponse(image, content_type=content_type)
+
+    response['ETag'] = etag
+    # Réservé aux managers connectés: pas de cache partagé
+    patch_cache_control(response, private=True, max_age=300)
+    return response
+
+
+@login_required
+def manager_print_qr_sheet(request):
+    """
+    PDF imprimable des QR codes de plusieurs tests (une page par test et par salle)
+    GET: /api/auth/manager/qr-sheet/?tests=1,2,3&rooms=Salle A,Salle B
+    Sans `tests`: toutes les versions.
+    """
+    if not request.user.is_manager:
+        return JsonResponse({
+            'success': False,
+            'error': 'Accès réservé aux managers'
+        }, status=403)
+
+    if request.method != 'GET':
+        return JsonResponse({
+            'success': False,
+            'error': 'Méthode non autorisée'
+        }, status=405)
+
+    try:
+        test_ids = [int(value) for value in request.GET.get('tests', '').split(',') if value.strip()]
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Paramètre tests invalide (ids séparés par des virgules)'
+        }, status=400)
+    rooms = [room.strip() for room in request.GET.get('rooms', '').split(',') if room.strip()]
+
+    tests = sheet_tests(test_ids)
+    if not tests:
+        return JsonResponse({
+            'success': False,
+            'error': 'Aucun test trouvé'
+        }, status=404)
+
+    pdf = build_qr_sheet(tests, rooms=rooms)
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="qr_codes_{datetime.now().strftime("%Y%m%d")}.pdf"'
+    return response
+
+
 # ==================== API POUR UTILISATEUR HSE (MOBILE) ====================
 # Authentification: CIN uniquement (1 seul champ après scan QR)
 
@@ -171,6 +252,17 @@ def decode_qr_and_prepare_test(request):
                     'error': 'ID de test manquant dans le QR'
                 }, status=400)
 
+            # QR signé: vérifier le ticket avant la saisie du CIN
+            ticket = qr_data.get('ticket')
+            if ticket:
+                try:
+                    read_qr_ticket(ticket, test_id=test_id)
+                except InvalidQRTicket as e:
+                    return JsonResponse({
+                        'success': False,
+                        'error': str(e)
+                    }, status=401)
+
             # Récupérer les infos du test
             try:
                 from tests.models import Test
@@ -178,11 +270,12 @@ def decode_qr_and_prepare_test(request):
 
                 test_info = {
                     'id': test.id,
-                    'title': test.title,
+                    'title': str(test),
+                    'version': test.version,
                     'description': test.description,
                     'duration_minutes': test.duration_minutes,
-                    'questions_count': test.questions.count() if hasattr(test, 'questions') else 0,
-                    'category': test.category.name if test.category else 'Général'
+                    'questions_count': test.questions_count,
+                    'category': 'Général'
                 }
             except Exception:
                 test_info = {
@@ -197,6 +290,7 @@ def decode_qr_and_prepare_test(request):
             return JsonResponse({
                 'success': True,
                 'test': test_info,
+                'ticket': ticket,
                 'next_step': 'cin_required',
                 'message': 'Veuillez entrer votre CIN pour commencer le test'
             })
@@ -223,12 +317,27 @@ def authenticate_hse_user_and_start_test(request, test_id):
     """
     API pour authentifier un utilisateur HSE avec son CIN et démarrer le test.
     UN SEUL CHAMP: CIN
-    POST: {"cin": "AB123456"}
+    POST: {"cin": "AB123456", "ticket": "..."}
+    Avec le ticket du QR signé, la connexion se fait en une lecture
+    (compte pré-provisionné, sinon créé à la volée); sans ticket, création
+    du compte à la volée.
+    Soumis au contrôle d'admission: 429 + retry_after pendant une rafale.
     """
     if request.method == 'POST':
+        admitted, retry_after = get_admission_controller().admit(test_id)
+        if not admitted:
+            response = JsonResponse({
+                'success': False,
+                'error': f'Trop de connexions simultanées. Réessayez dans {retry_after} s.',
+                'retry_after': retry_after
+            }, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+
         try:
             data = json.loads(request.body)
             cin = data.get('cin', '').strip().upper()
+            ticket = data.get('ticket')
 
             if not cin:
                 return JsonResponse({
@@ -246,12 +355,16 @@ def authenticate_hse_user_and_start_test(request, test_id):
                     'error': f'Test #{test_id} non trouvé'
                 }, status=404)
 
-            user = authenticate(request, cin=cin)
+            if ticket:
+                user = authenticate(request, cin=cin, ticket=ticket, test_id=test_id)
+            else:
+                user = authenticate(request, cin=cin)
 
             if user is None:
                 return JsonResponse({
                     'success': False,
-                    'error': 'CIN non reconnu. Vérifiez votre numéro.'
+                    'error': 'CIN non reconnu ou QR code expiré. Vérifiez votre numéro.'
+                    if ticket else 'CIN non reconnu. Vérifiez votre numéro.'
                 }, status=401)
 
             # Vérifier que c'est bien un utilisateur HSE (pas un manager)
@@ -312,7 +425,8 @@ def authenticate_hse_user_and_start_test(request, test_id):
                 'test_session': {
                     'id': session_id,
                     'test_id': test.id,
-                    'test_title': test.title,
+                    'test_version': test.version,
+                    'test_title': str(test),
                     'started_at': datetime.now().isoformat(),
                     'duration_minutes': test.duration_minutes,
                     'questions_count': len(questions)
@@ -409,6 +523,25 @@ def submit_test_answers(request, test_session_id):
 
 # ==================== API UTILITAIRES ====================
 
+@login_required
+def admission_metrics(request):
+    """
+    Métriques du contrôle d'admission de ce processus: configuration et
+    connexions admises / refusées (`admitted`, `rejected`), globales et par test
+    GET: /api/auth/admission-metrics/
+    """
+    if not request.user.is_staff:
+        return JsonResponse({
+            'success': False,
+            'error': 'Accès non autorisé'
+        }, status=403)
+
+    return JsonResponse({
+        'success': True,
+        'admission': get_admission_controller().snapshot()
+    })
+
+
 @login_required
 def get_current_user(request):
     """Récupérer l'utilisateur courant"""
@@ -446,8 +579,16 @@ def calculate_score(test_session):
 class UploadApprenantsView(APIView):
     """
     Upload d'un fichier Excel pour importer des apprenants HSE.
+    L'import est traité en arrière-plan, par lots de `chunk_size` lignes;
+    suivre la progression sur `status_url`. Nécessite un worker démarré
+    (`manage.py process_imports`): sans lui, le job reste `pending`.
+    Avec dry_run=true, rien n'est écrit: le worker prépare l'aperçu des
+    changements (`diff_url`), appliqué ensuite par `apply_url`.
     """
     def post(self, request):
+        if not (request.user.is_staff or request.user.is_manager):
+            return Response({"error": "Accès réservé aux managers."}, status=status.HTTP_403_FORBIDDEN)
+
         excel_file = request.FILES.get("file")
 
         if not excel_file:
@@ -456,10 +597,232 @@ class UploadApprenantsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Appel du service d'import
-        result = importexcel(excel_file)
+        # Vérification immédiate des en-têtes (lecture de la première ligne seulement)
+        try:
+            with ExcelRows(excel_file, lowercase=True) as excel_rows:
+                if not REQUIRED_COLUMNS.issubset(excel_rows.headers):
+                    raise ExcelFormatError(MISSING_COLUMNS_MESSAGE)
+        except ExcelFormatError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            chunk_size = int(request.data.get("chunk_size") or 0) or None
+        except ValueError:
+            return Response({"error": "chunk_size invalide"}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true", "yes")
+
+        job = enqueue_import(
+            excel_file,
+            submitted_by=request.user,
+            chunk_size=chunk_size,
+            dry_run=dry_run
+        )
+
+        return Response(_import_job_response(job), status=status.HTTP_202_ACCEPTED)
+
+
+def _import_job_response(job):
+    """Statut d'un import et liens de suivi (aperçu et application si dry_run)"""
+    data = {**job_status(job), "status_url": reverse('auth:import_status', args=[job.id])}
+    if job.dry_run:
+        data["diff_url"] = reverse('auth:import_diff', args=[job.id])
+        data["apply_url"] = reverse('auth:import_apply', args=[job.id])
+    return data
+
+
+def _pagination(request, default_page_size=100):
+    """(page, page_size) de la requête; ValueError si illisibles"""
+    page = int(request.GET.get('page', 1))
+    page_size = min(int(request.GET.get('page_size', default_page_size)), 1000)
+    return page, page_size
+
+
+def _pagination_data(paginator, page_obj, page_size):
+    return {
+        "page": page_obj.number,
+        "page_size": page_size,
+        "total_count": paginator.count,
+        "total_pages": paginator.num_pages,
+        "has_next": page_obj.has_next(),
+        "has_previous": page_obj.has_previous()
+    }
+
+
+class ImportStatusView(APIView):
+    """
+    Progression d'un import (lignes traitées, comptes créés / existants,
+    lignes en erreur) et erreurs par ligne, paginées (?page=&page_size=).
+    Réservé au manager qui a lancé l'import et au staff.
+    """
+    def get(self, request, job_id):
+        if not (request.user.is_staff or request.user.is_manager):
+            return Response({"error": "Accès réservé aux managers."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            job = ImportJob.objects.get(id=job_id)
+        except ImportJob.DoesNotExist:
+            return Response({"error": "Import non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not request.user.is_staff and job.submitted_by_id != request.user.id:
+            return Response({"error": "Cet import a été lancé par un autre utilisateur."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            page, page_size = _pagination(request)
+        except ValueError:
+            return Response({"error": "Pagination invalide"}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = Paginator(job.row_errors.order_by('line', 'id'), page_size)
+        page_obj = paginator.get_page(page)
+
+        return Response({
+            **_import_job_response(job),
+            "errors": [
+                {"line": error.line, "cin": error.cin, "message": error.message}
+                for error in page_obj
+            ],
+            "pagination": _pagination_data(paginator, page_obj, page_size)
+        })
+
+
+class ImportDiffView(APIView):
+    """
+    Aperçu d'un import (dry_run): nombre de lignes par action et lignes
+    paginées, filtrables par action (?action=create&page=&page_size=).
+    """
+    def get(self, request, job_id):
+        if not (request.user.is_staff or request.user.is_manager):
+            return Response({"error": "Accès réservé aux managers."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            job = ImportJob.objects.get(id=job_id)
+        except ImportJob.DoesNotExist:
+            return Response({"error": "Import non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            page, page_size = _pagination(request)
+        except ValueError:
+            return Response({"error": "Pagination invalide"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = job.diff_rows.order_by('line')
+        action = request.GET.get('action')
+        if action:
+            rows = rows.filter(action=action)
+
+        paginator = Paginator(rows, page_size)
+        page_obj = paginator.get_page(page)
+
+        return Response({
+            **_import_job_response(job),
+            "summary": diff_summary(job),
+            "rows": [
+                {
+                    "line": row.line,
+                    "cin": row.cin,
+                    "full_name": row.full_name,
+                    "current_full_name": row.current_full_name,
+                    "action": row.action
+                }
+                for row in page_obj
+            ],
+            "pagination": _pagination_data(paginator, page_obj, page_size)
+        })
+
+
+class ImportApplyView(APIView):
+    """Applique un aperçu terminé: l'import repart en arrière-plan, cette fois pour de bon"""
+    def post(self, request, job_id):
+        if not (request.user.is_staff or request.user.is_manager):
+            return Response({"error": "Accès réservé aux managers."}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            job = ImportJob.objects.get(id=job_id)
+        except ImportJob.DoesNotExist:
+            return Response({"error": "Import non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+
+        if not apply_import(job):
+            return Response(
+                {"error": "Seul un aperçu terminé peut être appliqué.", "status": job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        return Response(_import_job_response(job), status=status.HTTP_202_ACCEPTED)
+
+
+#==================== API POUR PRÉPARER UNE SÉANCE ====================
+
+class PrepareSessionView(APIView):
+    """
+    Prépare une séance avant l'arrivée des participants: comptes TestUser
+    créés et reliés, caches des utilisateurs et des questions chauffés.
+    POST (JSON ou multipart): {"entreprise": "...", "entite": "...", "test_id": 1,
+                               "langues": ["fr", "ar"]} et/ou un fichier "roster" (colonne CIN)
+    La requête vérifie la demande et lit la liste, puis répond 202: le
+    hachage des mots de passe est fait par le worker process_imports
+    (suivi sur `status_url`).
+    """
+    def post(self, request):
+        if not (request.user.is_staff or request.user.is_manager):
+            return Response({"error": "Accès réservé aux managers."}, status=status.HTTP_403_FORBIDDEN)
+
+        entreprise = (request.data.get("entreprise") or "").strip() or None
+        entite = (request.data.get("entite") or "").strip() or None
+
+        cins = None
+        roster = request.FILES.get("roster")
+        if roster:
+            try:
+                cins = read_roster(roster)
+            except Exception as e:
+                return Response({"error": f"Liste invalide : {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not (entreprise or entite or cins):
+            return Response(
+                {"error": "Indiquez une entreprise, une entité ou une liste de participants."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        test_ids = None
+        test_id = request.data.get("test_id")
+        if test_id:
+            from tests.models import Test
+            test_ids = list(Test.objects.filter(id=test_id).values_list('id', flat=True))
+            if not test_ids:
+                return Response({"error": f"Test #{test_id} non trouvé"}, status=status.HTTP_404_NOT_FOUND)
+
+        langues = request.data.get("langues") or list(LANGUES)
+        if isinstance(langues, str):
+            langues = [langue.strip() for langue in langues.split(",") if langue.strip()]
+        unknown = [langue for langue in langues if langue not in LANGUES]
+        if unknown:
+            return Response({"error": f"Langue non prise en charge : {', '.join(unknown)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        job = enqueue_session_prep(
+            submitted_by=request.user,
+            entreprise=entreprise,
+            entite=entite,
+            cins=cins,
+            test_ids=test_ids,
+            langues=langues
+        )
+        return Response(_session_prep_response(job), status=status.HTTP_202_ACCEPTED)
+
+
+def _session_prep_response(job):
+    return {**session_prep_status(job), "status_url": reverse('auth:prepare_session_status', args=[job.id])}
+
+
+class SessionPrepStatusView(APIView):
+    """Statut d'une préparation de séance et, une fois terminée, son résultat"""
+    def get(self, request, job_id):
+        if not (request.user.is_staff or request.user.is_manager):
+            return Response({"error": "Accès réservé aux managers."}, status=status.HTTP_403_FORBIDDEN)
 
-        if result.get("status") == "error":
-            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = SessionPrepJob.objects.get(id=job_id)
+        except SessionPrepJob.DoesNotExist:
+            return Response({"error": "Préparation non trouvée"}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(result, status=status.HTTP_201_CREATED)
+        return Response(_session_prep_response(job))
@@ -0,0 +1,34 @@
+# certificats/issuing.py
+from datetime import datetime, timedelta
+import uuid
+
+from .models import Certificate
+
+
+def issue_certificate(attempt):
+    """
+    Retourne le certificat d'une tentative réussie, en le créant s'il
+    n'existe pas encore. Retourne None si la tentative n'est pas réussie.
+    """
+    if not attempt.passed:
+        return None
+
+    existing = Certificate.objects.filter(test_attempt=attempt).first()
+    if existing:
+        return existing
+
+    user_full_name = attempt.user.full_name or attempt.user.username
+    user_cin = attempt.user.cin
+
+    certificate_number = f"HSE-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
+    expiry_date = (datetime.now() + timedelta(days=365)).date()
+
+    return Certificate.objects.create(
+        test_attempt=attempt,
+        certificate_number=certificate_number,
+        user_full_name=user_full_name,
+        user_cin=user_cin,
+        test_version=attempt.test.version,
+        score=int(attempt.overall_score_percentage),
+        expiry_date=expiry_date
+    )
@@ -1,3 +1,47 @@
+from django.core.files.base import ContentFile
 from django.test import TestCase
 
-# Create your tests here.
+from certificats import views
+from certificats.views_api import CertificateViewSet, search_certificate_by_name
+from hse_app.testing import QueryBudgetMixin
+
+
+class CertificatsViewsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets de requêtes SQL des vues certificats/views.py et views_api.py"""
+
+    QUERY_BUDGETS = {
+        'download_certificate': 2,
+        'generate_certificate': 2,
+        'download_certificate_by_id': 1,
+        'search_certificate_by_name': 2,
+        'certificates_list': 1,
+        'certificates_retrieve': 1,
+        'certificates_download': 1,
+        'certificates_search': 3,
+        'certificates_generate_from_attempt': 3,
+        'certificates_search_public': 3,
+    }
+
+    def endpoints(self, data):
+        # PDF réel (MEDIA_ROOT temporaire): le téléchargement mesure l'envoi du fichier, pas le 404
+        data.certificate.pdf_file.save('certificat.pdf', ContentFile(b'%PDF-1.4\n%%EOF\n'))
+        search = {'user_name': 'Participant'}
+        return {
+            'download_certificate': self.get(views.download_certificate, data.participant,
+                                             user_id=data.participant.id, test_id=data.test.id),
+            'generate_certificate': self.get(views.generate_certificate, data.participant, attempt_id=data.attempt.id),
+            'download_certificate_by_id': self.get(views.download_certificate_by_id, data.participant,
+                                                   certificate_id=data.certificate.id),
+            'search_certificate_by_name': self.post(views.search_certificate_by_name, data.participant, search),
+            'certificates_list': self.api(CertificateViewSet.as_view({'get': 'list'}), data.participant),
+            'certificates_retrieve': self.api(CertificateViewSet.as_view({'get': 'retrieve'}), data.participant,
+                                              pk=data.certificate.id),
+            'certificates_download': self.api(CertificateViewSet.as_view({'get': 'download'}), data.participant,
+                                              pk=data.certificate.id),
+            'certificates_search': self.api(CertificateViewSet.as_view({'post': 'search'}), data.staff,
+                                            method='post', payload=search),
+            'certificates_generate_from_attempt': self.api(CertificateViewSet.as_view({'post': 'generate_from_attempt'}),
+                                                           data.participant, method='post',
+                                                           payload={'attempt_id': data.attempt.id}),
+            'certificates_search_public': self.api(search_certificate_by_name, data.staff, method='post', payload=search),
+        }
@@ -7,6 +7,7 @@ from authentication.models import TestUser
 from tests.models import TestAttempt
 from hse_app.models import HSEUser
 from .models import Certificate
+from .issuing import issue_certificate
 from datetime import datetime, timedelta
 import json
 import uuid
@@ -73,21 +74,7 @@ def generate_certificate(request, attempt_id):
             })
         
         # Créer un nouveau certificat
-        user_full_name = attempt.user.full_name or attempt.user.username
-        user_cin = attempt.user.cin
-        
-        certificate_number = f"HSE-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
-        expiry_date = (datetime.now() + timedelta(days=365)).date()
-        
-        certificate = Certificate.objects.create(
-            test_attempt=attempt,
-            certificate_number=certificate_number,
-            user_full_name=user_full_name,
-            user_cin=user_cin,
-            test_version=attempt.test.version,
-            score=int(attempt.overall_score_percentage),
-            expiry_date=expiry_date
-        )
+        certificate = issue_certificate(attempt)
         
         return JsonResponse({
             'success': True,
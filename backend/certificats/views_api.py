@@ -8,6 +8,7 @@ from datetime import timedelta, datetime
 import uuid
 
 from .models import Certificate
+from .issuing import issue_certificate
 from .serializers_api import (
     CertificateListSerializer, CertificateDetailSerializer,
     CertificateSearchSerializer
@@ -44,7 +45,7 @@ class CertificateViewSet(viewsets.ReadOnlyModelViewSet):
         """Retourner les certificats de l'utilisateur actuel"""
         return Certificate.objects.filter(
             test_attempt__user=self.request.user
-        ).order_by('-issued_date')
+        ).select_related('test_attempt').order_by('-issued_date')
     
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
@@ -84,7 +85,7 @@ class CertificateViewSet(viewsets.ReadOnlyModelViewSet):
                 'error': 'Veuillez fournir un nom ou un CIN'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        queryset = Certificate.objects.all()
+        queryset = Certificate.objects.select_related('test_attempt')
         
         if user_cin:
             queryset = queryset.filter(user_cin=user_cin)
@@ -145,21 +146,7 @@ class CertificateViewSet(viewsets.ReadOnlyModelViewSet):
                 })
             
             # Créer un nouveau certificat
-            user_full_name = attempt.user.full_name or attempt.user.username
-            user_cin = attempt.user.cin
-            
-            certificate_number = f"HSE-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
-            expiry_date = (datetime.now() + timedelta(days=365)).date()
-            
-            certificate = Certificate.objects.create(
-                test_attempt=attempt,
-                certificate_number=certificate_number,
-                user_full_name=user_full_name,
-                user_cin=user_cin,
-                test_version=attempt.test.version,
-                score=int(attempt.overall_score_percentage),
-                expiry_date=expiry_date
-            )
+            certificate = issue_certificate(attempt)
             
             serializer = CertificateDetailSerializer(certificate)
             
@@ -189,7 +176,7 @@ def search_certificate_by_name(request):
             'error': 'Veuillez fournir un nom ou un CIN'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    queryset = Certificate.objects.all()
+    queryset = Certificate.objects.select_related('test_attempt')
     
     if user_cin:
         queryset = queryset.filter(user_cin=user_cin)
@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import SubmissionJob
 
-# Register your models here.
+
+@admin.register(SubmissionJob)
+class SubmissionJobAdmin(admin.ModelAdmin):
+    """Suivi de la file des soumissions asynchrones"""
+    list_display = ('id', 'attempt', 'status', 'tries', 'submitted_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('attempt', 'answers', 'submitted_at', 'result', 'error', 'created_at', 'started_at', 'finished_at')
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        """Remettre en attente les soumissions sélectionnées"""
+        updated = queryset.exclude(status='done').update(status='pending', tries=0, error='')
+        self.message_user(request, f'{updated} soumission(s) remise(s) en attente.')
+    requeue.short_description = "Remettre en attente"
@@ -0,0 +1,205 @@
+# hse_app/excel_cache.py
+"""
+Cache des classeurs Excel déjà lus, indexé par le contenu du fichier.
+
+Même en flux (ExcelRows), lire un .xlsx reste l'étape la plus lente des
+imports: décompression et analyse du XML de la feuille, cellule par
+cellule. Un même fichier est pourtant souvent relu: aperçu puis
+application d'un import, fichier envoyé deux fois, statistiques du jour
+recalculées. `open_excel` enregistre la première lecture complète à côté
+(EXCEL_CACHE_DIR/{sha256}-{options}.ndjson: une ligne de description puis
+[numéro de ligne, cellules] par ligne) et les lectures suivantes du même
+contenu relisent ce fichier, projeté en mémoire (mmap), sans ouvrir le
+classeur.
+
+Les cellules gardent leur type (dates et heures codées à part). Un fichier
+de cache n'apparaît qu'une fois la feuille lue jusqu'au bout (écrit à
+côté puis renommé): une lecture interrompue ne laisse rien d'incomplet.
+"""
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from hse_app.excel_reader import ExcelRows
+
+# Incrémenter quand ExcelRows change sa lecture: les anciens fichiers sont ignorés
+CACHE_VERSION = 1
+CACHE_MAX_AGE = datetime.timedelta(days=30)
+
+_TYPES = {
+    '$datetime': datetime.datetime.fromisoformat,
+    '$date': datetime.date.fromisoformat,
+    '$time': datetime.time.fromisoformat,
+    '$timedelta': lambda seconds: datetime.timedelta(seconds=seconds),
+}
+
+
+def excel_cache_dir():
+    """Dossier du cache, None si désactivé (EXCEL_CACHE_DIR vide)"""
+    cache_dir = getattr(settings, 'EXCEL_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'excel_cache')
+    return Path(cache_dir) if cache_dir else None
+
+
+def content_digest(source):
+    """Empreinte SHA-256 d'un chemin ou d'un fichier ouvert (remis au début)"""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as source_file:
+            for block in iter(lambda: source_file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    source.seek(0)
+    for block in iter(lambda: source.read(1024 * 1024), b''):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {'$time': value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {'$timedelta': value.total_seconds()}
+    raise TypeError(f"Valeur de cellule non prévue : {type(value).__name__}")
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        key, value = next(iter(obj.items()))
+        if key in _TYPES:
+            return _TYPES[key](value)
+    return obj
+
+
+def _dump(value):
+    return json.dumps(value, default=_encode, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def cache_path(cache_dir, digest, header_contains=None, lowercase=False, as_text=False, sheet=None):
+    """Fichier de cache d'un contenu lu avec ces options (en-têtes et valeurs en dépendent)"""
+    options = json.dumps([CACHE_VERSION, header_contains, lowercase, as_text, sheet])
+    return Path(cache_dir) / f"{digest}-{hashlib.sha1(options.encode('utf-8')).hexdigest()[:12]}.ndjson"
+
+
+class CachedExcelRows:
+    """Lignes d'un classeur déjà lu, relues depuis le cache (même interface qu'ExcelRows)"""
+
+    from_cache = True
+
+    def __init__(self, path):
+        with open(path, 'rb') as cache_file:
+            self._map = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = json.loads(self._map.readline())
+        self.headers = header['headers']
+        self.header_line = header['header_line']
+        self.row_count_hint = header['row_count_hint']
+
+    def numbered(self):
+        """(numéro de ligne Excel, dict) pour chaque ligne, comme à la première lecture"""
+        for raw in iter(self._map.readline, b''):
+            line, cells = json.loads(raw, object_hook=_decode)
+            yield line, dict(zip(self.headers, cells))
+
+    def __iter__(self):
+        for _line, row in self.numbered():
+            yield row
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CachingExcelRows(ExcelRows):
+    """ExcelRows qui enregistre les lignes lues dans le cache, une fois la feuille lue en entier"""
+
+    from_cache = False
+
+    def __init__(self, source, path, **options):
+        super().__init__(source, **options)
+        self.cache_path = Path(path)
+
+    def numbered(self):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_path.parent, suffix='.tmp')
+        except OSError:
+            # Cache inutilisable (droits, disque): lecture simple
+            yield from super().numbered()
+            return
+
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as cache_file:
+                cache_file.write(_dump({
+                    'headers': self.headers,
+                    'header_line': self.header_line,
+                    'row_count_hint': self.row_count_hint,
+                }))
+                for line, row in super().numbered():
+                    cache_file.write(_dump([line, list(row.values())]))
+                    yield line, row
+            os.replace(temp_path, self.cache_path)
+            complete = True
+        finally:
+            if not complete and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def open_excel(source, digest=None, **options):
+    """
+    Lignes de `source` (chemin ou fichier ouvert), comme ExcelRows(source,
+    **options): depuis le cache si ce contenu a déjà été lu avec ces
+    options, sinon lues dans le classeur et mises en cache au passage.
+    `digest`: SHA-256 du contenu s'il est déjà connu (évite de le relire).
+    """
+    cache_dir = excel_cache_dir()
+    if cache_dir is None:
+        return ExcelRows(source, **options)
+
+    path = cache_path(cache_dir, digest or content_digest(source), **options)
+    try:
+        rows = CachedExcelRows(path)
+    except FileNotFoundError:
+        pass
+    else:
+        os.utime(path)  # dernière utilisation, pour purge_excel_cache
+        return rows
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return ExcelRows(source, **options)
+    return CachingExcelRows(source, path, **options)
+
+
+def purge_excel_cache(max_age=CACHE_MAX_AGE):
+    """Supprime les fichiers du cache inutilisés depuis plus de `max_age`"""
+    cache_dir = excel_cache_dir()
+    if cache_dir is None or not cache_dir.is_dir():
+        return 0
+    limit = time.time() - max_age.total_seconds()
+    removed = 0
+    for path in cache_dir.iterdir():
+        try:
+            if path.stat().st_mtime < limit:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue  # supprimé entre-temps par un autre processus
+    return removed
@@ -0,0 +1,134 @@
+# hse_app/excel_reader.py
+"""
+Lecture en flux des fichiers Excel (.xlsx).
+
+`pd.read_excel` charge tout le classeur en mémoire (DataFrame complet) et
+importe pandas dans le processus web. Les imports (apprenants, listes
+d'émargement, fichiers de statistiques) n'ont besoin que de parcourir les
+lignes une à une: `ExcelRows` s'appuie sur openpyxl en lecture seule
+(`iter_rows`), qui lit la feuille au fil de l'eau, et produit un dict
+{en-tête: valeur} par ligne, en mémoire constante quelle que soit la
+taille du fichier.
+
+Comme avec pandas: les colonnes sans en-tête sont ignorées, les lignes
+vides sautées, les en-têtes en double suffixés (".1", ".2"...).
+"""
+import datetime
+import zipfile
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+
+class ExcelFormatError(ValueError):
+    """Fichier illisible ou en-tête introuvable"""
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _as_text(value):
+    """Valeur de cellule en texte (équivalent de dtype=str + fillna(''))"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, datetime.datetime) and value.time() == datetime.time():
+        value = value.date()
+    return str(value).strip()
+
+
+class ExcelRows:
+    """
+    Lignes d'une feuille Excel, en dicts, lues en flux:
+
+        with ExcelRows(fichier, lowercase=True, as_text=True) as rows:
+            if 'cin' not in rows.headers: ...
+            for line, row in rows.numbered():
+                row['cin']
+
+    `header_contains`: l'en-tête est la première ligne dont une cellule
+    contient ce texte (fichiers avec un titre au-dessus du tableau); sinon
+    la première ligne non vide. `lowercase` met les en-têtes en minuscules,
+    `as_text` convertit toutes les valeurs en texte ('' pour une cellule
+    vide). `source` est un chemin ou un fichier ouvert (upload Django).
+    """
+
+    def __init__(self, source, header_contains=None, lowercase=False, as_text=False, sheet=None):
+        self.header_contains = header_contains
+        self.lowercase = lowercase
+        self.as_text = as_text
+
+        try:
+            self.workbook = load_workbook(source, read_only=True, data_only=True)
+        except (InvalidFileException, zipfile.BadZipFile, KeyError) as e:
+            raise ExcelFormatError(f"Fichier Excel (.xlsx) illisible : {e}") from e
+
+        worksheet = self.workbook[sheet] if sheet else self.workbook.worksheets[0]
+        self._rows = worksheet.iter_rows(values_only=True)
+        self.header_line = 0
+        self.headers = []
+        self._columns = []
+        self._find_header()
+
+        # Lignes sous l'en-tête d'après les dimensions enregistrées dans le
+        # fichier (lignes vides comprises), None si le fichier ne les donne pas
+        max_row = worksheet.max_row
+        self.row_count_hint = max(0, max_row - self.header_line) if max_row else None
+
+    def _find_header(self):
+        for line, values in enumerate(self._rows, start=1):
+            if all(_is_blank(value) for value in values):
+                continue
+            if self.header_contains and not any(
+                isinstance(value, str) and self.header_contains in value for value in values
+            ):
+                continue
+            self.header_line = line
+            self._set_headers(values)
+            return
+        self.close()
+        if self.header_contains:
+            raise ExcelFormatError(f"Impossible de trouver l'en-tête ({self.header_contains}) dans ce fichier.")
+        raise ExcelFormatError("Le fichier est vide.")
+
+    def _set_headers(self, values):
+        seen = {}
+        for index, value in enumerate(values):
+            if _is_blank(value):
+                continue  # colonne sans en-tête ('Unnamed' avec pandas)
+            header = str(value).strip()
+            if self.lowercase:
+                header = header.lower()
+            if header in seen:
+                seen[header] += 1
+                header = f"{header}.{seen[header]}"
+            else:
+                seen[header] = 0
+            self.headers.append(header)
+            self._columns.append(index)
+
+    def numbered(self):
+        """(numéro de ligne Excel, dict) pour chaque ligne non vide sous l'en-tête"""
+        for line, values in enumerate(self._rows, start=self.header_line + 1):
+            cells = [values[index] if index < len(values) else None for index in self._columns]
+            if all(_is_blank(value) for value in cells):
+                continue
+            if self.as_text:
+                cells = [_as_text(value) for value in cells]
+            yield line, dict(zip(self.headers, cells))
+
+    def __iter__(self):
+        for _line, row in self.numbered():
+            yield row
+
+    def close(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
@@ -0,0 +1,219 @@
+# hse_app/loadtest.py
+"""
+Simulation d'une séance d'induction HSE.
+
+N participants simulés rejouent le parcours complet contre la vraie
+configuration d'URL (django.test.Client, donc middlewares, session et
+authentification compris):
+1. scan du QR          -> auth:decode_qr
+2. saisie du CIN       -> auth:auth_start_test (avec le ticket signé du QR
+                          si la séance est pré-provisionnée)
+3. démarrage du test   -> start_test_attempt
+4. soumission          -> submit_test_answers
+
+Pour chaque endpoint on mesure la latence (p50/p95/p99), le nombre de
+requêtes SQL par appel et le débit. Une connexion refusée par le contrôle
+d'admission (429) est rejouée après son `retry_after`, comme doit le
+faire le client. Utilisé par la commande `bench_induction` pour dimensionner le serveur avant une grosse
+séance.
+"""
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from tests.models import Test, Question
+from hse_app.models import HSEUser
+
+ENDPOINTS = ['decode_qr', 'auth_start_test', 'start_test_attempt', 'submit_test_answers']
+
+QUESTIONS_COUNT = 21
+MANDATORY_COUNT = 9
+
+
+# ==================== JEU DE DONNÉES ====================
+
+def seed_session(participants):
+    """Crée une version de test et les participants (HSEUser) de la séance"""
+    Question.objects.bulk_create([
+        Question(
+            question_code=f'BENCH-Q{index}',
+            enonce_fr=f'Question de charge {index}',
+            enonce_en=f'Load question {index}',
+            reponse_correcte=bool(index % 2),
+            is_mandatory=index <= MANDATORY_COUNT,
+        )
+        for index in range(1, QUESTIONS_COUNT + 1)
+    ], ignore_conflicts=True)
+    answer_key = dict(Question.objects.filter(
+        question_code__startswith='BENCH-Q'
+    ).order_by('id').values_list('id', 'reponse_correcte'))
+    question_ids = list(answer_key)
+
+    last_version = Test.objects.order_by('-version').values_list('version', flat=True).first() or 0
+    test = Test.objects.create(
+        version=last_version + 1,
+        description='Séance de charge',
+        total_questions=len(question_ids),
+        mandatory_questions_count=MANDATORY_COUNT,
+        ordre_questions=question_ids,
+        mandatory_questions=question_ids[:MANDATORY_COUNT],
+    )
+
+    HSEUser.objects.bulk_create([
+        HSEUser(
+            nom=f'Participant{index}',
+            prénom='Bench',
+            email=f'bench{index}@example.com',
+            cin=participant_cin(index),
+            entite='Bench',
+            entreprise='Bench',
+        )
+        for index in range(participants)
+    ], ignore_conflicts=True)
+
+    return test, answer_key
+
+
+def participant_cin(index):
+    return f'BENCH{index:06d}'
+
+
+# ==================== MESURES ====================
+
+class Recorder:
+    """Collecte les mesures des participants (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS}
+
+    def add(self, endpoint, started, elapsed, queries, status_code):
+        with self._lock:
+            self.samples[endpoint].append((started, elapsed, queries, status_code))
+
+
+def percentile(sorted_values, rank):
+    """Percentile au rang le plus proche"""
+    if not sorted_values:
+        return 0
+    index = max(0, math.ceil(rank / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder):
+    """Un résumé par endpoint: latences (ms), requêtes SQL, débit, erreurs"""
+    report = []
+    for endpoint in ENDPOINTS:
+        samples = recorder.samples[endpoint]
+        if not samples:
+            continue
+
+        latencies = sorted(elapsed * 1000 for _, elapsed, _, _ in samples)
+        queries = [count for _, _, count, _ in samples]
+        window = max(started + elapsed for started, elapsed, _, _ in samples) - min(started for started, _, _, _ in samples)
+
+        report.append({
+            'endpoint': endpoint,
+            'requests': len(samples),
+            'errors': sum(1 for *_, status_code in samples if status_code >= 400 and status_code != 429),
+            'throttled': sum(1 for *_, status_code in samples if status_code == 429),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2),
+            'queries_avg': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            'throughput_rps': round(len(samples) / window, 2) if window > 0 else 0,
+        })
+    return report
+
+
+# ==================== PARCOURS PARTICIPANT ====================
+
+def _call(client, recorder, endpoint, path, payload):
+    connection = connections[DEFAULT_DB_ALIAS]
+    with CaptureQueriesContext(connection) as context:
+        started = time.perf_counter()
+        response = client.post(path, data=json.dumps(payload), content_type='application/json')
+        elapsed = time.perf_counter() - started
+    recorder.add(endpoint, started, elapsed, len(context.captured_queries), response.status_code)
+    return response
+
+
+def run_participant(index, test, answer_key, recorder, langue='fr',
+                    submit_mode='sync', think_time=0.0, accuracy=0.8, ticket=None):
+    """Rejoue le parcours complet d'un participant; retourne True si terminé"""
+    rng = random.Random(index)
+    # Une erreur serveur est mesurée comme une réponse 500, pas propagée
+    client = Client(raise_request_exception=False)
+
+    def think():
+        if think_time:
+            time.sleep(rng.uniform(0, think_time * 2))
+
+    try:
+        qr_payload = {'test_id': test.id, 'action': 'access_test'}
+        if ticket:
+            qr_payload['ticket'] = ticket
+        qr_data = json.dumps(qr_payload)
+        response = _call(client, recorder, 'decode_qr', reverse('auth:decode_qr'), {'qr_data': qr_data})
+        if response.status_code != 200:
+            return False
+        think()
+
+        while True:
+            response = _call(client, recorder, 'auth_start_test',
+                             reverse('auth:auth_start_test', args=[test.id]),
+                             {'cin': participant_cin(index), 'ticket': ticket})
+            if response.status_code != 429:
+                break
+            time.sleep(response.json()['retry_after'])
+        if response.status_code != 200:
+            return False
+        think()
+
+        response = _call(client, recorder, 'start_test_attempt', reverse('start_test_attempt'),
+                         {'test_version': test.version, 'langue': langue})
+        if response.status_code != 200:
+            return False
+        attempt_id = response.json()['attempt_id']
+        think()
+
+        answers = {
+            str(question_id): correct if rng.random() < accuracy else not correct
+            for question_id, correct in answer_key.items()
+        }
+        payload = {'answers': answers}
+        if submit_mode == 'async':
+            payload['mode'] = 'async'
+        response = _call(client, recorder, 'submit_test_answers',
+                         reverse('submit_test_answers', args=[attempt_id]), payload)
+        return response.status_code in (200, 202)
+    finally:
+        connections.close_all()
+
+
+def run_session(test, answer_key, participants, concurrency=10, **participant_options):
+    """
+    Lance la séance: `participants` parcours, `concurrency` en parallèle.
+    Retourne (recorder, parcours terminés, durée totale en secondes).
+    """
+    recorder = Recorder()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [
+            pool.submit(run_participant, index, test, answer_key, recorder, **participant_options)
+            for index in range(participants)
+        ]
+        completed = sum(1 for future in futures if future.result())
+
+    return recorder, completed, time.perf_counter() - started
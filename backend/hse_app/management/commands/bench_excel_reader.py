@@ -0,0 +1,129 @@
+# hse_app/management/commands/bench_excel_reader.py
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from openpyxl import Workbook
+
+from hse_app.excel_cache import open_excel
+from hse_app.excel_reader import ExcelRows
+
+
+def _write_sheet(path, rows):
+    """Fichier d'apprenants factice: un titre, l'en-tête puis `rows` lignes"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["Liste des apprenants - induction HSE"])
+    sheet.append(["CIN", "FULL_NAME", "Entité", "Entreprise", "Présence", "Test initial", "Test final"])
+    for index in range(rows):
+        sheet.append([
+            f"BK{index:06d}", f"Apprenant {index}", "OCP", f"Entreprise {index % 40}",
+            index % 2, (index % 7) / 7, (index % 9) / 9,
+        ])
+    workbook.save(path)
+
+
+def _read_streaming(path):
+    count = 0
+    with ExcelRows(path, header_contains="Entité", lowercase=True, as_text=True) as rows:
+        for row in rows:
+            count += bool(row["cin"])
+    return count
+
+
+def _read_cached(path):
+    count = 0
+    with open_excel(path, header_contains="Entité", lowercase=True, as_text=True) as rows:
+        for row in rows:
+            count += bool(row["cin"])
+    return count
+
+
+def _read_pandas(path):
+    import pandas as pd
+    df = pd.read_excel(path, header=1, dtype=str).fillna("")
+    df.columns = df.columns.str.lower()
+    return int((df["cin"].str.strip() != "").sum())
+
+
+def _measure(reader, path):
+    """Durée sur une lecture normale, pic mémoire sur une seconde (tracemalloc ralentit)"""
+    started = time.perf_counter()
+    rows = reader(path)
+    duration = time.perf_counter() - started
+
+    tracemalloc.start()
+    reader(path)
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'rows': rows,
+        'duration_seconds': round(duration, 3),
+        'rows_per_second': round(rows / duration, 1) if duration > 0 else 0,
+        'peak_memory_mb': round(peak / 1024 / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la lecture en flux (ExcelRows, openpyxl read-only), la relecture depuis "
+        "le cache (open_excel) et pd.read_excel sur une feuille générée: durée, débit et pic mémoire"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help="Nombre de lignes de la feuille")
+        parser.add_argument('--file', help="Feuille existante à lire (ligne de titre puis en-tête avec CIN)")
+        parser.add_argument('--skip-pandas', action='store_true', help="Ne mesurer que la lecture en flux")
+        parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    def handle(self, *args, **options):
+        path = options['file']
+        generated = path is None
+        if generated:
+            fd, path = tempfile.mkstemp(suffix='.xlsx')
+            os.close(fd)
+            started = time.perf_counter()
+            _write_sheet(path, options['rows'])
+            self.stderr.write(f"Feuille de {options['rows']} lignes générée en {time.perf_counter() - started:.1f} s")
+
+        try:
+            results = {'streaming': _measure(_read_streaming, path)}
+
+            # Cache dans un dossier temporaire: une lecture pour le remplir, puis les relectures
+            cache_dir = tempfile.mkdtemp()
+            try:
+                with override_settings(EXCEL_CACHE_DIR=cache_dir):
+                    _read_cached(path)
+                    results['cached'] = _measure(_read_cached, path)
+            finally:
+                shutil.rmtree(cache_dir)
+
+            if not options['skip_pandas']:
+                # Import de pandas mesuré à part (coût payé une fois par processus web)
+                started = time.perf_counter()
+                import pandas  # noqa: F401
+                results['pandas_import_seconds'] = round(time.perf_counter() - started, 3)
+                results['pandas'] = _measure(_read_pandas, path)
+        finally:
+            if generated:
+                os.remove(path)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'lecteur':<10} {'lignes':>8} {'durée (s)':>10} {'lignes/s':>10} {'pic (Mo)':>9}")
+        for name in ('streaming', 'cached', 'pandas'):
+            if name in results:
+                result = results[name]
+                self.stdout.write(
+                    f"{name:<10} {result['rows']:>8} {result['duration_seconds']:>10} "
+                    f"{result['rows_per_second']:>10} {result['peak_memory_mb']:>9}"
+                )
+        if 'pandas_import_seconds' in results:
+            self.stdout.write(f"import pandas : {results['pandas_import_seconds']} s")
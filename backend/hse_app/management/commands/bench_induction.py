@@ -0,0 +1,147 @@
+# hse_app/management/commands/bench_induction.py
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import (
+    setup_databases, teardown_databases, setup_test_environment, teardown_test_environment, override_settings
+)
+
+from authentication.provisioning import provision_test_users
+from authentication.tickets import issue_qr_ticket
+from authentication.admission import get_admission_controller
+from hse_app.loadtest import seed_session, run_session, summarize
+from hse_app.submission import run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Simule une séance d'induction (QR → CIN → démarrage → soumission) avec N participants "
+        "et mesure latences p50/p95/p99, requêtes SQL et débit par endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--participants', type=int, default=100, help="Nombre de participants simulés")
+        parser.add_argument('--concurrency', type=int, default=10, help="Participants en parallèle")
+        parser.add_argument('--langue', default='fr', choices=['ar', 'fr', 'en'], help="Langue du test")
+        parser.add_argument('--submit-mode', default='sync', choices=['sync', 'async'],
+                            help="Soumission synchrone ou via la file d'attente")
+        parser.add_argument('--auth-mode', default='ticket', choices=['ticket', 'cin'],
+                            help="ticket: QR signé et comptes pré-provisionnés; cin: création des comptes au scan")
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help="Temps de réflexion moyen (s) entre deux étapes")
+        parser.add_argument('--admission-rate', type=float, default=None,
+                            help="Connexions admises par seconde (0 = sans contrôle; AUTH_ADMISSION_RATE par défaut)")
+        parser.add_argument('--admission-burst', type=int, default=None,
+                            help="Réserve de jetons du contrôle d'admission (AUTH_ADMISSION_BURST par défaut)")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Conserver la base de test entre deux lancements")
+        parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    def handle(self, *args, **options):
+        # Base de test jetable (SQLite ou MySQL selon DATABASES), jamais la base réelle
+        sqlite_file = self._use_sqlite_file()
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+
+        try:
+            test, answer_key = seed_session(options['participants'])
+
+            ticket = None
+            if options['auth_mode'] == 'ticket':
+                # Provisionnement hors mesure, comme avant une vraie séance
+                provision_test_users()
+                ticket = issue_qr_ticket(test.id)
+
+            admission = {}
+            if options['admission_rate'] is not None:
+                admission['AUTH_ADMISSION_RATE'] = options['admission_rate']
+            if options['admission_burst'] is not None:
+                admission['AUTH_ADMISSION_BURST'] = options['admission_burst']
+            with override_settings(**admission):
+                recorder, completed, duration = run_session(
+                    test, answer_key,
+                    participants=options['participants'],
+                    concurrency=options['concurrency'],
+                    langue=options['langue'],
+                    submit_mode=options['submit_mode'],
+                    think_time=options['think_time'],
+                    ticket=ticket,
+                )
+                admission_stats = get_admission_controller().snapshot()['global']
+
+            drain_seconds = None
+            if options['submit_mode'] == 'async':
+                started = time.perf_counter()
+                run_worker(threading.Event(), batch_size=10, once=True)
+                drain_seconds = round(time.perf_counter() - started, 3)
+
+            report = {
+                'participants': options['participants'],
+                'concurrency': options['concurrency'],
+                'auth_mode': options['auth_mode'],
+                'completed': completed,
+                'duration_seconds': round(duration, 3),
+                'sessions_per_second': round(completed / duration, 2) if duration > 0 else 0,
+                'queue_drain_seconds': drain_seconds,
+                'admission': admission_stats,
+                'endpoints': summarize(recorder),
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+            if sqlite_file and not options['keepdb'] and os.path.exists(sqlite_file):
+                os.remove(sqlite_file)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self._print_report(report)
+
+    def _use_sqlite_file(self):
+        """
+        La base SQLite de test est en mémoire par défaut: elle refuse les
+        écritures concurrentes. On la place dans un fichier temporaire, et
+        les transactions prennent le verrou d'écriture dès leur ouverture
+        (sinon lecture puis écriture concurrentes: "database is locked").
+        """
+        settings_dict = connections[DEFAULT_DB_ALIAS].settings_dict
+        if settings_dict['ENGINE'] != 'django.db.backends.sqlite3' or settings_dict['TEST'].get('NAME'):
+            return None
+        path = os.path.join(tempfile.gettempdir(), 'bench_induction.sqlite3')
+        settings_dict['TEST']['NAME'] = path
+        settings_dict['OPTIONS'] = {**settings_dict.get('OPTIONS', {}), 'transaction_mode': 'IMMEDIATE', 'timeout': 30}
+        return path
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{report['completed']}/{report['participants']} parcours terminés "
+            f"en {report['duration_seconds']} s ({report['sessions_per_second']} parcours/s, "
+            f"{report['concurrency']} en parallèle)"
+        )
+        header = f"{'endpoint':<22}{'req':>6}{'err':>5}{'429':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'SQL moy':>9}{'SQL max':>9}{'req/s':>9}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in report['endpoints']:
+            self.stdout.write(
+                f"{row['endpoint']:<22}{row['requests']:>6}{row['errors']:>5}{row['throttled']:>5}"
+                f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}"
+                f"{row['queries_avg']:>9}{row['queries_max']:>9}{row['throughput_rps']:>9}"
+            )
+        admission = report['admission']
+        self.stdout.write(
+            f"Admission: {admission['admitted']} admis, {admission['rejected']} refusés (429)"
+        )
+        if report['queue_drain_seconds'] is not None:
+            self.stdout.write(f"File de soumissions vidée en {report['queue_drain_seconds']} s")
+
+        failed = report['participants'] - report['completed']
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} parcours en échec"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Séance simulée sans erreur"))
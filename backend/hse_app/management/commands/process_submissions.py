@@ -0,0 +1,54 @@
+# hse_app/management/commands/process_submissions.py
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from hse_app.submission import run_worker, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = "Worker de correction des soumissions asynchrones (file d'attente en base, sans Redis)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Nombre de workers en parallèle")
+        parser.add_argument('--batch-size', type=int, default=5, help="Soumissions réservées à la fois par worker")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Attente (s) quand la file est vide")
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help="Reprendre les jobs bloqués en traitement depuis N secondes "
+                                 "(au démarrage, puis toutes les N secondes)")
+        parser.add_argument('--once', action='store_true', help="Vider la file puis s'arrêter")
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write("Arrêt demandé, fin des traitements en cours...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        requeued, failed = requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"{requeued} soumission(s) bloquée(s) remise(s) en attente")
+        if failed:
+            self.stdout.write(f"{failed} soumission(s) bloquée(s) en échec (essais épuisés)")
+
+        self.stdout.write(f"{options['workers']} worker(s) démarré(s)")
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [
+                pool.submit(
+                    run_worker, stop_event,
+                    batch_size=options['batch_size'],
+                    poll_interval=options['poll_interval'],
+                    once=options['once'],
+                    stale_after=options['stale_after']
+                )
+                for _ in range(options['workers'])
+            ]
+            processed = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} soumission(s) traitée(s)"))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hse_app', '0001_initial'),
+        ('tests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('answers', models.JSONField(default=dict, verbose_name='Réponses soumises')),
+                ('submitted_at', models.DateTimeField(verbose_name='Soumis à')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('processing', 'En traitement'), ('done', 'Traitée'), ('failed', 'Échouée')], default='pending', max_length=20, verbose_name='Statut')),
+                ('tries', models.IntegerField(default=0, verbose_name="Nombre d'essais")),
+                ('error', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Résultat')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Traitement débuté à')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Traitement terminé à')),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_jobs', to='tests.testattempt', verbose_name='Tentative de test')),
+            ],
+            options={
+                'verbose_name': 'Soumission en attente',
+                'verbose_name_plural': 'Soumissions en attente',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='hse_app_sub_status_ab2dbe_idx')],
+            },
+        ),
+    ]
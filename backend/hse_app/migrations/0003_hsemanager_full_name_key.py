@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:05
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize_full_name(full_name):
+    """Copie figée de authentication.models.normalize_full_name (à ne pas modifier)"""
+    if not full_name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', full_name)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())[:255]
+
+
+def backfill_full_name_key(apps, schema_editor):
+    HSEManager = apps.get_model('hse_app', 'HSEManager')
+    managers = list(HSEManager.objects.only('id', 'full_name'))
+    for manager in managers:
+        manager.full_name_key = normalize_full_name(manager.full_name)[:100]
+    HSEManager.objects.bulk_update(managers, ['full_name_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hse_app', '0002_submissionjob'),
+    ]
+
+    operations = [
+        # Le modèle utilise full_name depuis le renommage de `name`
+        migrations.RenameField(
+            model_name='hsemanager',
+            old_name='name',
+            new_name='full_name',
+        ),
+        migrations.AlterField(
+            model_name='hsemanager',
+            name='full_name',
+            field=models.CharField(max_length=100, verbose_name='Nom complet'),
+        ),
+        migrations.AlterModelOptions(
+            name='hsemanager',
+            options={'ordering': ['full_name'], 'verbose_name': 'Manager HSE', 'verbose_name_plural': 'Managers HSE'},
+        ),
+        migrations.AddField(
+            model_name='hsemanager',
+            name='full_name_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100, verbose_name='Clé du nom complet'),
+        ),
+        migrations.RunPython(backfill_full_name_key, migrations.RunPython.noop),
+    ]
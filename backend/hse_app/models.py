@@ -1,8 +1,10 @@
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 import uuid
-from authentication.models import TestUserManager
+from authentication.models import TestUserManager, normalize_full_name
 from django.core.files import File
 from io import BytesIO
 from django.conf import settings
@@ -12,6 +14,30 @@ from django.utils.translation import gettext_lazy as _
 # MODÈLES PRINCIPAUX HSE
 # =============================================================================
 
+class HSEUserQuerySet(models.QuerySet):
+    """Requêtes sur les utilisateurs HSE"""
+    
+    def with_attempt_stats(self):
+        """
+        Annote le nombre de tentatives (toutes, terminées, réussies) de chaque
+        utilisateur, rattachées par CIN. Évite une requête par ligne pour
+        `taux_reussite` et le nombre de tentatives dans les listes.
+        """
+        from tests.models import TestAttempt
+        
+        def count_attempts(**filters):
+            attempts = TestAttempt.objects.filter(
+                user__cin=OuterRef('cin'), **filters
+            ).order_by().values('user__cin').annotate(count=Count('id')).values('count')
+            return Coalesce(Subquery(attempts), 0)
+        
+        return self.annotate(
+            attempts_count=count_attempts(),
+            attempts_completed=count_attempts(completed_at__isnull=False),
+            attempts_passed=count_attempts(completed_at__isnull=False, passed=True),
+        )
+
+
 class HSEUser(models.Model):
     """Utilisateur HSE (participant aux tests)"""
     
@@ -47,6 +73,8 @@ class HSEUser(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Dernière modification")
     
+    objects = HSEUserQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Utilisateur HSE"
         verbose_name_plural = "Utilisateurs HSE"
@@ -71,16 +99,32 @@ class HSEUser(models.Model):
 
     @property
     def taux_reussite(self):
-        """Taux de réussite global de l'utilisateur"""
-        attempts = self.testattempt_set.filter(completed_at__isnull=False)
-        if not attempts:
+        """Taux de réussite global de l'utilisateur (tentatives rattachées par CIN)"""
+        completed = getattr(self, 'attempts_completed', None)
+        passed = getattr(self, 'attempts_passed', None)
+        
+        # Sans with_attempt_stats(): une seule requête d'agrégat
+        if completed is None or passed is None:
+            from tests.models import TestAttempt
+            stats = TestAttempt.objects.filter(
+                user__cin=self.cin,
+                completed_at__isnull=False
+            ).aggregate(
+                completed=Count('id'),
+                passed=Count('id', filter=models.Q(passed=True))
+            )
+            completed, passed = stats['completed'], stats['passed']
+        
+        if not completed:
             return 0
-        reussis = attempts.filter(passed=True).count()
-        return round((reussis / attempts.count()) * 100, 1)
+        return round((passed / completed) * 100, 1)
 
 class HSEManager(models.Model):
     """Manager pour les opérations HSE spécifiques"""
     full_name = models.CharField(max_length=100, verbose_name="Nom complet")
+    # Maintenu par save() (normalize_full_name): connexion manager indexée
+    full_name_key = models.CharField(max_length=100, blank=True, default='', editable=False,
+                                     db_index=True, verbose_name="Clé du nom complet")
     cin = models.CharField(max_length=50, unique=True, verbose_name="CIN")    
     
     class Meta:
@@ -90,3 +134,59 @@ class HSEManager(models.Model):
     
     def __str__(self):
         return f"{self.full_name} ({self.cin})"
+
+    def save(self, *args, **kwargs):
+        self.full_name_key = normalize_full_name(self.full_name)[:100]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'full_name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'full_name_key'}
+        super().save(*args, **kwargs)
+
+
+class SubmissionJob(models.Model):
+    """Soumission de test enregistrée, traitée en arrière-plan par les workers"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('processing', 'En traitement'),
+        ('done', 'Traitée'),
+        ('failed', 'Échouée'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    attempt = models.ForeignKey(
+        'tests.TestAttempt',
+        on_delete=models.CASCADE,
+        related_name='submission_jobs',
+        verbose_name="Tentative de test"
+    )
+    
+    # Réponses brutes telles que reçues de la tablette
+    answers = models.JSONField(default=dict, verbose_name="Réponses soumises")
+    submitted_at = models.DateTimeField(verbose_name="Soumis à")
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name="Statut"
+    )
+    tries = models.IntegerField(default=0, verbose_name="Nombre d'essais")
+    error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    result = models.JSONField(null=True, blank=True, verbose_name="Résultat")
+    
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Traitement débuté à")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Traitement terminé à")
+    
+    class Meta:
+        verbose_name = "Soumission en attente"
+        verbose_name_plural = "Soumissions en attente"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Soumission {self.id} - tentative #{self.attempt_id} ({self.get_status_display()})"
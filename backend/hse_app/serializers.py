@@ -51,7 +51,7 @@ class HSEUserDetailSerializer(serializers.ModelSerializer):
     
     def get_recent_attempts(self, obj):
         if obj.test_user:
-            attempts = obj.test_user.testattempt_set.order_by('-started_at')[:5]
+            attempts = obj.test_user.testattempt_set.select_related('test', 'user').order_by('-started_at')[:5]
             return TestAttemptListSerializer(attempts, many=True).data
         return []
 
@@ -291,7 +291,7 @@ class HSEManagerListSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = HSEManager
-        fields = ['id', 'name', 'cin']
+        fields = ['id', 'full_name', 'cin']
 
 
 class HSEManagerDetailSerializer(serializers.ModelSerializer):
@@ -300,7 +300,7 @@ class HSEManagerDetailSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = HSEManager
-        fields = ['id', 'name', 'cin', 'managed_users_count']
+        fields = ['id', 'full_name', 'cin', 'managed_users_count']
     
     def get_managed_users_count(self, obj):
         return HSEUser.objects.count()  # À adapter selon votre logique
@@ -311,4 +311,4 @@ class HSEManagerCreateUpdateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = HSEManager
-        fields = ['name', 'cin']
+        fields = ['full_name', 'cin']
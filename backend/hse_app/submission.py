@@ -0,0 +1,352 @@
+# hse_app/submission.py
+"""
+Traitement des soumissions de tests HSE.
+
+Les réponses arrivent au fil du test par petits deltas (sauvegarde
+automatique, fusionnés en base par un seul UPDATE JSON_MERGE_PATCH), puis la
+soumission finale scelle la tentative. Le même code sert aux deux modes de
+soumission de submit_hse_test_answers:
+- synchrone: notation + mise à jour HSEUser dans la requête;
+- asynchrone: les réponses brutes sont enregistrées dans un SubmissionJob
+  et la requête répond tout de suite; des workers (commande
+  `process_submissions`, sans Redis) notent la tentative, synchronisent
+  l'HSEUser et émettent le certificat.
+"""
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction, close_old_connections
+from django.db.models import F, Value
+from django.utils import timezone
+
+from tests.models import TestAttempt, normalize_answer
+from tests.functions import JSONMergePatch, JSONObjectLength
+from tests.answer_key import get_answer_key
+from tests.item_stats import record_attempt_stats
+from certificats.issuing import issue_certificate
+from hse_app.models import HSEUser, SubmissionJob
+
+logger = logging.getLogger(__name__)
+
+MAX_TRIES = 3
+
+
+# ==================== SAUVEGARDE AUTOMATIQUE ====================
+
+def clean_answer_delta(answer_key, answers):
+    """
+    Normalise un delta {question_id: réponse} reçu de la tablette.
+    Retourne ({"id": bool ou None}, clés ignorées). None efface la réponse;
+    les questions hors version et les valeurs illisibles sont ignorées.
+    """
+    delta = {}
+    ignored = []
+    for question_id_str, user_answer in (answers or {}).items():
+        try:
+            question_id = int(question_id_str)
+        except (TypeError, ValueError):
+            ignored.append(question_id_str)
+            continue
+        if question_id not in answer_key:
+            ignored.append(question_id_str)
+            continue
+
+        if user_answer is None:
+            delta[str(question_id)] = None
+            continue
+
+        user_bool = normalize_answer(user_answer)
+        if user_bool is None:
+            ignored.append(question_id_str)
+            continue
+        delta[str(question_id)] = user_bool
+
+    return delta, ignored
+
+
+def merge_answers(attempt_id, user, delta):
+    """
+    Fusionne le delta dans user_answers par un seul UPDATE (pas de
+    lecture-modification-écriture, pas de réécriture du JSON côté Python).
+    Retourne False si la tentative n'est plus en cours.
+    """
+    if not delta:
+        return TestAttempt.objects.filter(id=attempt_id, user=user, status='in_progress').exists()
+
+    return TestAttempt.objects.filter(
+        id=attempt_id,
+        user=user,
+        status='in_progress'
+    ).update(
+        user_answers=JSONMergePatch('user_answers', Value(json.dumps(delta)))
+    ) == 1
+
+
+def answered_count(attempt_id):
+    """Nombre de réponses enregistrées côté serveur (calculé en base)"""
+    return TestAttempt.objects.filter(id=attempt_id).annotate(
+        answered=JSONObjectLength('user_answers')
+    ).values_list('answered', flat=True).first() or 0
+
+
+def seal_answers(stored_answers, delta):
+    """Réponses finales: réponses sauvegardées + dernier delta (None efface)"""
+    answers = dict(stored_answers or {})
+    for question_id, user_answer in delta.items():
+        if user_answer is None:
+            answers.pop(question_id, None)
+        else:
+            answers[question_id] = user_answer
+    return answers
+
+
+# ==================== NOTATION ====================
+
+def finalize_attempt(attempt, user_answers, completed_at):
+    """
+    Enregistre les réponses, note la tentative (corrigé compilé) et la
+    sauvegarde. Retourne le bloc `results` renvoyé au frontend.
+    """
+    attempt.user_answers = user_answers
+    attempt.completed_at = completed_at
+
+    # Calculer le temps pris
+    if attempt.started_at and attempt.completed_at:
+        time_taken = attempt.completed_at - attempt.started_at
+        attempt.time_taken_seconds = int(time_taken.total_seconds())
+
+    # Calculer les scores (corrigé compilé: aucune requête par question)
+    test = attempt.test
+    answer_key = get_answer_key(test)
+    mandatory_ids = answer_key.mandatory_ids
+
+    scores = answer_key.score(user_answers)
+    mandatory_correct = scores['mandatory_correct']
+    optional_correct = scores['optional_correct']
+
+    # Mettre à jour les scores
+    attempt.mandatory_correct = mandatory_correct
+    attempt.mandatory_wrong = len(mandatory_ids) - mandatory_correct
+    attempt.mandatory_total = len(mandatory_ids)
+    attempt.optional_correct = optional_correct
+    attempt.optional_wrong = test.total_questions - len(mandatory_ids) - optional_correct
+    attempt.optional_total = test.total_questions - len(mandatory_ids)
+    attempt.mandatory_score_percentage = round((mandatory_correct / len(mandatory_ids) * 100), 2) if len(mandatory_ids) > 0 else 0
+    attempt.optional_score_percentage = round((optional_correct / attempt.optional_total * 100), 2) if attempt.optional_total > 0 else 0
+    attempt.overall_score_percentage = round(((mandatory_correct + optional_correct) / test.total_questions * 100), 2) if test.total_questions > 0 else 0
+    attempt.passed = mandatory_correct == len(mandatory_ids)
+    attempt.status = 'passed' if attempt.passed else 'failed'
+
+    # Tentative et compteurs par question enregistrés ensemble
+    with transaction.atomic():
+        attempt.save()
+        record_attempt_stats(attempt, answer_key)
+
+    return {
+        'passed': attempt.passed,
+        'mandatory': {
+            'correct': mandatory_correct,
+            'total': len(mandatory_ids),
+            'percentage': attempt.mandatory_score_percentage,
+            'passed': mandatory_correct == len(mandatory_ids)
+        },
+        'optional': {
+            'correct': optional_correct,
+            'total': attempt.optional_total,
+            'percentage': attempt.optional_score_percentage
+        },
+        'overall': {
+            'correct': mandatory_correct + optional_correct,
+            'total': test.total_questions,
+            'percentage': attempt.overall_score_percentage
+        },
+        'time_taken_seconds': attempt.time_taken_seconds
+    }
+
+
+def attach_certificate(attempt, results):
+    """Émet le certificat d'une tentative réussie et l'ajoute au bloc `results`"""
+    certificate = issue_certificate(attempt) if attempt.passed else None
+    if certificate:
+        results['certificate'] = {
+            'id': str(certificate.id),
+            'certificate_number': certificate.certificate_number,
+            'download_url': f'/api/certificates/{certificate.id}/download/'
+        }
+    return certificate
+
+
+def sync_hse_user(user, attempt):
+    """Mettre à jour (ou créer) l'utilisateur HSE après une tentative"""
+    updated = HSEUser.objects.filter(cin=user.cin).update(
+        score=attempt.overall_score_percentage,
+        reussite=attempt.passed,
+        updated_at=timezone.now()
+    )
+    if updated:
+        return
+
+    # Créer un utilisateur HSE si non existant
+    HSEUser.objects.create(
+        nom='',
+        prénom=user.full_name or user.username,
+        cin=user.cin,
+        email='',
+        entite='',
+        entreprise='',
+        score=attempt.overall_score_percentage,
+        reussite=attempt.passed,
+        presence=True
+    )
+
+
+# ==================== FILE D'ATTENTE (BASE DE DONNÉES) ====================
+
+def enqueue_submission(attempt, user_answers, completed_at=None):
+    """
+    Enregistre durablement les réponses brutes. Une soumission déjà en
+    attente pour la même tentative est réutilisée (renvoi depuis la tablette).
+    """
+    job = SubmissionJob.objects.filter(
+        attempt=attempt,
+        status__in=['pending', 'processing']
+    ).first()
+    if job:
+        return job, False
+
+    job = SubmissionJob.objects.create(
+        attempt=attempt,
+        answers=user_answers,
+        submitted_at=completed_at or timezone.now()
+    )
+    return job, True
+
+
+def claim_jobs(limit=1):
+    """
+    Réserve jusqu'à `limit` soumissions en attente. La réservation est un
+    UPDATE conditionnel: deux workers ne peuvent pas prendre le même job.
+    """
+    candidates = SubmissionJob.objects.filter(
+        status='pending'
+    ).order_by('created_at').values_list('id', flat=True)[:limit * 2]
+
+    claimed = []
+    for job_id in candidates:
+        taken = SubmissionJob.objects.filter(id=job_id, status='pending').update(
+            status='processing',
+            started_at=timezone.now(),
+            tries=F('tries') + 1
+        )
+        if taken:
+            claimed.append(job_id)
+        if len(claimed) >= limit:
+            break
+    return claimed
+
+
+def process_job(job_id):
+    """Note la tentative, synchronise l'HSEUser et émet le certificat"""
+    job = SubmissionJob.objects.select_related('attempt__test', 'attempt__user').get(id=job_id)
+    attempt = job.attempt
+
+    try:
+        with transaction.atomic():
+            # Verrouiller la tentative: une seule notation possible
+            current_status = TestAttempt.objects.select_for_update().filter(
+                id=attempt.id
+            ).values_list('status', flat=True).first()
+            if current_status in ('in_progress', 'submitted'):
+                results = finalize_attempt(attempt, job.answers, job.submitted_at)
+            else:
+                attempt.refresh_from_db()
+                results = {
+                    'passed': attempt.passed,
+                    'overall': {'percentage': attempt.overall_score_percentage},
+                    'already_submitted': True
+                }
+
+            sync_hse_user(attempt.user, attempt)
+            attach_certificate(attempt, results)
+
+            job.status = 'done'
+            job.result = results
+            job.error = ''
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'result', 'error', 'finished_at'])
+
+    except Exception as e:
+        logger.exception("Soumission %s en échec", job_id)
+        job.status = 'failed' if job.tries >= MAX_TRIES else 'pending'
+        job.error = str(e)
+        job.finished_at = timezone.now() if job.status == 'failed' else None
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        if job.status == 'failed':
+            # Échec définitif: la tentative redevient soumissible par le participant
+            TestAttempt.objects.filter(id=attempt.id, status='submitted').update(status='in_progress')
+
+    return job
+
+
+def requeue_stale_jobs(older_than_seconds=300):
+    """
+    Jobs d'un worker arrêté en cours de traitement: remis en attente, ou
+    en échec définitif s'ils ont épuisé leurs MAX_TRIES essais (la tentative
+    redevient alors soumissible, comme après un échec de process_job).
+    Retourne (remis en attente, en échec).
+    """
+    limit = timezone.now() - timedelta(seconds=older_than_seconds)
+    stale = SubmissionJob.objects.filter(status='processing', started_at__lt=limit)
+
+    with transaction.atomic():
+        exhausted = list(
+            stale.select_for_update().filter(tries__gte=MAX_TRIES).values_list('id', 'attempt_id')
+        )
+        failed = 0
+        if exhausted:
+            failed = SubmissionJob.objects.filter(id__in=[job_id for job_id, _ in exhausted]).update(
+                status='failed',
+                error="Worker interrompu pendant le traitement (essais épuisés)",
+                finished_at=timezone.now()
+            )
+            TestAttempt.objects.filter(
+                id__in=[attempt_id for _, attempt_id in exhausted],
+                status='submitted'
+            ).update(status='in_progress')
+
+    requeued = stale.filter(tries__lt=MAX_TRIES).update(status='pending')
+    return requeued, failed
+
+
+def run_worker(stop_event, batch_size=1, poll_interval=1.0, once=False, stale_after=300):
+    """
+    Boucle d'un worker: réserver, traiter, recommencer. Toutes les
+    `stale_after` secondes, les jobs bloqués d'un worker arrêté sont repris
+    (requeue_stale_jobs) sans attendre le redémarrage de la commande.
+    """
+    processed = 0
+    next_requeue = time.monotonic() + stale_after
+    while not stop_event.is_set():
+        close_old_connections()
+        if time.monotonic() >= next_requeue:
+            requeued, failed = requeue_stale_jobs(stale_after)
+            if requeued or failed:
+                logger.warning("Soumissions bloquées: %s remise(s) en attente, %s en échec", requeued, failed)
+            next_requeue = time.monotonic() + stale_after
+
+        job_ids = claim_jobs(batch_size)
+
+        if not job_ids:
+            if once:
+                break
+            stop_event.wait(poll_interval)
+            continue
+
+        for job_id in job_ids:
+            process_job(job_id)
+            processed += 1
+
+    close_old_connections()
+    return processed
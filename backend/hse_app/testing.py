@@ -0,0 +1,279 @@
+# hse_app/testing.py
+"""
+Outils communs aux suites de tests: jeu de données, classeurs Excel de
+test et budgets de requêtes SQL.
+
+Chaque app déclare dans son tests.py un budget (nombre maximal de requêtes)
+par vue. `QueryBudgetMixin` appelle chaque vue sur des jeux de données
+de tailles croissantes (10, 100, 1000 participants par défaut) et échoue si
+un budget est dépassé: un N+1 réintroduit dans une vue ou un serializer
+fait grimper le nombre de requêtes avec la taille du jeu de données.
+L'évolution des compteurs par taille est affichée en fin de suite.
+"""
+import io
+import json
+import shutil
+import sys
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from authentication.models import TestUser
+from tests.models import Test, Question, TestAttempt
+from tests.answer_key import invalidate_answer_keys
+from tests.question_bundle import invalidate_question_bundles
+from tests.item_stats import rebuild_test_stats
+from certificats.models import Certificate
+from hse_app.models import HSEUser, HSEManager, SubmissionJob
+
+DATASET_SIZES = (10, 100, 1000)
+
+
+# ==================== JEU DE DONNÉES ====================
+
+def build_dataset(size):
+    """
+    Crée `size` participants (TestUser + HSEUser), une tentative terminée
+    chacun (la moitié réussies, avec certificat) et les objets de référence
+    utilisés par les vues. Écritures groupées (bulk_create).
+    """
+    Question.objects.bulk_create([
+        Question(
+            question_code=f'Q{index}',
+            enonce_fr=f'Question {index}',
+            reponse_correcte=bool(index % 2),
+            is_mandatory=index <= 9,
+        )
+        for index in range(1, 22)
+    ])
+    question_ids = list(Question.objects.order_by('id').values_list('id', flat=True))
+    test = Test.objects.create(
+        version=1,
+        description='Test HSE Version 1',
+        ordre_questions=question_ids,
+        mandatory_questions=question_ids[:9],
+    )
+
+    staff = TestUser.objects.create(
+        cin='STAFF1', username='staff', full_name='Staff HSE',
+        user_type='manager', is_staff=True
+    )
+
+    # Mot de passe inutilisable: pas de hachage par participant
+    TestUser.objects.bulk_create([
+        TestUser(cin=f'P{index:05d}', username=f'user_P{index:05d}',
+                 full_name=f'Participant {index}', password='!')
+        for index in range(size)
+    ])
+    users = list(TestUser.objects.filter(user_type='user').order_by('id'))
+
+    HSEUser.objects.bulk_create([
+        HSEUser(
+            nom=f'Nom{index}', prénom=f'Prenom{index}', email=f'p{index}@example.com',
+            cin=user.cin, entite='Entité', entreprise='Entreprise', test_user=user,
+            presence=True, reussite=index % 2 == 0, score=21 if index % 2 == 0 else 10
+        )
+        for index, user in enumerate(users)
+    ])
+    HSEManager.objects.bulk_create([
+        HSEManager(full_name=f'Manager {index}', full_name_key=f'manager {index}', cin=f'M{index:05d}')
+        for index in range(max(1, size // 10))
+    ])
+
+    answers = {str(question_id): True for question_id in question_ids}
+    now = timezone.now()
+    TestAttempt.objects.bulk_create([
+        TestAttempt(
+            test=test, user=user, langue='fr', user_answers=answers,
+            status='passed' if index % 2 == 0 else 'failed',
+            passed=index % 2 == 0,
+            overall_score_percentage=100.0 if index % 2 == 0 else 50.0,
+            started_at=now - timedelta(minutes=10), completed_at=now,
+            time_taken_seconds=600,
+        )
+        for index, user in enumerate(users)
+    ])
+    attempts = list(TestAttempt.objects.filter(passed=True).select_related('user').order_by('id'))
+
+    expiry = (now + timedelta(days=365)).date()
+    Certificate.objects.bulk_create([
+        Certificate(
+            test_attempt=attempt, certificate_number=f'HSE-{attempt.id:06d}',
+            user_full_name=attempt.user.full_name, user_cin=attempt.user.cin,
+            test_version=test.version, score=21, expiry_date=expiry
+        )
+        for attempt in attempts
+    ])
+    rebuild_test_stats(test)
+
+    participant = users[0]
+    attempt = TestAttempt.objects.get(user=participant)
+
+    # Participant sans tentative, pour démarrer / soumettre un test
+    newcomer = TestUser.objects.create(cin='NEW001', username='user_NEW001', full_name='Nouveau', password='!')
+    HSEUser.objects.create(nom='Nouveau', prénom='Participant', email='new@example.com',
+                           cin=newcomer.cin, entite='Entité', entreprise='Entreprise')
+    job = SubmissionJob.objects.create(attempt=attempt, answers=answers, submitted_at=now,
+                                       status='done', result={'passed': True})
+
+    return SimpleNamespace(
+        size=size,
+        test=test,
+        question_ids=question_ids,
+        answers=answers,
+        staff=staff,
+        participant=participant,
+        hse_user=HSEUser.objects.get(cin=participant.cin),
+        attempt=attempt,
+        certificate=Certificate.objects.get(test_attempt=attempt),
+        newcomer=newcomer,
+        manager=HSEManager.objects.order_by('id').first(),
+        job=job,
+    )
+
+
+# ==================== CLASSEURS EXCEL ====================
+
+def excel_upload(rows, name='fichier.xlsx'):
+    """Classeur .xlsx (une feuille, `rows` = listes de cellules) sous forme de fichier envoyé"""
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+# ==================== BUDGETS ====================
+
+class QueryBudgetMixin:
+    """
+    À combiner avec django.test.TestCase. Sous-classes: définir QUERY_BUDGETS = {nom: budget} et une méthode
+    `endpoints(data)` qui retourne {nom: appel} où `appel()` exécute la vue
+    et retourne la réponse. Chaque vue doit répondre par son statut de succès:
+    200, ou celui déclaré dans EXPECTED_STATUS = {nom: statut} (201, 202...),
+    pour que le budget mesure bien le chemin nominal et pas une erreur.
+    Les fichiers écrits pendant la suite vont dans un MEDIA_ROOT temporaire.
+    """
+
+    QUERY_BUDGETS = {}
+    EXPECTED_STATUS = {}
+    sizes = DATASET_SIZES
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.factory = RequestFactory()
+        cls.api_factory = APIRequestFactory()
+        cls.scaling = {}
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.report_scaling()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def report_scaling(cls):
+        if not cls.scaling:
+            return
+        sizes = cls.sizes
+        lines = [f"\nRequêtes SQL par vue ({cls.__name__}), tailles {', '.join(map(str, sizes))}:"]
+        for name in sorted(cls.scaling):
+            counts = [str(cls.scaling[name].get(size, '-')) for size in sizes]
+            lines.append(f"  {name:<40} {' / '.join(counts):<16} budget {cls.QUERY_BUDGETS.get(name)}")
+        sys.stderr.write('\n'.join(lines) + '\n')
+
+    # -------- requêtes --------
+
+    def get(self, view, user, path='/', data=None, **kwargs):
+        request = self.factory.get(path, data or {})
+        request.user = user
+        return lambda: view(request, **kwargs)
+
+    def post(self, view, user, payload=None, path='/', **kwargs):
+        request = self.factory.post(path, data=json.dumps(payload or {}), content_type='application/json')
+        request.user = user
+        return lambda: view(request, **kwargs)
+
+    def patch(self, view, user, payload=None, path='/', **kwargs):
+        request = self.factory.patch(path, data=json.dumps(payload or {}), content_type='application/json')
+        request.user = user
+        return lambda: view(request, **kwargs)
+
+    def api(self, view, user, method='get', payload=None, path='/', **kwargs):
+        """Vue DRF: ViewSet.as_view({...}) ou fonction @api_view"""
+        if method == 'get':
+            request = self.api_factory.get(path, payload or {})
+        else:
+            request = getattr(self.api_factory, method)(path, payload or {}, format='json')
+        force_authenticate(request, user=user)
+
+        def call():
+            response = view(request, **kwargs)
+            if hasattr(response, 'render'):  # FileResponse: rien à rendre
+                response.render()
+            return response
+        return call
+
+    def endpoints(self, data):
+        raise NotImplementedError
+
+    # -------- mesure --------
+
+    def measure(self, call):
+        """Exécute une vue à froid (caches vidés) et compte ses requêtes"""
+        cache.clear()
+        invalidate_answer_keys()
+        invalidate_question_bundles()
+        with CaptureQueriesContext(connection) as context:
+            response = call()
+        return response, len(context.captured_queries)
+
+    def test_query_budgets(self):
+        missing = set()
+        for size in self.sizes:
+            # Chaque taille dans un savepoint annulé: jeux de données indépendants
+            with transaction.atomic():
+                data = build_dataset(size)
+                endpoints = self.endpoints(data)
+                missing |= set(endpoints) ^ set(self.QUERY_BUDGETS)
+
+                for name, call in endpoints.items():
+                    if name not in self.QUERY_BUDGETS:
+                        continue
+                    with self.subTest(endpoint=name, size=size):
+                        # Chaque appel dans son propre savepoint (vues qui écrivent)
+                        with transaction.atomic():
+                            response, count = self.measure(call)
+                            transaction.set_rollback(True)
+                        self.scaling.setdefault(name, {})[size] = count
+                        response.close()
+                        self.assertEqual(
+                            response.status_code, self.EXPECTED_STATUS.get(name, 200),
+                            f"{name}: statut {response.status_code}"
+                        )
+                        self.assertLessEqual(
+                            count, self.QUERY_BUDGETS[name],
+                            f"{name}: {count} requêtes pour {size} participants "
+                            f"(budget {self.QUERY_BUDGETS[name]})"
+                        )
+                transaction.set_rollback(True)
+
+        self.assertFalse(missing, f"Vues sans budget déclaré ou budgets sans vue: {sorted(missing)}")
@@ -1,3 +1,341 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve, Resolver404
+from django.utils import timezone
+
+from tests.models import Question, TestAttempt
+from certificats.models import Certificate
+from hse_app import views
+from hse_app.excel_cache import open_excel, purge_excel_cache
+from hse_app.excel_reader import ExcelFormatError, ExcelRows
+from hse_app.models import SubmissionJob
+from hse_app.submission import MAX_TRIES, run_worker
+from hse_app.views_api import HSEUserViewSet, HSEManagerViewSet
+from hse_app.testing import QueryBudgetMixin, build_dataset, excel_upload
+
+
+class HSEViewsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets de requêtes SQL des vues hse_app/views.py"""
+
+    QUERY_BUDGETS = {
+        'search_hse_user_by_cin': 4,
+        'create_hse_user': 2,
+        'list_hse_users': 2,
+        'update_user_presence': 2,
+        'list_hse_tests': 1,
+        'get_hse_test_details': 1,
+        'get_hse_test_questions': 3,
+        'start_hse_test_attempt': 5,
+        'autosave_hse_test_answers': 5,
+        'submit_hse_test_answers': 12,
+        'submit_hse_test_answers_async': 8,
+        'get_submission_status': 1,
+        'get_user_test_history': 1,
+        'get_hse_statistics': 9,
+        'list_hse_managers': 1,
+        'create_hse_manager': 1,
+        'sync_test_users_with_hse': 3,
+    }
+    EXPECTED_STATUS = {
+        'submit_hse_test_answers_async': 202,
+    }
+
+    def endpoints(self, data):
+        pending = TestAttempt.objects.create(test=data.test, user=data.newcomer, langue='fr')
+        return {
+            'search_hse_user_by_cin': self.get(views.search_hse_user_by_cin, data.staff, data={'cin': data.participant.cin}),
+            'create_hse_user': self.post(views.create_hse_user, data.staff, {'nom': 'Budget', 'prenom': 'Test', 'cin': 'BUDGET1'}),
+            'list_hse_users': self.get(views.list_hse_users, data.staff, data={'page_size': 50}),
+            'update_user_presence': self.patch(views.update_user_presence, data.staff, {'presence': False}, user_id=data.hse_user.id),
+            'list_hse_tests': self.get(views.list_hse_tests, data.staff),
+            'get_hse_test_details': self.get(views.get_hse_test_details, data.staff, version=data.test.version),
+            'get_hse_test_questions': self.get(views.get_hse_test_questions, data.participant, data={'langue': 'fr'}, version=data.test.version),
+            'start_hse_test_attempt': self.post(views.start_hse_test_attempt, data.staff, {'test_version': data.test.version, 'langue': 'fr'}),
+            'autosave_hse_test_answers': self.post(views.autosave_hse_test_answers, data.newcomer, {'answers': data.answers}, attempt_id=pending.id),
+            'submit_hse_test_answers': self.post(views.submit_hse_test_answers, data.newcomer, {'answers': data.answers}, attempt_id=pending.id),
+            'submit_hse_test_answers_async': self.post(views.submit_hse_test_answers, data.newcomer, {'answers': data.answers, 'mode': 'async'}, attempt_id=pending.id),
+            'get_submission_status': self.get(views.get_submission_status, data.participant, job_id=data.job.id),
+            'get_user_test_history': self.get(views.get_user_test_history, data.participant),
+            'get_hse_statistics': self.get(views.get_hse_statistics, data.staff),
+            'list_hse_managers': self.get(views.list_hse_managers, data.staff),
+            'create_hse_manager': self.post(views.create_hse_manager, data.staff, {'full_name': 'Manager Budget', 'cin': 'MBUDGET'}),
+            'sync_test_users_with_hse': self.get(views.sync_test_users_with_hse, data.staff),
+        }
+
+
+class HSEViewSetsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets de requêtes SQL des viewsets hse_app/views_api.py"""
+
+    QUERY_BUDGETS = {
+        'hse_users_list': 1,
+        'hse_users_retrieve': 4,
+        'hse_users_partial_update': 2,
+        'hse_users_update_presence': 2,
+        'hse_users_test_history': 4,
+        'hse_users_search_by_cin': 4,
+        'hse_users_statistics': 4,
+        'hse_managers_list': 1,
+        'hse_managers_retrieve': 2,
+    }
+
+    def endpoints(self, data):
+        return {
+            'hse_users_list': self.api(HSEUserViewSet.as_view({'get': 'list'}), data.staff),
+            'hse_users_retrieve': self.api(HSEUserViewSet.as_view({'get': 'retrieve'}), data.staff, pk=data.hse_user.id),
+            'hse_users_partial_update': self.api(HSEUserViewSet.as_view({'patch': 'partial_update'}), data.staff, method='patch',
+                                                 payload={'entite': 'Autre'}, pk=data.hse_user.id),
+            'hse_users_update_presence': self.api(HSEUserViewSet.as_view({'patch': 'update_presence'}), data.staff, method='patch',
+                                                  payload={'presence': False}, pk=data.hse_user.id),
+            'hse_users_test_history': self.api(HSEUserViewSet.as_view({'get': 'test_history'}), data.staff, pk=data.hse_user.id),
+            'hse_users_search_by_cin': self.api(HSEUserViewSet.as_view({'get': 'search_by_cin'}), data.staff, payload={'cin': data.participant.cin}),
+            'hse_users_statistics': self.api(HSEUserViewSet.as_view({'get': 'statistics'}), data.staff),
+            'hse_managers_list': self.api(HSEManagerViewSet.as_view({'get': 'list'}), data.staff),
+            'hse_managers_retrieve': self.api(HSEManagerViewSet.as_view({'get': 'retrieve'}), data.staff, pk=data.manager.id),
+        }
+
+
+class HSEURLRoutingTests(SimpleTestCase):
+    """Routes /api/hse/: parcours participant avant le routeur, vues d'administration non exposées"""
+
+    def test_participant_routes(self):
+        job_id = uuid.uuid4()
+        routes = {
+            '/api/hse/tests/version/1/questions/': views.get_hse_test_questions,
+            '/api/hse/test-attempts/start/': views.start_hse_test_attempt,
+            '/api/hse/test-attempts/5/answers/': views.autosave_hse_test_answers,
+            '/api/hse/test-attempts/5/submit/': views.submit_hse_test_answers,
+            f'/api/hse/submissions/{job_id}/': views.get_submission_status,
+        }
+        for url, view in routes.items():
+            with self.subTest(url=url):
+                self.assertIs(resolve(url).func, view)
+
+    def test_router_paths_unchanged(self):
+        routes = {
+            '/api/hse/users/search/': HSEUserViewSet,
+            '/api/hse/users/create/': HSEUserViewSet,
+            '/api/hse/managers/create/': HSEManagerViewSet,
+        }
+        for url, viewset in routes.items():
+            with self.subTest(url=url):
+                self.assertIs(resolve(url).func.cls, viewset)
+
+    def test_admin_function_views_not_routed(self):
+        for url in ('/api/hse/sync-users/', '/api/hse/statistics/', '/api/hse/users/5/presence/'):
+            with self.subTest(url=url):
+                with self.assertRaises(Resolver404):
+                    resolve(url)
+
+
+class AsyncSubmissionSealingTests(TestCase):
+    """Soumission asynchrone: la tentative est scellée dès l'accusé de réception"""
+
+    def setUp(self):
+        self.data = build_dataset(1)
+        self.attempt = TestAttempt.objects.create(test=self.data.test, user=self.data.newcomer, langue='fr')
+        self.factory = RequestFactory()
+
+    def call(self, view, payload):
+        request = self.factory.post('/', data=json.dumps(payload), content_type='application/json')
+        request.user = self.data.newcomer
+        return view(request, attempt_id=self.attempt.id)
+
+    def test_sealed_attempt(self):
+        first = self.data.question_ids[0]
+        response = self.call(views.submit_hse_test_answers, {'answers': self.data.answers, 'mode': 'async'})
+        self.assertEqual(response.status_code, 202)
+        job_id = json.loads(response.content)['receipt']['job_id']
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, 'submitted')
+
+        # Sauvegarde après la soumission: refusée, réponses inchangées
+        response = self.call(views.autosave_hse_test_answers, {'answers': {str(first): False}})
+        self.assertEqual(response.status_code, 409)
+        self.attempt.refresh_from_db()
+        self.assertIs(self.attempt.user_answers[str(first)], True)
+
+        # Renvoi à l'identique: même accusé; réponses différentes: 409
+        response = self.call(views.submit_hse_test_answers, {'answers': self.data.answers, 'mode': 'async'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)['receipt']['job_id'], job_id)
+        response = self.call(views.submit_hse_test_answers, {'answers': {str(first): False}, 'mode': 'async'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(SubmissionJob.objects.filter(attempt=self.attempt).count(), 1)
+
+        run_worker(threading.Event(), once=True)
+        self.attempt.refresh_from_db()
+        self.assertIn(self.attempt.status, ('passed', 'failed'))
+        self.assertEqual(SubmissionJob.objects.get(id=job_id).status, 'done')
+
+    def test_final_failure_reopens_attempt(self):
+        self.attempt.status = 'submitted'
+        self.attempt.save(update_fields=['status'])
+        job = SubmissionJob.objects.create(attempt=self.attempt, answers=self.data.answers,
+                                           submitted_at=timezone.now(), tries=MAX_TRIES - 1)
+
+        with mock.patch('hse_app.submission.finalize_attempt', side_effect=RuntimeError('panne')), \
+                self.assertLogs('hse_app.submission', 'ERROR'):
+            run_worker(threading.Event(), once=True)
+
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, 'in_progress')
+        request = self.factory.get('/')
+        request.user = self.data.newcomer
+        submission = json.loads(views.get_submission_status(request, job_id=job.id).content)['submission']
+        self.assertEqual(submission['status'], 'failed')
+        self.assertTrue(submission['can_resubmit'])
+
+        # Nouvelle soumission acceptée: nouveau job
+        response = self.call(views.submit_hse_test_answers, {'mode': 'async'})
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(json.loads(response.content)['receipt']['job_id'], str(job.id))
+
+    def test_stale_jobs_requeued_or_failed_by_worker(self):
+        self.attempt.status = 'submitted'
+        self.attempt.save(update_fields=['status'])
+        stuck = timezone.now() - timedelta(minutes=10)
+        exhausted = SubmissionJob.objects.create(attempt=self.attempt, answers=self.data.answers,
+                                                 submitted_at=stuck, status='processing',
+                                                 started_at=stuck, tries=MAX_TRIES)
+        other = TestAttempt.objects.create(test=self.data.test, user=self.data.staff, langue='fr',
+                                           status='submitted')
+        retried = SubmissionJob.objects.create(attempt=other, answers=self.data.answers, submitted_at=stuck,
+                                               status='processing', started_at=stuck, tries=1)
+
+        # Reprise périodique dans la boucle du worker (ici dès le premier tour)
+        with self.assertLogs('hse_app.submission', 'WARNING'):
+            run_worker(threading.Event(), once=True, stale_after=0)
+
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, 'failed')
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.status, 'in_progress')
+        retried.refresh_from_db()
+        self.assertEqual((retried.status, retried.tries), ('done', 2))
+
+    def test_sync_submit_issues_certificate(self):
+        correct = {str(question.id): question.reponse_correcte for question in Question.objects.all()}
+        response = self.call(views.submit_hse_test_answers, {'answers': correct})
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['results']
+        self.assertTrue(results['passed'])
+        certificate = Certificate.objects.get(test_attempt=self.attempt)
+        self.assertEqual(results['certificate']['id'], str(certificate.id))
+
+
+class LangueValidationTests(TestCase):
+    """Langue inconnue: 400, aucun paquet de questions construit pour elle"""
+
+    def setUp(self):
+        self.data = build_dataset(1)
+        self.factory = RequestFactory()
+
+    def test_unknown_langue_rejected(self):
+        request = self.factory.get('/', {'langue': 'xx'})
+        request.user = self.data.participant
+        response = views.get_hse_test_questions(request, version=self.data.test.version)
+        self.assertEqual(response.status_code, 400)
+
+        request = self.factory.post('/', data=json.dumps({'test_version': self.data.test.version, 'langue': 'xx'}),
+                                    content_type='application/json')
+        request.user = self.data.newcomer
+        response = views.start_hse_test_attempt(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(TestAttempt.objects.filter(user=self.data.newcomer).exists())
+
+
+class ExcelRowsTests(SimpleTestCase):
+    """Lecture en flux: en-tête trouvé, colonnes et lignes vides ignorées, valeurs comme avec pandas"""
+
+    def test_rows_under_detected_header(self):
+        upload = excel_upload([
+            ['Liste de présence du jour'],
+            [],
+            ['N°', 'CIN', None, 'Nom', 'CIN'],
+            [1, ' ab123 ', 'ignoré', 'Ali', 'X'],
+            [None, None, None, None, None],
+            [2.0, 'CD456', None, datetime.datetime(2025, 3, 1), None],
+        ])
+        with ExcelRows(upload, header_contains='CIN', lowercase=True, as_text=True) as rows:
+            self.assertEqual((rows.header_line, rows.headers), (3, ['n°', 'cin', 'nom', 'cin.1']))
+            self.assertEqual(list(rows.numbered()), [
+                (4, {'n°': '1', 'cin': 'ab123', 'nom': 'Ali', 'cin.1': 'X'}),
+                (6, {'n°': '2', 'cin': 'CD456', 'nom': '2025-03-01', 'cin.1': ''}),
+            ])
+
+    def test_typed_values_without_as_text(self):
+        with ExcelRows(excel_upload([['Date', 'Heures'], [datetime.date(2025, 3, 1), 7.5]])) as rows:
+            row = next(iter(rows))
+        self.assertEqual(row, {'Date': datetime.datetime(2025, 3, 1), 'Heures': 7.5})
+
+    def test_unreadable_or_headerless_files(self):
+        with self.assertRaises(ExcelFormatError):
+            ExcelRows(excel_upload([['Titre'], ['a']]), header_contains='CIN')
+        with self.assertRaises(ExcelFormatError):
+            ExcelRows(excel_upload([]))
+        with self.assertRaises(ExcelFormatError):
+            ExcelRows(SimpleUploadedFile('faux.xlsx', b'pas un classeur'))
+
+
+class ExcelCacheTests(SimpleTestCase):
+    """Cache NDJSON des classeurs: relecture à l'identique (types compris), rien d'incomplet, purge"""
+
+    ROWS = [
+        ['CIN', 'Date', 'Entrée', 'Durée', 'Présent', 'Score'],
+        ['AB1', datetime.datetime(2025, 3, 1, 8, 30), datetime.time(8, 30), datetime.timedelta(hours=2), True, 17.5],
+        ['CD2', datetime.datetime(2025, 3, 2), None, None, False, 3],
+    ]
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        override = override_settings(EXCEL_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def read(self, upload, **options):
+        with open_excel(upload, **options) as rows:
+            return rows.from_cache, rows.headers, list(rows.numbered())
+
+    def test_round_trip_keeps_cell_types(self):
+        upload = excel_upload(self.ROWS)
+        from_cache, headers, first = self.read(upload)
+        self.assertFalse(from_cache)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        from_cache, cached_headers, again = self.read(upload)
+        self.assertTrue(from_cache)
+        self.assertEqual((cached_headers, again), (headers, first))
+        self.assertIsInstance(again[0][1]['Entrée'], datetime.time)
+        self.assertIsInstance(again[0][1]['Durée'], datetime.timedelta)
+
+        # Autres options de lecture: autre fichier de cache
+        self.assertFalse(self.read(upload, as_text=True)[0])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_interrupted_read_is_not_cached(self):
+        upload = excel_upload(self.ROWS)
+        with open_excel(upload) as rows:
+            next(rows.numbered())
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertFalse(self.read(upload)[0])
+
+    def test_purge_removes_unused_files(self):
+        self.read(excel_upload(self.ROWS))
+        self.read(excel_upload(self.ROWS[:2]))
+        old, recent = sorted(os.listdir(self.cache_dir))
+        stale = datetime.datetime.now() - datetime.timedelta(days=40)
+        os.utime(os.path.join(self.cache_dir, old), (stale.timestamp(), stale.timestamp()))
+
+        self.assertEqual(purge_excel_cache(), 1)
+        self.assertEqual(os.listdir(self.cache_dir), [recent])
@@ -2,6 +2,18 @@
 from django.urls import path
 from . import views
 
+# Parcours du participant (questions, tentative, sauvegarde, soumission):
+# seules routes montées sous /api/hse/ par backend/urls.py, avant le routeur
+# des viewsets (users/, managers/). Les autres vues de ce fichier n'y sont
+# pas exposées.
+participant_urlpatterns = [
+    path('tests/version/<int:version>/questions/', views.get_hse_test_questions, name='test_questions'),
+    path('test-attempts/start/', views.start_hse_test_attempt, name='start_test_attempt'),
+    path('test-attempts/<int:attempt_id>/answers/', views.autosave_hse_test_answers, name='autosave_test_answers'),
+    path('test-attempts/<int:attempt_id>/submit/', views.submit_hse_test_answers, name='submit_test_answers'),
+    path('submissions/<uuid:job_id>/', views.get_submission_status, name='submission_status'),
+]
+
 urlpatterns = [
     # Users HSE
     path('users/search/', views.search_hse_user_by_cin, name='search_hse_user'),
@@ -14,9 +26,8 @@ urlpatterns = [
     path('tests/version/<int:version>/', views.get_hse_test_details, name='test_details'),  # ← CHANGÉ ICI
     
     # Test Attempts
-    path('test-attempts/start/', views.start_hse_test_attempt, name='start_test_attempt'),
-    path('test-attempts/<int:attempt_id>/submit/', views.submit_hse_test_answers, name='submit_test_answers'),
     path('test-attempts/history/', views.get_user_test_history, name='test_history'),
+    *participant_urlpatterns,
     
     # Statistics
     path('statistics/', views.get_hse_statistics, name='hse_statistics'),
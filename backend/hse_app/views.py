@@ -1,13 +1,21 @@
 # hse_app/views.py
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q, Count, Avg, F
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.utils import timezone
 import json
 from datetime import datetime, timedelta
 from tests.models import Test, Question, TestAttempt
-from hse_app.models import HSEManager, HSEUser
+from tests.question_bundle import get_question_bundle, splice_json, LANGUES
+from tests.answer_key import get_answer_key
+from hse_app.models import HSEManager, HSEUser, SubmissionJob
+from hse_app.submission import (
+    finalize_attempt, attach_certificate, sync_hse_user, enqueue_submission,
+    clean_answer_delta, merge_answers, answered_count, seal_answers
+)
 from authentication.models import TestUser
 
 
@@ -32,7 +40,7 @@ def search_hse_user_by_cin(request):
         user = HSEUser.objects.get(cin=cin)
         
         # Récupérer les tentatives de test
-        attempts = TestAttempt.objects.filter(user__cin=cin).order_by('-started_at')
+        attempts = TestAttempt.objects.filter(user__cin=cin).select_related('test').order_by('-started_at')
         attempts_data = []
         
         for attempt in attempts[:5]:  # 5 dernières tentatives
@@ -167,8 +175,8 @@ def list_hse_users(request):
     page = int(request.GET.get('page', 1))
     page_size = int(request.GET.get('page_size', 20))
     
-    # Construction de la requête
-    users = HSEUser.objects.all()
+    # Construction de la requête (compteurs de tentatives annotés, pas de requête par ligne)
+    users = HSEUser.objects.with_attempt_stats()
     
     if search:
         users = users.filter(
@@ -207,7 +215,7 @@ def list_hse_users(request):
             'reussite': user.reussite,
             'score': user.score,
             'taux_reussite': user.taux_reussite,
-            'test_attempts': TestAttempt.objects.filter(user__cin=user.cin).count()
+            'test_attempts': user.attempts_count
         })
     
     return JsonResponse({
@@ -260,9 +268,128 @@ def get_hse_test_details(request, version):
     """Détails d'un test HSE spécifique"""
     try:
         test = Test.objects.get(version=version, is_active=True)
-        # ... ta logique pour retourner les détails du test
     except Test.DoesNotExist:
-        return JsonResponse({'success': False, 'error': f'Test version {version} non trouvé'})
+        return JsonResponse({'success': False, 'error': f'Test version {version} non trouvé'}, status=404)
+    
+    return JsonResponse({
+        'success': True,
+        'test': {
+            'id': test.id,
+            'version': test.version,
+            'description': test.description,
+            'duration_minutes': test.duration_minutes,
+            'total_questions': test.total_questions,
+            'mandatory_questions_count': test.mandatory_questions_count,
+            'optional_questions_count': test.optional_questions_count,
+            'passing_score_optional': test.passing_score_optional,
+            'questions_count': test.questions_count,
+            'questions_in_order': test.ordre_questions,
+            'mandatory_questions': test.mandatory_questions
+        }
+    })
+
+
+@login_required
+def get_hse_test_questions(request, version):
+    """
+    Questions d'une version de test dans une langue (sans les réponses)
+    GET: /api/hse/tests/version/{version}/questions/?langue=fr
+    Supporte If-None-Match (304) et Accept-Encoding: gzip.
+    Langue inconnue: 400 (pas de paquet construit ni mis en cache pour elle).
+    """
+    langue = request.GET.get('langue', 'ar')
+    if langue not in LANGUES:
+        return JsonResponse({
+            'success': False,
+            'error': f"Langue invalide : {langue} (attendu : {', '.join(LANGUES)})"
+        }, status=400)
+    
+    try:
+        test = Test.objects.get(version=version, is_active=True)
+    except Test.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': f'Test version {version} non trouvé'
+        }, status=404)
+    
+    bundle = get_question_bundle(test, langue)
+    
+    if bundle.etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    elif bundle.gzipped is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(bundle.gzipped, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(bundle.data, content_type='application/json')
+    
+    response['ETag'] = bundle.etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@csrf_exempt
+@login_required
+def autosave_hse_test_answers(request, attempt_id):
+    """
+    Sauvegarde automatique des réponses pendant le test
+    POST/PATCH: /api/hse/test-attempts/{attempt_id}/answers/
+    {
+        "answers": {
+            "12": true,
+            "13": null   # ← efface la réponse
+        }
+    }
+    Seules les questions envoyées sont modifiées (fusion en base).
+    Retourne le nombre de réponses enregistrées côté serveur.
+    """
+    if request.method not in ('POST', 'PATCH'):
+        return JsonResponse({
+            'success': False,
+            'error': 'Méthode non autorisée'
+        }, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Format JSON invalide'
+        }, status=400)
+    
+    answers = data.get('answers')
+    if not isinstance(answers, dict):
+        return JsonResponse({
+            'success': False,
+            'error': 'Réponses manquantes'
+        }, status=400)
+    
+    attempt = TestAttempt.objects.select_related('test').filter(
+        id=attempt_id,
+        user=request.user
+    ).first()
+    if attempt is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Tentative non trouvée'
+        }, status=404)
+    
+    delta, ignored = clean_answer_delta(get_answer_key(attempt.test), answers)
+    
+    if not merge_answers(attempt.id, request.user, delta):
+        return JsonResponse({
+            'success': False,
+            'error': 'Cette tentative n\'est plus en cours'
+        }, status=409)
+    
+    return JsonResponse({
+        'success': True,
+        'attempt_id': attempt.id,
+        'saved': len(delta),
+        'ignored': ignored,
+        'answered_count': answered_count(attempt.id),
+        'total_questions': attempt.test.total_questions
+    })
 
 
 @csrf_exempt
@@ -277,107 +404,69 @@ def submit_hse_test_answers(request, attempt_id):
             "2": false,
             "3": true,
             ...
-        }
+        },
+        "mode": "async"  # optionnel: accusé de réception immédiat (202)
     }
+    `answers` est optionnel: les réponses déjà sauvegardées
+    (/answers/) sont complétées par celles envoyées ici, puis la tentative
+    est scellée.
+    En mode "async", les réponses sont enregistrées telles quelles, la
+    tentative est scellée (statut "submitted": les sauvegardes suivantes
+    reçoivent 409) et notée par les workers (`manage.py process_submissions`);
+    le statut se consulte sur /api/hse/submissions/{job_id}/.
+    Une tentative déjà soumise renvoie 409, sauf le renvoi à l'identique
+    d'une soumission asynchrone (même accusé de réception).
     """
     if request.method == 'POST':
         data = json.loads(request.body)
-        user_answers = data.get('answers', {})
         
-        # Récupérer la tentative
-        attempt = TestAttempt.objects.get(
-            id=attempt_id,
-            user=request.user,
-            status='in_progress'
-        )
-        
-        # Mettre à jour les réponses (format simplifié)
-        attempt.user_answers = user_answers
-        attempt.completed_at = datetime.now()
-        
-        # Calculer le temps pris
-        if attempt.started_at and attempt.completed_at:
-            time_taken = attempt.completed_at - attempt.started_at
-            attempt.time_taken_seconds = int(time_taken.total_seconds())
-        
-        # Calculer les scores
-        test = attempt.test
-        mandatory_ids = set(test.mandatory_questions)
-        
-        mandatory_correct = 0
-        optional_correct = 0
-        
-        for question_id_str, user_answer in user_answers.items():
-            question_id = int(question_id_str)
-            question = Question.objects.get(id=question_id)
-                
-                # Vérifier la réponse (user_answer est déjà True/False)
-            is_correct = question.check_answer(user_answer)
-                
-            if question_id in mandatory_ids:
-                if is_correct:
-                    mandatory_correct += 1
-            else:
-                if is_correct:
-                    optional_correct += 1
-                                    
-        # Mettre à jour les scores
-        attempt.mandatory_correct = mandatory_correct
-        attempt.mandatory_wrong = len(mandatory_ids) - mandatory_correct
-        attempt.mandatory_total = len(mandatory_ids)
-        attempt.optional_correct = optional_correct
-        attempt.optional_wrong = test.total_questions - len(mandatory_ids) - optional_correct
-        attempt.optional_total = test.total_questions - len(mandatory_ids)
-        attempt.mandatory_score_percentage = round((mandatory_correct / len(mandatory_ids) * 100), 2) if len(mandatory_ids) > 0 else 0
-        attempt.optional_score_percentage = round((optional_correct / attempt.optional_total * 100), 2) if attempt.optional_total > 0 else 0
-        attempt.overall_score_percentage = round(((mandatory_correct + optional_correct) / test.total_questions * 100), 2) if test.total_questions > 0 else 0
-        attempt.passed = mandatory_correct == len(mandatory_ids)
-        attempt.status = 'passed' if attempt.passed else 'failed'
-        
-        attempt.save()
+        with transaction.atomic():
+            # Verrouiller la tentative: aucune sauvegarde ne s'intercale
+            attempt = TestAttempt.objects.select_for_update(of=('self',)).select_related('test').filter(
+                id=attempt_id,
+                user=request.user
+            ).first()
+            if attempt is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Tentative non trouvée'
+                }, status=404)
+            
+            delta, _ = clean_answer_delta(get_answer_key(attempt.test), data.get('answers'))
+            user_answers = seal_answers(attempt.user_answers, delta)
+            
+            if attempt.status != 'in_progress':
+                job = None
+                if attempt.status == 'submitted' and user_answers == attempt.user_answers:
+                    job = SubmissionJob.objects.filter(attempt=attempt).order_by('-created_at').first()
+                if job is None:
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'Cette tentative a déjà été soumise'
+                    }, status=409)
+                return _submission_receipt(job, 'Soumission déjà enregistrée')
+            
+            if data.get('mode') == 'async':
+                # Sceller la tentative sous le verrou: plus aucune fusion de réponses
+                attempt.user_answers = user_answers
+                attempt.status = 'submitted'
+                attempt.save(update_fields=['user_answers', 'status'])
+                job, created = enqueue_submission(attempt, user_answers, timezone.now())
+                return _submission_receipt(
+                    job,
+                    'Réponses enregistrées, correction en cours' if created else 'Soumission déjà enregistrée'
+                )
+            
+            results = finalize_attempt(attempt, user_answers, timezone.now())
+            # Certificat émis comme par les workers du mode asynchrone
+            attach_certificate(attempt, results)
         
         # Mettre à jour les statistiques de l'utilisateur HSE
-        try:
-            hse_user = HSEUser.objects.get(cin=request.user.cin)
-            hse_user.score = attempt.overall_score_percentage
-            hse_user.reussite = attempt.passed
-            hse_user.save()
-        except HSEUser.DoesNotExist:
-            # Créer un utilisateur HSE si non existant
-            HSEUser.objects.create(
-                nom=request.user.last_name or '',
-                prénom=request.user.first_name or request.user.username,
-                cin=request.user.cin,
-                email=request.user.email or '',
-                entite='',
-                entreprise='',
-                score=attempt.overall_score_percentage,
-                reussite=attempt.passed,
-                presence=True
-            )
+        sync_hse_user(request.user, attempt)
             
         return JsonResponse({
             'success': True,
-            'results': {
-                'passed': attempt.passed,
-                'mandatory': {
-                    'correct': mandatory_correct,
-                    'total': len(mandatory_ids),
-                    'percentage': attempt.mandatory_score_percentage,
-                    'passed': mandatory_correct == len(mandatory_ids)
-                },
-                'optional': {
-                    'correct': optional_correct,
-                    'total': attempt.optional_total,
-                    'percentage': attempt.optional_score_percentage
-                },
-                'overall': {
-                    'correct': mandatory_correct + optional_correct,
-                    'total': test.total_questions,
-                    'percentage': attempt.overall_score_percentage
-                },
-                'time_taken_seconds': attempt.time_taken_seconds
-            },
+            'results': results,
             'message': 'Test soumis avec succès'
         })
             
@@ -387,6 +476,59 @@ def submit_hse_test_answers(request, attempt_id):
     }, status=405)
 
 
+def _submission_receipt(job, message):
+    """Accusé de réception (202) d'une soumission asynchrone"""
+    return JsonResponse({
+        'success': True,
+        'receipt': {
+            'job_id': str(job.id),
+            'attempt_id': job.attempt_id,
+            'status': job.status,
+            'submitted_at': job.submitted_at.isoformat(),
+            'status_url': f'/api/hse/submissions/{job.id}/'
+        },
+        'message': message
+    }, status=202)
+
+
+@login_required
+def get_submission_status(request, job_id):
+    """
+    Statut d'une soumission asynchrone
+    GET: /api/hse/submissions/{job_id}/
+    """
+    try:
+        job = SubmissionJob.objects.select_related('attempt').get(id=job_id)
+    except SubmissionJob.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Soumission non trouvée'
+        }, status=404)
+    
+    if job.attempt.user_id != request.user.id and not request.user.is_staff:
+        return JsonResponse({
+            'success': False,
+            'error': 'Accès non autorisé'
+        }, status=403)
+    
+    return JsonResponse({
+        'success': True,
+        'submission': {
+            'job_id': str(job.id),
+            'attempt_id': job.attempt_id,
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'submitted_at': job.submitted_at.isoformat(),
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+            'results': job.result if job.status == 'done' else None,
+            'error': job.error if job.status == 'failed' else None,
+            'attempt_status': job.attempt.status,
+            # Échec définitif: la tentative est rouverte, le participant peut soumettre à nouveau
+            'can_resubmit': job.status == 'failed' and job.attempt.status == 'in_progress'
+        }
+    })
+
+
 # ==================== API TEST ATTEMPTS ====================
 
 @csrf_exempt
@@ -397,14 +539,23 @@ def start_hse_test_attempt(request):
     POST: /api/hse/test-attempts/start/
     {
         "test_version": 1,
-        "langue": "fr"
+        "langue": "fr",
+        "bundle_etag": "\"3f2a...\""   # optionnel: ETag des questions déjà reçues
     }
+    Les questions viennent du paquet pré-sérialisé (version, langue):
+    si `bundle_etag` correspond, elles ne sont pas renvoyées.
     """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             test_version = data.get('test_version')
             langue = data.get('langue', 'ar')
+            bundle_etag = data.get('bundle_etag')
+            if langue not in LANGUES:
+                return JsonResponse({
+                    'success': False,
+                    'error': f"Langue invalide : {langue} (attendu : {', '.join(LANGUES)})"
+                }, status=400)
             
             # Vérifier l'utilisateur
             user = request.user
@@ -426,45 +577,26 @@ def start_hse_test_attempt(request):
             ).first()
             
             if existing_attempt:
-                # Retourner la tentative existante
-                return JsonResponse({
-                    'success': True,
-                    'attempt_id': existing_attempt.id,
-                    'test_version': test.version,
-                    'started_at': existing_attempt.started_at.isoformat(),
-                    'message': 'Tentative en cours trouvée'
-                })
-            
-            # Créer une nouvelle tentative
-            attempt = TestAttempt.objects.create(
-                test=test,
-                user=user,
-                langue=langue,
-                status='in_progress',
-                started_at=datetime.now()
-            )
-            
-            # Récupérer les questions dans l'ordre
-            questions_in_order = test.get_questions_in_order()
+                # Retourner la tentative existante (avec ses questions)
+                attempt = existing_attempt
+                message = 'Tentative en cours trouvée'
+            else:
+                # Créer une nouvelle tentative
+                attempt = TestAttempt.objects.create(
+                    test=test,
+                    user=user,
+                    langue=langue,
+                    status='in_progress',
+                    started_at=datetime.now()
+                )
+                message = 'Test démarré avec succès'
             
-            questions_data = []
-            for question in questions_in_order:
-                is_mandatory = str(question.id) in [str(qid) for qid in test.mandatory_questions]
-                
-                # Pour le test, on ne montre pas la réponse correcte
-                question_display = {
-                    'id': question.id,
-                    'question_code': question.question_code,
-                    'enonce': question.get_enonce(langue),
-                    'is_mandatory': is_mandatory,
-                    'points': question.points,
-                    'has_image': question.has_image,
-                    'image_url': question.image.url if question.image else None
-                }
-                questions_data.append(question_display)
+            # Questions pré-sérialisées pour (version, langue de la tentative)
+            bundle = get_question_bundle(test, attempt.langue)
             
-            return JsonResponse({
+            payload = {
                 'success': True,
+                'attempt_id': attempt.id,
                 'attempt': {
                     'id': attempt.id,
                     'test_version': test.version,
@@ -472,11 +604,24 @@ def start_hse_test_attempt(request):
                     'started_at': attempt.started_at.isoformat(),
                     'duration_minutes': test.duration_minutes,
                     'total_questions': test.total_questions,
-                    'mandatory_count': test.mandatory_questions_count
+                    'mandatory_count': test.mandatory_questions_count,
+                    # Réponses déjà sauvegardées (reprise après coupure réseau)
+                    'saved_answers': attempt.user_answers or {}
                 },
-                'questions': questions_data,
-                'message': 'Test démarré avec succès'
-            })
+                'message': message,
+                'questions_etag': bundle.etag,
+                'questions_unchanged': bundle_etag == bundle.etag,
+            }
+            
+            if payload['questions_unchanged']:
+                response = JsonResponse(payload)
+            else:
+                response = HttpResponse(
+                    splice_json(payload, 'questions', bundle.data),
+                    content_type='application/json'
+                )
+            response['ETag'] = bundle.etag
+            return response
             
         except json.JSONDecodeError:
             return JsonResponse({
@@ -506,7 +651,7 @@ def get_user_test_history(request):
     attempts = TestAttempt.objects.filter(
         user=user,
         completed_at__isnull=False
-    ).order_by('-started_at')
+    ).select_related('test').order_by('-started_at')
     
     history = []
     for attempt in attempts:
@@ -647,13 +792,13 @@ def list_hse_managers(request):
             'error': 'Accès non autorisé'
         }, status=403)
     
-    managers = HSEManager.objects.all().order_by('name')
+    managers = HSEManager.objects.all().order_by('full_name')
     
     managers_data = []
     for manager in managers:
         managers_data.append({
             'id': manager.id,
-            'name': manager.name,
+            'name': manager.full_name,
             'cin': manager.cin,
         })
     
@@ -682,7 +827,7 @@ def create_hse_manager(request):
             data = json.loads(request.body)
             
             manager = HSEManager.objects.create(
-                name=data['name'],
+                full_name=data.get('full_name') or data['name'],
                 cin=data.get('cin', '')
             )
             
@@ -690,7 +835,7 @@ def create_hse_manager(request):
                 'success': True,
                 'manager': {
                     'id': manager.id,
-                    'name': manager.name,
+                    'name': manager.full_name,
                     'cin': manager.cin
                 },
                 'message': 'Manager HSE créé avec succès'
@@ -723,53 +868,43 @@ def sync_test_users_with_hse(request):
         }, status=403)
     
     try:
-        synced = 0
-        created = 0
-        errors = []
+        # Une lecture par table, puis écritures groupées (pas de get_or_create par utilisateur)
+        test_users = list(TestUser.objects.values_list('cin', 'full_name', 'username'))
+        hse_users = {
+            hse_user.cin: hse_user
+            for hse_user in HSEUser.objects.filter(cin__in=TestUser.objects.values('cin'))
+        }
         
-        # Récupérer tous les TestUsers qui n'ont pas de HSEUser correspondant
-        test_users = TestUser.objects.all()
+        to_create = []
+        to_update = []
+        for cin, full_name, username in test_users:
+            hse_user = hse_users.get(cin)
+            if hse_user is None:
+                to_create.append(HSEUser(
+                    cin=cin,
+                    nom='',
+                    prénom=full_name or username,
+                    email='',
+                    entite='Non spécifié',
+                    entreprise='Non spécifié'
+                ))
+            elif not hse_user.prénom and (full_name or username):
+                # Compléter les informations manquantes
+                hse_user.prénom = full_name or username
+                to_update.append(hse_user)
         
-        for test_user in test_users:
-            try:
-                # Vérifier si HSEUser existe déjà
-                hse_user, created_flag = HSEUser.objects.get_or_create(
-                    cin=test_user.cin,
-                    defaults={
-                        'nom': test_user.last_name or '',
-                        'prénom': test_user.first_name or test_user.username,
-                        'email': test_user.email or '',
-                        'entite': 'Non spécifié',
-                        'entreprise': 'Non spécifié'
-                    }
-                )
-                
-                # Mettre à jour les informations si nécessaire
-                if not created_flag:
-                    if test_user.first_name and not hse_user.prénom:
-                        hse_user.prénom = test_user.first_name
-                    if test_user.last_name and not hse_user.nom:
-                        hse_user.nom = test_user.last_name
-                    if test_user.email and not hse_user.email:
-                        hse_user.email = test_user.email
-                    hse_user.save()
-                    synced += 1
-                else:
-                    created += 1
-                    
-            except Exception as e:
-                errors.append({
-                    'user_cin': test_user.cin,
-                    'error': str(e)
-                })
+        HSEUser.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+        HSEUser.objects.bulk_update(to_update, ['prénom'], batch_size=500)
+        created = len(to_create)
+        synced = len(to_update)
         
         return JsonResponse({
             'success': True,
             'sync_result': {
-                'test_users_processed': test_users.count(),
+                'test_users_processed': len(test_users),
                 'hse_users_created': created,
                 'hse_users_updated': synced,
-                'errors_count': len(errors)
+                'errors_count': 0
             },
             'message': f'Synchronisation terminée: {created} créés, {synced} mis à jour'
         })
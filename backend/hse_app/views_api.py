@@ -46,14 +46,15 @@ class HSEUserViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return HSEUserDetailSerializer
-        elif self.action == 'update-presence':
+        elif self.action == 'update_presence':
             return HSEUserPresenceSerializer
         elif self.action in ['create', 'update', 'partial_update']:
             return HSEUserCreateUpdateSerializer
         return HSEUserListSerializer
     
     def get_queryset(self):
-        queryset = HSEUser.objects.all()
+        # taux_reussite lu depuis les compteurs annotés (pas de requête par ligne)
+        queryset = HSEUser.objects.with_attempt_stats()
         
         cin = self.request.query_params.get('cin')
         if cin:
@@ -103,7 +104,7 @@ class HSEUserViewSet(viewsets.ModelViewSet):
         user = self.get_object()
         
         if user.test_user:
-            attempts = user.test_user.testattempt_set.all().order_by('-started_at')
+            attempts = user.test_user.testattempt_set.select_related('test', 'user').order_by('-started_at')
             serializer = TestAttemptListSerializer(attempts, many=True)
             
             return Response({
@@ -131,7 +132,7 @@ class HSEUserViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            user = HSEUser.objects.get(cin=cin)
+            user = HSEUser.objects.with_attempt_stats().get(cin=cin)
             serializer = HSEUserDetailSerializer(user)
             return Response({
                 'success': True,
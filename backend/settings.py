@@ -117,12 +117,34 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 AUTHENTICATION_BACKENDS = [
     'authentication.backend.AdminBackend',       # Pour /admin
+    'authentication.backend.QRTicketBackend',    # HSE Users (ticket QR signé + CIN)
     'authentication.backend.HSEUserBackend',     # HSE Users (CIN seul)
     'authentication.backend.HSEManagerBackend',  # Managers (full_name + CIN)
 ]
 
 AUTH_USER_MODEL = 'authentication.TestUser'
 
+# Validité (secondes) des tickets signés des QR codes de séance
+QR_TICKET_MAX_AGE = int(os.getenv('QR_TICKET_MAX_AGE', 12 * 3600))
+
+# Durée (secondes) de mise en cache des utilisateurs de session (get_user des backends)
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', 60))
+
+# Admission de la connexion CIN + démarrage du test (par processus)
+# Débit (connexions/s, 0 = désactivé) et réserve; au-delà, refus immédiat (429 + retry_after)
+AUTH_ADMISSION_RATE = float(os.getenv('AUTH_ADMISSION_RATE', 0))
+AUTH_ADMISSION_BURST = int(os.getenv('AUTH_ADMISSION_BURST', 40))
+# File par test (0 = désactivée), nombre de tests suivis en mémoire
+AUTH_ADMISSION_PER_TEST_RATE = float(os.getenv('AUTH_ADMISSION_PER_TEST_RATE', 0))
+AUTH_ADMISSION_PER_TEST_BURST = int(os.getenv('AUTH_ADMISSION_PER_TEST_BURST', 20))
+AUTH_ADMISSION_MAX_TESTS = int(os.getenv('AUTH_ADMISSION_MAX_TESTS', 256))
+
+# Imports Excel d'apprenants en arrière-plan: lignes validées par lot
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 500))
+
+# Dossier des fichiers Excel du jour ({jour}-{mois}-{année}.xlsx) lus par /stats/hse/stats/
+STATS_DATA_DIR = Path(os.getenv('STATS_DATA_DIR', BASE_DIR / 'backend' / 'data'))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -140,6 +162,13 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Fichiers envoyés (imports Excel en attente de traitement)
+MEDIA_ROOT = Path(os.getenv('MEDIA_ROOT', BASE_DIR / 'media'))
+MEDIA_URL = 'media/'
+
+# Classeurs Excel déjà lus, mis en cache par empreinte du contenu (vide = désactivé)
+EXCEL_CACHE_DIR = os.getenv('EXCEL_CACHE_DIR', MEDIA_ROOT / 'excel_cache')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
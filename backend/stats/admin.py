@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import ExcelUpload, DailyStatsSnapshot
 
-# Register your models here.
+
+@admin.register(ExcelUpload)
+class ExcelUploadAdmin(admin.ModelAdmin):
+    """Fichiers Excel envoyés sur /stats/upload_excel/ (supprimés après 7 jours)"""
+    list_display = ('original_name', 'row_count', 'header_line', 'created_at')
+    readonly_fields = ('original_name', 'header_line', 'headers', 'row_count', 'data_file', 'page_offsets', 'created_at')
+
+
+@admin.register(DailyStatsSnapshot)
+class DailyStatsSnapshotAdmin(admin.ModelAdmin):
+    """Statistiques calculées des fichiers du jour (recalculées quand le fichier change)"""
+    list_display = ('date', 'presence', 'test_initial', 'test_final', 'improvement', 'row_count', 'computed_at')
+    readonly_fields = ('source_path', 'checksum', 'file_mtime', 'file_size', 'computed_at')
+    date_hierarchy = 'date'
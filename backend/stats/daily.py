@@ -0,0 +1,358 @@
+# stats/daily.py
+"""
+Statistiques des fichiers Excel du jour (STATS_DATA_DIR/{jour}-{mois}-{année}.xlsx).
+
+Le tableau de bord rafraîchit /stats/hse/stats/ en boucle; relire le
+classeur à chaque appel coûte bien plus que les quelques valeurs
+affichées. Les moyennes calculées sont gardées dans DailyStatsSnapshot,
+une ligne par date, avec la taille, la date de modification et l'empreinte
+SHA-256 du fichier source:
+- taille et mtime inchangés: le snapshot est servi tel quel (un stat() et
+  une requête);
+- sinon l'empreinte est recalculée: fichier identique (copié, touché), on
+  met juste à jour mtime; contenu différent, le fichier est relu.
+
+Relire un fichier remplace aussi ses lignes dans DailyAttendance (une par
+participant, valeurs brutes): les tendances sur une semaine, un mois ou
+une année (`attendance_trend`) sont agrégées en SQL, en une requête, sans
+rouvrir les classeurs. `ingest_data_dir` lit d'avance tout le dossier;
+`watch_data_dir` (commande `ingest_daily_stats --watch`) le surveille en
+continu, pour que les fichiers déposés soient lus hors des requêtes.
+"""
+import datetime
+import logging
+import os
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction, close_old_connections
+from django.db.models import Avg, Count
+from django.db.models.functions import Trunc
+
+from hse_app.excel_cache import open_excel, content_digest
+from hse_app.excel_reader import ExcelFormatError
+from stats.models import DailyStatsSnapshot, DailyAttendance
+
+logger = logging.getLogger(__name__)
+
+# Colonne du fichier → champ de DailyAttendance
+STATS_COLUMNS = {
+    "Présence": 'presence',
+    "Test initial": 'test_initial',
+    "Test final": 'test_final',
+}
+# Incrémenter quand la lecture change: les snapshots existants seront relus
+PARSER_VERSION = 1
+INGEST_BATCH_SIZE = 1000
+TREND_BUCKETS = ('day', 'week', 'month', 'year')
+DAILY_FILE_RE = re.compile(r'^(?P<day>\d{1,2})-(?P<month>\d{1,2})-(?P<year>\d{4})\.xlsx$')
+
+
+class MissingColumnsError(ExcelFormatError):
+    """Colonnes de statistiques absentes du fichier du jour"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        super().__init__(f"Colonnes manquantes : {', '.join(columns)}")
+
+
+def stats_data_dir():
+    return Path(getattr(settings, 'STATS_DATA_DIR', 'backend/data'))
+
+
+def pick_daily_file(paths):
+    """
+    Fichier retenu parmi plusieurs fichiers d'une même date: le plus
+    récemment modifié (puis le nom, pour départager). None si aucun n'existe.
+    """
+    candidates = []
+    for path in paths:
+        try:
+            candidates.append((os.stat(path).st_mtime, Path(path).name, Path(path)))
+        except FileNotFoundError:
+            continue
+    return max(candidates)[2] if candidates else None
+
+
+def daily_file_path(date, data_dir=None):
+    """
+    Fichier du jour de `date`. `1-2-2025.xlsx` et `01-02-2025.xlsx` désignent
+    le même jour: s'il en existe plusieurs, le plus récemment modifié (comme
+    ingest_data_dir). Nom sans zéro (comme il est déposé) si aucun n'existe.
+    """
+    data_dir = Path(data_dir or stats_data_dir())
+    names = {
+        f"{day}-{month}-{date.year}.xlsx"
+        for day in (str(date.day), f"{date.day:02d}")
+        for month in (str(date.month), f"{date.month:02d}")
+    }
+    return pick_daily_file(data_dir / name for name in names) or data_dir / f"{date.day}-{date.month}-{date.year}.xlsx"
+
+
+def file_date(path):
+    """Date d'un fichier du jour d'après son nom, None si le nom ne suit pas le format"""
+    match = DAILY_FILE_RE.match(Path(path).name)
+    if not match:
+        return None
+    try:
+        return datetime.date(int(match['year']), int(match['month']), int(match['day']))
+    except ValueError:
+        return None
+
+
+def file_checksum(path):
+    """Empreinte SHA-256 du fichier, lu par blocs (clé du cache open_excel)"""
+    return content_digest(path)
+
+
+def _number(value):
+    """Valeur numérique d'une cellule (booléens compris), None sinon (ignorée par les moyennes)"""
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _percentages(presence, test_initial, test_final):
+    """Pourcentages affichés par le tableau de bord, à partir des moyennes (0 à 1)"""
+    presence = int((presence or 0) * 100)
+    test_initial = int((test_initial or 0) * 100)
+    test_final = int((test_final or 0) * 100)
+    return {
+        'presence': presence,
+        'test_initial': test_initial,
+        'test_final': test_final,
+        'improvement': test_final - test_initial,
+    }
+
+
+def ingest_daily_file(date, path, checksum=None):
+    """
+    Lit le fichier en flux (ou depuis le cache open_excel s'il a déjà été
+    lu, `checksum` étant son empreinte si elle est connue), remplace les lignes DailyAttendance de `date`
+    (insertions par lots) et retourne les pourcentages du jour. Les
+    moyennes ignorent les cellules vides ou texte, comme DataFrame.mean.
+    À appeler dans une transaction, snapshot de `date` verrouillé
+    (refresh_daily_snapshot).
+    """
+    with open_excel(path, digest=checksum) as rows:
+        missing = [column for column in STATS_COLUMNS if column not in rows.headers]
+        if missing:
+            raise MissingColumnsError(missing)
+        cin_column = next((header for header in rows.headers if header.lower() == 'cin'), None)
+
+        DailyAttendance.objects.filter(date=date).delete()
+
+        totals = dict.fromkeys(STATS_COLUMNS.values(), 0.0)
+        counts = dict.fromkeys(STATS_COLUMNS.values(), 0)
+        row_count = 0
+        batch = []
+        for line, row in rows.numbered():
+            values = {field: _number(row[column]) for column, field in STATS_COLUMNS.items()}
+            for field, value in values.items():
+                if value is not None:
+                    totals[field] += value
+                    counts[field] += 1
+            cin = str(row[cin_column] or '').strip()[:20] if cin_column else ''
+            batch.append(DailyAttendance(date=date, line=line, cin=cin, **values))
+            row_count += 1
+            if len(batch) >= INGEST_BATCH_SIZE:
+                DailyAttendance.objects.bulk_create(batch)
+                batch = []
+        DailyAttendance.objects.bulk_create(batch)
+
+    means = {field: totals[field] / counts[field] if counts[field] else 0.0 for field in totals}
+    return {**_percentages(**means), 'row_count': row_count}
+
+
+def refresh_daily_snapshot(date, path):
+    """
+    Met à jour si besoin le snapshot de `date` depuis `path`. Retourne
+    (snapshot ou None, état): 'unchanged', 'touched' (même contenu),
+    'ingested' (fichier relu) ou 'missing' (fichier absent).
+    Lève ExcelFormatError (MissingColumnsError) si le fichier est illisible.
+    """
+    snapshot = DailyStatsSnapshot.objects.filter(date=date).first()
+
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        # Fichier retiré du dossier: dernier snapshot connu
+        return snapshot, 'missing'
+
+    current = snapshot is not None and snapshot.parser_version == PARSER_VERSION
+    if current and snapshot.file_size == file_stat.st_size and snapshot.file_mtime == file_stat.st_mtime:
+        return snapshot, 'unchanged'
+
+    checksum = file_checksum(path)
+    if current and snapshot.checksum == checksum:
+        snapshot.file_mtime = file_stat.st_mtime
+        snapshot.file_size = file_stat.st_size
+        snapshot.source_path = str(path)
+        snapshot.save(update_fields=['file_mtime', 'file_size', 'source_path'])
+        return snapshot, 'touched'
+
+    with transaction.atomic():
+        snapshot = _lock_snapshot(date, path)
+        file_fields = {
+            'source_path': str(path),
+            'file_mtime': file_stat.st_mtime,
+            'file_size': file_stat.st_size,
+        }
+        if snapshot.parser_version == PARSER_VERSION and snapshot.checksum == checksum:
+            # Relu par un autre processus pendant l'attente du verrou
+            for field, value in file_fields.items():
+                setattr(snapshot, field, value)
+            snapshot.save(update_fields=list(file_fields))
+            return snapshot, 'touched'
+
+        metrics = ingest_daily_file(date, path, checksum=checksum)
+        for field, value in {**file_fields, 'checksum': checksum, 'parser_version': PARSER_VERSION, **metrics}.items():
+            setattr(snapshot, field, value)
+        snapshot.save()
+    return snapshot, 'ingested'
+
+
+def _lock_snapshot(date, path):
+    """
+    Snapshot de `date` verrouillé (select_for_update), créé vide au besoin:
+    deux lectures concurrentes du même jour se suivent au lieu de se
+    croiser sur les lignes DailyAttendance (unicité date, ligne). Une
+    création annulée (fichier illisible) ne laisse rien.
+    """
+    snapshot = DailyStatsSnapshot.objects.select_for_update().filter(date=date).first()
+    if snapshot is not None:
+        return snapshot
+    try:
+        with transaction.atomic():
+            return DailyStatsSnapshot.objects.create(
+                date=date, source_path=str(path), checksum='', file_mtime=0, file_size=0,
+                presence=0, test_initial=0, test_final=0, improvement=0,
+            )
+    except IntegrityError:
+        # Créé entre-temps par un autre processus: lecture verrouillante, dernière version validée
+        return DailyStatsSnapshot.objects.select_for_update().get(date=date)
+
+
+def get_daily_snapshot(date, path):
+    """
+    Snapshot à jour des statistiques de `date` (fichier `path`), relu
+    seulement si le fichier a changé. None si ni fichier ni snapshot.
+    """
+    snapshot, _state = refresh_daily_snapshot(date, path)
+    return snapshot
+
+
+def ingest_data_dir(data_dir=None, settle=0, failed=None):
+    """
+    Lit d'avance tous les fichiers du jour du dossier (seuls les fichiers
+    nouveaux ou modifiés sont relus). Retourne {'ingested': [dates],
+    'touched': n, 'unchanged': n, 'pending': [noms], 'skipped': [noms],
+    'duplicates': [noms], 'errors': {nom: erreur}}.
+
+    Plusieurs fichiers pour une même date (`1-2-2025.xlsx`,
+    `01-02-2025.xlsx`): seul le plus récemment modifié est lu, les autres
+    sont listés dans 'duplicates'.
+
+    `settle`: les fichiers modifiés depuis moins de `settle` secondes sont
+    laissés pour plus tard ('pending', copie sans doute en cours).
+    `failed`: dict {chemin: (taille, mtime)} des fichiers illisibles, tenu
+    à jour d'un passage à l'autre: un fichier en erreur n'est relu que
+    s'il a changé depuis.
+    """
+    result = {
+        'ingested': [], 'touched': 0, 'unchanged': 0, 'pending': [],
+        'skipped': [], 'duplicates': [], 'errors': {},
+    }
+    files_by_date = {}
+    for path in sorted(Path(data_dir or stats_data_dir()).glob('*.xlsx')):
+        date = file_date(path)
+        if date is None:
+            result['skipped'].append(path.name)
+            continue
+        files_by_date.setdefault(date, []).append(path)
+
+    now = time.time()
+    for date, paths in sorted(files_by_date.items()):
+        path = pick_daily_file(paths)
+        if path is None:
+            continue  # retirés entre la liste et la lecture
+        result['duplicates'].extend(other.name for other in paths if other != path)
+        try:
+            file_stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # retiré entre la liste et la lecture
+        signature = (file_stat.st_size, file_stat.st_mtime)
+        if now - file_stat.st_mtime < settle:
+            result['pending'].append(path.name)
+            continue
+        if failed is not None and failed.get(path) == signature:
+            continue  # déjà signalé, inchangé depuis
+        try:
+            _snapshot, state = refresh_daily_snapshot(date, path)
+        except ExcelFormatError as e:
+            result['errors'][path.name] = str(e)
+            if failed is not None:
+                failed[path] = signature
+            continue
+        if failed is not None:
+            failed.pop(path, None)
+        if state == 'ingested':
+            result['ingested'].append(date)
+        elif state in ('touched', 'unchanged'):
+            result[state] += 1
+    return result
+
+
+def watch_data_dir(stop_event, data_dir=None, interval=5.0, settle=2.0, on_result=None):
+    """
+    Boucle du worker `ingest_daily_stats --watch`: relit le dossier toutes
+    les `interval` secondes jusqu'à `stop_event`. Chaque passage ne coûte
+    qu'un stat() et une requête par fichier inchangé; `on_result` reçoit le
+    résultat de chaque passage. Retourne le nombre de fichiers lus.
+    """
+    failed = {}
+    ingested = 0
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            result = ingest_data_dir(data_dir, settle=settle, failed=failed)
+        except Exception:
+            # Base indisponible, dossier démonté...: on réessaie au passage suivant
+            logger.exception("Lecture du dossier des statistiques en échec")
+        else:
+            ingested += len(result['ingested'])
+            if on_result:
+                on_result(result)
+        stop_event.wait(interval)
+
+    close_old_connections()
+    return ingested
+
+
+def attendance_trend(start, end, bucket='month'):
+    """
+    Présence et scores moyens de DailyAttendance entre `start` et `end`
+    (inclus), par jour / semaine / mois / année: une seule requête
+    (regroupement SQL sur la date tronquée).
+    """
+    periods = DailyAttendance.objects.filter(
+        date__range=(start, end)
+    ).annotate(
+        period=Trunc('date', bucket)
+    ).values('period').annotate(
+        presence=Avg('presence'),
+        test_initial=Avg('test_initial'),
+        test_final=Avg('test_final'),
+        participants=Count('id'),
+        days=Count('date', distinct=True),
+    ).order_by('period')
+
+    return [
+        {
+            'period': period['period'].isoformat(),
+            **_percentages(period['presence'], period['test_initial'], period['test_final']),
+            'participants': period['participants'],
+            'days': period['days'],
+        }
+        for period in periods
+    ]
@@ -0,0 +1,70 @@
+# stats/management/commands/ingest_daily_stats.py
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from stats.daily import ingest_data_dir, watch_data_dir, stats_data_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Lit les fichiers Excel du jour de STATS_DATA_DIR (nouveaux ou modifiés seulement): "
+        "snapshots du tableau de bord et lignes DailyAttendance pour les tendances. "
+        "Avec --watch, surveille le dossier en continu (worker)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-dir', help="Dossier à lire (STATS_DATA_DIR par défaut)")
+        parser.add_argument('--watch', action='store_true', help="Surveiller le dossier jusqu'à l'arrêt du worker")
+        parser.add_argument('--interval', type=float, default=5.0, help="Attente (s) entre deux passages (--watch)")
+        parser.add_argument('--settle', type=float, default=2.0,
+                            help="Ne lire un fichier que s'il n'a pas changé depuis N secondes (copie terminée)")
+
+    def handle(self, *args, **options):
+        data_dir = options['data_dir'] or stats_data_dir()
+        self._ignored = set()
+
+        if not options['watch']:
+            result = ingest_data_dir(data_dir)
+            self._report(result)
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(result['ingested'])} fichier(s) lu(s), "
+                f"{result['unchanged'] + result['touched']} inchangé(s) ({data_dir})"
+            ))
+            return
+
+        stop_event = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write("Arrêt demandé, fin du passage en cours...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        self.stdout.write(f"Surveillance de {data_dir} (toutes les {options['interval']} s)")
+        ingested = watch_data_dir(
+            stop_event,
+            data_dir=data_dir,
+            interval=options['interval'],
+            settle=options['settle'],
+            on_result=self._report
+        )
+        self.stdout.write(self.style.SUCCESS(f"{ingested} fichier(s) lu(s)"))
+
+    def _report(self, result):
+        for date in result['ingested']:
+            self.stdout.write(f"{date:%d/%m/%Y} : fichier lu")
+        for name in result['skipped']:
+            if name in self._ignored:
+                continue  # déjà signalé à un passage précédent
+            self._ignored.add(name)
+            self.stdout.write(self.style.WARNING(f"{name} : nom ignoré (attendu jour-mois-année.xlsx)"))
+        for name in result['duplicates']:
+            if name in self._ignored:
+                continue
+            self._ignored.add(name)
+            self.stdout.write(self.style.WARNING(f"{name} : ignoré, un fichier plus récent existe pour la même date"))
+        for name, error in result['errors'].items():
+            self.stdout.write(self.style.ERROR(f"{name} : {error}"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:40
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExcelUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('original_name', models.CharField(blank=True, max_length=255, verbose_name='Nom du fichier')),
+                ('header_line', models.IntegerField(default=1, verbose_name="Ligne d'en-tête")),
+                ('headers', models.JSONField(default=list, verbose_name='En-têtes')),
+                ('row_count', models.IntegerField(default=0, verbose_name='Nombre de lignes')),
+                ('data_file', models.FileField(upload_to='stats_uploads/', verbose_name='Lignes (NDJSON)')),
+                ('page_offsets', models.JSONField(default=list, verbose_name='Index des positions')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name="Date d'envoi")),
+            ],
+            options={
+                'verbose_name': 'Fichier Excel importé',
+                'verbose_name_plural': 'Fichiers Excel importés',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
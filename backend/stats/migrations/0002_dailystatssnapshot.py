@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Date')),
+                ('source_path', models.CharField(max_length=500, verbose_name='Fichier source')),
+                ('checksum', models.CharField(max_length=64, verbose_name='Empreinte SHA-256')),
+                ('file_mtime', models.FloatField(verbose_name='Date de modification du fichier')),
+                ('file_size', models.BigIntegerField(verbose_name='Taille du fichier')),
+                ('presence', models.IntegerField(verbose_name='Présence (%)')),
+                ('test_initial', models.IntegerField(verbose_name='Test initial (%)')),
+                ('test_final', models.IntegerField(verbose_name='Test final (%)')),
+                ('improvement', models.IntegerField(verbose_name='Progression (points)')),
+                ('row_count', models.IntegerField(default=0, verbose_name='Nombre de lignes')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='Calculé le')),
+            ],
+            options={
+                'verbose_name': 'Statistiques du jour',
+                'verbose_name_plural': 'Statistiques par jour',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
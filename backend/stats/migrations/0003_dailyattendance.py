@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0002_dailystatssnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailystatssnapshot',
+            name='parser_version',
+            field=models.IntegerField(default=0, verbose_name='Version de lecture'),
+        ),
+        migrations.CreateModel(
+            name='DailyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('line', models.IntegerField(verbose_name='Ligne Excel')),
+                ('cin', models.CharField(blank=True, db_index=True, max_length=20, verbose_name='CIN')),
+                ('presence', models.FloatField(blank=True, null=True, verbose_name='Présence')),
+                ('test_initial', models.FloatField(blank=True, null=True, verbose_name='Test initial')),
+                ('test_final', models.FloatField(blank=True, null=True, verbose_name='Test final')),
+            ],
+            options={
+                'verbose_name': 'Présence du jour',
+                'verbose_name_plural': 'Présences par jour',
+                'ordering': ['date', 'line'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'line'), name='unique_daily_attendance_line')],
+            },
+        ),
+    ]
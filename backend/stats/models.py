@@ -1,2 +1,100 @@
 # stats/models.py
+import uuid
+
 from django.db import models
+
+
+class ExcelUpload(models.Model):
+    """
+    Feuille Excel envoyée sur /stats/upload_excel/, lue une fois et gardée
+    côté serveur en NDJSON (une ligne JSON par ligne Excel) pour être
+    servie page par page ou en flux.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    original_name = models.CharField(max_length=255, blank=True, verbose_name="Nom du fichier")
+    header_line = models.IntegerField(default=1, verbose_name="Ligne d'en-tête")
+    headers = models.JSONField(default=list, verbose_name="En-têtes")
+    row_count = models.IntegerField(default=0, verbose_name="Nombre de lignes")
+
+    data_file = models.FileField(upload_to='stats_uploads/', verbose_name="Lignes (NDJSON)")
+    # Position (octets) dans data_file de chaque bloc de lignes, pour la pagination
+    page_offsets = models.JSONField(default=list, verbose_name="Index des positions")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date d'envoi")
+
+    class Meta:
+        verbose_name = "Fichier Excel importé"
+        verbose_name_plural = "Fichiers Excel importés"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.original_name or self.id} ({self.row_count} lignes)"
+
+
+class DailyStatsSnapshot(models.Model):
+    """
+    Statistiques calculées du fichier Excel d'un jour, servies au tableau
+    de bord tant que le fichier source (taille, mtime, empreinte) ne change pas.
+    """
+
+    date = models.DateField(unique=True, verbose_name="Date")
+
+    source_path = models.CharField(max_length=500, verbose_name="Fichier source")
+    checksum = models.CharField(max_length=64, verbose_name="Empreinte SHA-256")
+    file_mtime = models.FloatField(verbose_name="Date de modification du fichier")
+    file_size = models.BigIntegerField(verbose_name="Taille du fichier")
+
+    presence = models.IntegerField(verbose_name="Présence (%)")
+    test_initial = models.IntegerField(verbose_name="Test initial (%)")
+    test_final = models.IntegerField(verbose_name="Test final (%)")
+    improvement = models.IntegerField(verbose_name="Progression (points)")
+    row_count = models.IntegerField(default=0, verbose_name="Nombre de lignes")
+    # Version de la lecture (stats/daily.py): un changement de format force la relecture
+    parser_version = models.IntegerField(default=0, verbose_name="Version de lecture")
+
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="Calculé le")
+
+    class Meta:
+        verbose_name = "Statistiques du jour"
+        verbose_name_plural = "Statistiques par jour"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Statistiques du {self.date:%d/%m/%Y}"
+
+    def as_dict(self):
+        return {
+            "presence": self.presence,
+            "test_initial": self.test_initial,
+            "test_final": self.test_final,
+            "improvement": self.improvement,
+        }
+
+
+class DailyAttendance(models.Model):
+    """
+    Une ligne de fichier du jour (un participant): présence et scores bruts,
+    pour les tendances sur une période agrégées en SQL (sans relire les fichiers).
+    """
+
+    date = models.DateField(verbose_name="Date")
+    line = models.IntegerField(verbose_name="Ligne Excel")
+    cin = models.CharField(max_length=20, blank=True, db_index=True, verbose_name="CIN")
+
+    # Valeurs numériques du fichier, None si la cellule est vide ou non numérique
+    presence = models.FloatField(null=True, blank=True, verbose_name="Présence")
+    test_initial = models.FloatField(null=True, blank=True, verbose_name="Test initial")
+    test_final = models.FloatField(null=True, blank=True, verbose_name="Test final")
+
+    class Meta:
+        verbose_name = "Présence du jour"
+        verbose_name_plural = "Présences par jour"
+        ordering = ['date', 'line']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'line'], name='unique_daily_attendance_line'),
+        ]
+
+    def __str__(self):
+        return f"{self.date:%d/%m/%Y} - ligne {self.line}"
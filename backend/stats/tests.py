@@ -1,3 +1,258 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from hse_app.testing import excel_upload
+from stats import views
+from stats.daily import (
+    MissingColumnsError, attendance_trend, daily_file_path, ingest_data_dir, refresh_daily_snapshot, watch_data_dir
+)
+from stats.models import DailyAttendance, DailyStatsSnapshot, ExcelUpload
+
+
+class StatsFilesTestMixin:
+    """Fichiers écrits par les tests (uploads, cache Excel, dossier data) dans un dossier temporaire"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.data_dir = Path(self.media_root) / 'data'
+        self.data_dir.mkdir()
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            EXCEL_CACHE_DIR=f'{self.media_root}/excel_cache',
+            STATS_DATA_DIR=self.data_dir
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.factory = RequestFactory()
+
+    def write_daily_file(self, name, rows, mtime=None):
+        """Fichier du jour dans le dossier data (en-tête CIN, Présence, Test initial, Test final)"""
+        path = self.data_dir / name
+        path.write_bytes(excel_upload([['CIN', 'Présence', 'Test initial', 'Test final']] + rows).read())
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+
+class UploadExcelTests(StatsFilesTestMixin, TestCase):
+    """upload_excel: une lecture, pages relues depuis l'index des positions, NDJSON complet"""
+
+    ROWS = [['Rapport de présence'], [], ['Entité', 'Nom', 'Présence']] + [
+        [f'Entité {index % 3}', f'Participant {index}', index % 2 == 0] for index in range(10)
+    ]
+
+    def upload(self):
+        request = self.factory.post('/', {'file': excel_upload(self.ROWS)})
+        return json.loads(views.upload_excel(request).content)
+
+    def rows(self, upload_id, **params):
+        request = self.factory.get('/', params)
+        return json.loads(views.upload_excel_rows(request, upload_id=upload_id).content)
+
+    @mock.patch('stats.uploads.INDEX_STEP', 3)
+    def test_pages_read_from_offsets(self):
+        data = self.upload()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['headers'], ['Entité', 'Nom', 'Présence'])
+        self.assertEqual(data['pagination']['total_count'], 10)
+        upload = ExcelUpload.objects.get(id=data['upload_id'])
+        self.assertEqual((upload.header_line, len(upload.page_offsets)), (3, 4))
+
+        # Page à cheval sur deux blocs de l'index
+        page = self.rows(data['upload_id'], page=2, page_size=4)
+        self.assertEqual([row['Nom'] for row in page['data']], [f'Participant {index}' for index in range(4, 8)])
+        self.assertEqual((page['pagination']['has_next'], page['pagination']['has_previous']), (True, True))
+
+        # Page hors limites: dernière page
+        last = self.rows(data['upload_id'], page=9, page_size=4)
+        self.assertEqual((last['pagination']['page'], len(last['data'])), (3, 2))
+
+        request = self.factory.get('/')
+        response = views.upload_excel_ndjson(request, upload_id=data['upload_id'])
+        lines = b''.join(response.streaming_content).splitlines()
+        response.close()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'Entité': row[0], 'Nom': row[1], 'Présence': row[2]} for row in self.ROWS[3:]
+        ])
+
+    def test_missing_header_and_expired_upload(self):
+        request = self.factory.post('/', {'file': excel_upload([['Nom'], ['Sans entité']])})
+        data = json.loads(views.upload_excel(request).content)
+        self.assertFalse(data['success'])
+        self.assertFalse(ExcelUpload.objects.exists())
+
+        old = ExcelUpload.objects.get(id=self.upload()['upload_id'])
+        ExcelUpload.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=8))
+        self.upload()  # purge les envois de plus de 7 jours
+        self.assertEqual(self.rows(old.id).get('error'), "Fichier introuvable ou expiré")
+        self.assertEqual(ExcelUpload.objects.count(), 1)
+
+
+class DailySnapshotTests(StatsFilesTestMixin, TestCase):
+    """Snapshot du jour: relu seulement si le contenu change, lignes DailyAttendance remplacées"""
+
+    DATE = datetime.date(2025, 3, 1)
+
+    def test_reingest_only_on_content_change(self):
+        path = self.write_daily_file('1-3-2025.xlsx', [['A1', 1, 0.5, 1], ['A2', 0, 0.25, 'absent']])
+
+        snapshot, state = refresh_daily_snapshot(self.DATE, path)
+        self.assertEqual(state, 'ingested')
+        self.assertEqual(snapshot.as_dict()['presence'], 50)
+        self.assertEqual((snapshot.test_initial, snapshot.test_final, snapshot.improvement), (37, 100, 63))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(refresh_daily_snapshot(self.DATE, path)[1], 'unchanged')
+
+        os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))  # copié, même contenu
+        self.assertEqual(refresh_daily_snapshot(self.DATE, path)[1], 'touched')
+
+        self.write_daily_file('1-3-2025.xlsx', [['B1', 1, 1, 1]], mtime=path.stat().st_mtime + 20)
+        snapshot, state = refresh_daily_snapshot(self.DATE, path)
+        self.assertEqual((state, snapshot.presence, snapshot.row_count), ('ingested', 100, 1))
+        self.assertEqual(list(DailyAttendance.objects.filter(date=self.DATE).values_list('cin', flat=True)), ['B1'])
+        self.assertEqual(DailyStatsSnapshot.objects.count(), 1)
+
+    def test_missing_columns_leave_no_snapshot(self):
+        path = self.data_dir / '1-3-2025.xlsx'
+        path.write_bytes(excel_upload([['CIN', 'Présence'], ['A1', 1]]).read())
+
+        with self.assertRaises(MissingColumnsError) as raised:
+            refresh_daily_snapshot(self.DATE, path)
+        self.assertEqual(raised.exception.columns, ['Test initial', 'Test final'])
+        self.assertFalse(DailyStatsSnapshot.objects.exists())
+
+    def test_one_file_per_date(self):
+        older = self.write_daily_file('1-3-2025.xlsx', [['A1', 0, 0, 0]], mtime=1_700_000_000)
+        newer = self.write_daily_file('01-03-2025.xlsx', [['A1', 1, 1, 1]], mtime=1_700_000_100)
+        self.assertEqual(daily_file_path(self.DATE), newer)
+
+        result = ingest_data_dir()
+        self.assertEqual((result['ingested'], result['duplicates']), ([self.DATE], [older.name]))
+        self.assertEqual(DailyStatsSnapshot.objects.get(date=self.DATE).presence, 100)
+
+    def test_view(self):
+        request = self.factory.get('/', {'day': 1, 'month': 3, 'year': 2025})
+        self.assertEqual(views.hse_stats(request).status_code, 404)
+
+        self.write_daily_file('1-3-2025.xlsx', [['A1', 1, 0.5, 0.75]])
+        data = json.loads(views.hse_stats(request).content)
+        self.assertEqual((data['presence'], data['improvement']), (100, 25))
+
+
+class AttendanceTrendTests(TestCase):
+    """Tendances sur une période: une requête, regroupées par jour, semaine, mois ou année"""
+
+    def setUp(self):
+        rows = {
+            datetime.date(2025, 3, 3): [(1, 0.5, 1), (0, 0.5, None)],  # lundi
+            datetime.date(2025, 3, 5): [(1, 0.25, 0.75)],              # même semaine
+            datetime.date(2025, 3, 12): [(1, 0, 1)],                   # semaine suivante
+            datetime.date(2025, 4, 1): [(0, 1, 1)],
+        }
+        DailyAttendance.objects.bulk_create([
+            DailyAttendance(date=date, line=line, cin=f'C{line}', presence=presence,
+                            test_initial=test_initial, test_final=test_final)
+            for date, values in rows.items()
+            for line, (presence, test_initial, test_final) in enumerate(values, start=2)
+        ])
+
+    def test_buckets(self):
+        start, end = datetime.date(2025, 3, 1), datetime.date(2025, 4, 30)
+        with self.assertNumQueries(1):
+            months = attendance_trend(start, end, 'month')
+        self.assertEqual(
+            [(period['period'], period['participants'], period['days'], period['presence']) for period in months],
+            [('2025-03-01', 4, 3, 75), ('2025-04-01', 1, 1, 0)]
+        )
+        self.assertEqual(months[0]['test_final'], 91)  # cellule vide ignorée: (1 + 0.75 + 1) / 3
+
+        weeks = attendance_trend(start, end, 'week')
+        self.assertEqual([period['period'] for period in weeks], ['2025-03-03', '2025-03-10', '2025-03-31'])
+        self.assertEqual(len(attendance_trend(start, end, 'day')), 4)
+        self.assertEqual(attendance_trend(start, end, 'year')[0]['participants'], 5)
+        self.assertEqual(attendance_trend(start, datetime.date(2025, 3, 4), 'day')[0]['participants'], 2)
+
+    def test_view_validation(self):
+        factory = RequestFactory()
+        responses = {
+            'bucket': views.hse_stats_range(factory.get('/', {'bucket': 'hour'})),
+            'date': views.hse_stats_range(factory.get('/', {'start': '01/03/2025'})),
+            'order': views.hse_stats_range(factory.get('/', {'start': '2025-04-01', 'end': '2025-03-01'})),
+        }
+        self.assertEqual({name: response.status_code for name, response in responses.items()},
+                         {'bucket': 400, 'date': 400, 'order': 400})
+
+        data = json.loads(views.hse_stats_range(
+            factory.get('/', {'start': '2025-03-01', 'end': '2025-03-31', 'bucket': 'week'})
+        ).content)
+        self.assertEqual([period['participants'] for period in data['periods']], [3, 1])
+
+
+class WatchDataDirTests(StatsFilesTestMixin, TestCase):
+    """Surveillance du dossier data: fichiers lus hors requêtes, copies en cours et erreurs non relues"""
+
+    def watch(self, passes, **kwargs):
+        stop_event = threading.Event()
+        results = []
+
+        def on_result(result):
+            results.append(result)
+            if len(results) >= passes:
+                stop_event.set()
+
+        ingested = watch_data_dir(stop_event, interval=0, on_result=on_result, **kwargs)
+        return ingested, results
+
+    def test_passes(self):
+        old = time.time() - 600
+        self.write_daily_file('3-3-2025.xlsx', [['A1', 1, 0.5, 1]], mtime=old)
+        broken = self.data_dir / '4-3-2025.xlsx'
+        broken.write_bytes(excel_upload([['CIN'], ['A1']]).read())
+        os.utime(broken, (old, old))
+        (self.data_dir / 'notes.xlsx').write_bytes(broken.read_bytes())
+        self.write_daily_file('5-3-2025.xlsx', [['A1', 1, 1, 1]])  # copie en cours
+
+        ingested, (first, second) = self.watch(2, settle=60)
+
+        self.assertEqual(ingested, 1)
+        self.assertEqual(first['ingested'], [datetime.date(2025, 3, 3)])
+        self.assertEqual(list(first['errors']), ['4-3-2025.xlsx'])
+        self.assertEqual((first['pending'], first['skipped']), (['5-3-2025.xlsx'], ['notes.xlsx']))
+        # Second passage: fichier lu inchangé, fichier en erreur non relu tant qu'il n'a pas changé
+        self.assertEqual((second['ingested'], second['unchanged'], second['errors']), ([], 1, {}))
+
+        # Copie terminée et fichier corrigé: lus au passage suivant
+        self.write_daily_file('4-3-2025.xlsx', [['A2', 0, 0, 1]], mtime=old + 1)
+        ingested, (result,) = self.watch(1, settle=0)
+        self.assertEqual(sorted(result['ingested']), [datetime.date(2025, 3, 4), datetime.date(2025, 3, 5)])
+        self.assertEqual(DailyStatsSnapshot.objects.count(), 3)
+
+    def test_failed_pass_does_not_stop_the_watcher(self):
+        self.write_daily_file('3-3-2025.xlsx', [['A1', 1, 0.5, 1]], mtime=time.time() - 600)
+        real_ingest = ingest_data_dir
+        calls = []
+
+        def flaky(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise RuntimeError('base indisponible')
+            return real_ingest(*args, **kwargs)
+
+        with mock.patch('stats.daily.ingest_data_dir', side_effect=flaky), \
+                self.assertLogs('stats.daily', 'ERROR'):
+            ingested, results = self.watch(1)
+        self.assertEqual((len(calls), ingested, len(results)), (2, 1, 1))
@@ -0,0 +1,89 @@
+# stats/uploads.py
+"""
+Fichiers Excel envoyés sur /stats/upload_excel/.
+
+La feuille est lue une seule fois, en flux (ExcelRows, en-tête détectée
+au passage; depuis le cache open_excel si ce fichier a déjà été envoyé),
+et chaque ligne est écrite telle quelle en NDJSON dans
+MEDIA_ROOT/stats_uploads/. La réponse ne contient que la première page;
+les pages suivantes sont relues depuis ce fichier (index des positions
+tous les INDEX_STEP lignes, sans reparcourir le début) ou tout le fichier
+est servi en flux NDJSON.
+"""
+import json
+import os
+from datetime import timedelta
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from hse_app.excel_cache import open_excel
+from stats.models import ExcelUpload
+
+INDEX_STEP = 500
+UPLOAD_MAX_AGE = timedelta(days=7)
+
+
+def store_upload(excel_file, header_contains=None):
+    """Lit la feuille en un passage et l'enregistre en NDJSON; retourne l'ExcelUpload"""
+    upload = ExcelUpload(original_name=getattr(excel_file, 'name', '')[:255])
+    name = f'stats_uploads/{upload.id}.ndjson'
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    offsets = []
+    try:
+        with open_excel(excel_file, header_contains=header_contains) as rows, open(path, 'wb') as data_file:
+            for row in rows:
+                if upload.row_count % INDEX_STEP == 0:
+                    offsets.append(data_file.tell())
+                data_file.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n')
+                upload.row_count += 1
+            upload.headers = rows.headers
+            upload.header_line = rows.header_line
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    upload.data_file.name = name
+    upload.page_offsets = offsets
+    upload.save()
+    return upload
+
+
+def read_rows(upload, start, count):
+    """Lignes [start, start + count) du fichier, depuis la position indexée la plus proche"""
+    if start >= upload.row_count or count <= 0:
+        return []
+    block = start // INDEX_STEP
+    with upload.data_file.open('rb') as data_file:
+        data_file.seek(upload.page_offsets[block])
+        # readline: itérer sur un File Django repart du début (chunks)
+        lines = islice(iter(data_file.readline, b''), start - block * INDEX_STEP, start - block * INDEX_STEP + count)
+        return [json.loads(line) for line in lines]
+
+
+def read_page(upload, page, page_size):
+    """Page `page` (à partir de 1) et ses informations de pagination"""
+    total_pages = max(1, -(-upload.row_count // page_size))
+    page = min(max(1, page), total_pages)
+    return read_rows(upload, (page - 1) * page_size, page_size), {
+        'page': page,
+        'page_size': page_size,
+        'total_count': upload.row_count,
+        'total_pages': total_pages,
+        'has_next': page < total_pages,
+        'has_previous': page > 1,
+    }
+
+
+def purge_uploads(max_age=UPLOAD_MAX_AGE):
+    """Supprime les fichiers envoyés il y a plus de `max_age`"""
+    expired = list(ExcelUpload.objects.filter(created_at__lt=timezone.now() - max_age))
+    for upload in expired:
+        upload.data_file.delete(save=False)
+    ExcelUpload.objects.filter(id__in=[upload.id for upload in expired]).delete()
+    return len(expired)
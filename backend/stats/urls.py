@@ -6,7 +6,10 @@ urlpatterns = [
     path('hse/api/', views.HSEApiView.as_view(), name='hse_api'),
    
     path('upload_excel/', views.upload_excel, name='upload_excel'),
+    path('upload_excel/<uuid:upload_id>/rows/', views.upload_excel_rows, name='upload_excel_rows'),
+    path('upload_excel/<uuid:upload_id>/ndjson/', views.upload_excel_ndjson, name='upload_excel_ndjson'),
     path('hse/stats/', views.hse_stats, name='hse_stats'),  # ← AJOUT ICI
+    path('hse/stats/range/', views.hse_stats_range, name='hse_stats_range'),
     path('hse/questionnaires/', views.gestion_questionnaires, name='gestion_questionnaires'),
     path('hse/certificats/', views.generation_certificats, name='generation_certificats'),
 ]
@@ -1,12 +1,17 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
 import json
-import pandas as pd
 import datetime
-import os
+
+from hse_app.excel_cache import purge_excel_cache
+from hse_app.excel_reader import ExcelFormatError
+from stats.models import ExcelUpload
+from stats.daily import daily_file_path, get_daily_snapshot, attendance_trend, MissingColumnsError, TREND_BUCKETS
+from stats.uploads import store_upload, read_page, purge_uploads
 
 
 # ------------------------------
@@ -63,6 +68,8 @@ def hse_stats(request):
     """
     Retourne les statistiques HSE sous forme JSON
     pour le frontend React.
+    Servies depuis le snapshot du jour (DailyStatsSnapshot): le fichier
+    Excel n'est relu que s'il a changé.
     """
 
     # 1️⃣ Lire la date passée dans l'URL
@@ -77,29 +84,60 @@ def hse_stats(request):
         month = today.month
         year = today.year
 
+    try:
+        date = datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return JsonResponse({"error": "Date invalide"}, status=400)
+
     # 3️⃣ Construire le chemin du fichier Excel
-    file_path = f"backend/data/{day}-{month}-{year}.xlsx"
+    file_path = daily_file_path(date)
+
+    # 4️⃣ Snapshot du jour (fichier relu en flux seulement s'il a changé)
+    try:
+        snapshot = get_daily_snapshot(date, file_path)
+    except MissingColumnsError as e:
+        return JsonResponse({
+            "error": "Colonnes manquantes",
+            "missing_columns": e.columns
+        }, status=400)
+    except ExcelFormatError as e:
+        return JsonResponse({"error": str(e), "file_searched": str(file_path)}, status=400)
 
-    if not os.path.exists(file_path):
+    if snapshot is None:
         return JsonResponse({
             "error": "Fichier du jour introuvable",
-            "file_searched": file_path
+            "file_searched": str(file_path)
         }, status=404)
 
-    # 4️⃣ Charger Excel
-    df = pd.read_excel(file_path)
+    # 5️⃣ Retour JSON parfait pour React
+    return JsonResponse(snapshot.as_dict())
 
-    # 5️⃣ Exemple de calculs
-    presence = int(df["Présence"].mean() * 100)
-    test_initial = int(df["Test initial"].mean() * 100)
-    test_final = int(df["Test final"].mean() * 100)
 
-    # 6️⃣ Retour JSON parfait pour React
+def hse_stats_range(request):
+    """
+    Tendances HSE sur une période: présence, test initial / final et
+    progression par jour, semaine, mois ou année.
+    ?start=2025-01-01&end=2025-12-31&bucket=month (année en cours par défaut)
+    Agrégées en SQL sur les fichiers du jour déjà lus (DailyAttendance).
+    """
+    bucket = request.GET.get("bucket", "month")
+    if bucket not in TREND_BUCKETS:
+        return JsonResponse({"error": f"bucket doit valoir {', '.join(TREND_BUCKETS)}"}, status=400)
+
+    try:
+        end = datetime.date.fromisoformat(request.GET["end"]) if request.GET.get("end") else datetime.date.today()
+        start = datetime.date.fromisoformat(request.GET["start"]) if request.GET.get("start") else end.replace(month=1, day=1)
+    except ValueError:
+        return JsonResponse({"error": "Dates invalides (format AAAA-MM-JJ)"}, status=400)
+
+    if start > end:
+        return JsonResponse({"error": "start doit précéder end"}, status=400)
+
     return JsonResponse({
-        "presence": presence,
-        "test_initial": test_initial,
-        "test_final": test_final,
-        "improvement": test_final - test_initial
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "periods": attendance_trend(start, end, bucket)
     })
 
 
@@ -115,12 +153,30 @@ def generation_certificats(request):
 
 
 
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
-import pandas as pd
+UPLOAD_PAGE_SIZE = 100
+
+
+def _upload_response(upload, page=1, page_size=UPLOAD_PAGE_SIZE):
+    data, pagination = read_page(upload, page, page_size)
+    return {
+        "success": True,
+        "upload_id": str(upload.id),
+        "file": upload.original_name,
+        "headers": upload.headers,
+        "data": data,
+        "pagination": pagination,
+        "rows_url": reverse('upload_excel_rows', args=[upload.id]),
+        "ndjson_url": reverse('upload_excel_ndjson', args=[upload.id]),
+    }
+
 
 @csrf_exempt
 def upload_excel(request):
+    """
+    Lit la feuille une seule fois (en-tête = ligne contenant "Entité"), la
+    garde côté serveur sous un upload_id et renvoie la première page.
+    Pages suivantes: rows_url (?page=&page_size=); tout le fichier: ndjson_url.
+    """
     if request.method == "POST":
         excel_file = request.FILES.get("file")
 
@@ -128,35 +184,42 @@ def upload_excel(request):
             return JsonResponse({"success": False, "error": "Aucun fichier reçu"})
 
         try:
-            # Lire sans header
-            df_raw = pd.read_excel(excel_file, header=None)
+            purge_uploads()
+            purge_excel_cache()
+            upload = store_upload(excel_file, header_contains="Entité")
+            return JsonResponse(_upload_response(upload))
+
+        except ExcelFormatError as e:
+            return JsonResponse({"success": False, "error": str(e)})
 
-            # Trouver la ligne contenant "Entité" (l'en-tête réelle)
-            header_row = None
-            for i, row in df_raw.iterrows():
-                if row.astype(str).str.contains("Entité").any():
-                    header_row = i
-                    break
+        except Exception as e:
+            print("🔥 ERREUR DJANGO :", e)
+            return JsonResponse({"success": False, "error": str(e)})
 
-            if header_row is None:
-                return JsonResponse({"success": False, "error": "Impossible de trouver l'en-tête dans ce fichier."})
+    return JsonResponse({"success": False, "error": "Méthode non autorisée"})
 
-            # Recharger le fichier en utilisant la ligne trouvée comme header
-            df = pd.read_excel(excel_file, header=header_row)
 
-            # Supprimer colonnes 'Unnamed'
-            df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
+def upload_excel_rows(request, upload_id):
+    """Une page des lignes d'un fichier envoyé"""
+    try:
+        upload = ExcelUpload.objects.get(id=upload_id)
+    except ExcelUpload.DoesNotExist:
+        return JsonResponse({"success": False, "error": "Fichier introuvable ou expiré"}, status=404)
 
-            # Supprimer lignes vides
-            df = df.dropna(how="all")
+    try:
+        page = int(request.GET.get("page", 1))
+        page_size = min(max(1, int(request.GET.get("page_size", UPLOAD_PAGE_SIZE))), 1000)
+    except ValueError:
+        return JsonResponse({"success": False, "error": "Pagination invalide"}, status=400)
 
-            # Reset index
-            df = df.reset_index(drop=True)
+    return JsonResponse(_upload_response(upload, page, page_size))
 
-            return JsonResponse({"success": True, "data": df.to_dict(orient="records")})
 
-        except Exception as e:
-            print("🔥 ERREUR DJANGO :", e)
-            return JsonResponse({"success": False, "error": str(e)})
+def upload_excel_ndjson(request, upload_id):
+    """Toutes les lignes d'un fichier envoyé, en flux NDJSON (une ligne JSON par ligne Excel)"""
+    try:
+        upload = ExcelUpload.objects.get(id=upload_id)
+    except ExcelUpload.DoesNotExist:
+        return JsonResponse({"success": False, "error": "Fichier introuvable ou expiré"}, status=404)
 
-    return JsonResponse({"success": False, "error": "Méthode non autorisée"})
+    return FileResponse(upload.data_file.open('rb'), content_type='application/x-ndjson')
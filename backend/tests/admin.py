@@ -1,3 +1,65 @@
 from django.contrib import admin
+from .models import Test, Question, QuestionStats
+from .rescoring import rescore_tests
 
-# Register your models here.
+
+def _report_rescoring(modeladmin, request, result):
+    modeladmin.message_user(
+        request,
+        f"{result['rescored']} tentative(s) recalculée(s), "
+        f"{len(result['changed'])} changement(s) de réussite, "
+        f"{result['certificates_issued']} certificat(s) émis, "
+        f"{result['certificates_revoked']} retiré(s)."
+    )
+    for change in result['changed'][:20]:
+        old = 'réussi' if change['old_passed'] else 'échoué'
+        new = 'réussi' if change['new_passed'] else 'échoué'
+        modeladmin.message_user(
+            request,
+            f"Tentative #{change['attempt_id']} (V{change['test_version']}): {old} → {new}"
+        )
+
+
+@admin.register(Test)
+class TestAdmin(admin.ModelAdmin):
+    """Interface d'administration pour les versions de test"""
+    list_display = ('version', 'description', 'total_questions', 'mandatory_questions_count', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    actions = ['rescore_attempts']
+
+    def rescore_attempts(self, request, queryset):
+        """Recalculer les tentatives des versions sélectionnées"""
+        _report_rescoring(self, request, rescore_tests(queryset))
+    rescore_attempts.short_description = "Recalculer les scores des tentatives"
+
+
+@admin.register(Question)
+class QuestionAdmin(admin.ModelAdmin):
+    """Interface d'administration pour les questions"""
+    list_display = ('question_code', 'enonce_fr', 'reponse_correcte', 'is_mandatory', 'points', 'is_active')
+    list_filter = ('is_active', 'is_mandatory', 'reponse_correcte')
+    search_fields = ('question_code', 'enonce_fr')
+    actions = ['rescore_attempts']
+
+    def rescore_attempts(self, request, queryset):
+        """Recalculer les tentatives des versions contenant ces questions"""
+        question_ids = set(queryset.values_list('id', flat=True))
+        tests = [
+            test for test in Test.objects.all()
+            if question_ids & {int(qid) for qid in (test.ordre_questions or []) + (test.mandatory_questions or [])}
+        ]
+        _report_rescoring(self, request, rescore_tests(tests))
+    rescore_attempts.short_description = "Recalculer les tentatives des versions concernées"
+
+
+
+@admin.register(QuestionStats)
+class QuestionStatsAdmin(admin.ModelAdmin):
+    """Statistiques par question (lecture seule, tenues à jour à chaque soumission)"""
+    list_display = ('test', 'question', 'langue', 'is_mandatory', 'seen_count', 'answered_count', 'correct_count', 'miss_rate')
+    list_filter = ('test', 'langue', 'is_mandatory')
+    list_select_related = ('test', 'question')
+    readonly_fields = ('test', 'question', 'langue', 'is_mandatory', 'seen_count', 'answered_count', 'correct_count')
+
+    def has_add_permission(self, request):
+        return False
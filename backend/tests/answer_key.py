@@ -0,0 +1,198 @@
+# tests/answer_key.py
+"""
+Corrigé compilé par version de test.
+
+Le corrigé (ids des questions, réponses correctes, questions obligatoires,
+points) est construit une seule fois par version puis gardé en mémoire
+dans le processus et dans le cache Django. La clé de cache contient la
+version, le `updated_at` du test, le numéro de génération et la version en
+base des questions (tests/cache_utils.py): une requête agrégée par
+notation, qui suffit à voir une question modifiée dans un autre processus.
+
+Les deux chemins de notation (hse_app.views.submit_hse_test_answers et
+TestAttempt.calculate_scores) notent une tentative sans aucune requête
+par question. Comme avant le corrigé compilé, une réponse à une question
+existante hors de la version compte comme facultative (une requête de
+plus, seulement dans ce cas).
+"""
+import threading
+
+from django.core.cache import cache
+
+from .models import Question, normalize_answer
+from .cache_utils import current_generation, questions_stamp, test_question_ids
+
+CACHE_PREFIX = 'tests:answer_key'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_local_keys = {}
+_local_lock = threading.Lock()
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AnswerKey:
+    """Corrigé figé d'une version de test"""
+
+    def __init__(self, test_id, version, total_questions, question_ids,
+                 correct_answers, mandatory_ids, points):
+        self.test_id = test_id
+        self.version = version
+        self.total_questions = total_questions
+        # Ids dans l'ordre du test (ordre_questions)
+        self.question_ids = tuple(question_ids)
+        # {question_id: bool}
+        self.correct_answers = correct_answers
+        # Ids déclarés obligatoires par la version (Test.mandatory_questions)
+        self.mandatory_ids = frozenset(mandatory_ids)
+        # {question_id: points}
+        self.points = points
+
+    def __contains__(self, question_id):
+        return question_id in self.correct_answers
+
+    @property
+    def mandatory_total(self):
+        return len(self.mandatory_ids)
+
+    @property
+    def optional_total(self):
+        return self.total_questions - self.mandatory_total
+
+    def is_correct(self, question_id, user_answer):
+        """Vérifie une réponse sans toucher à la base"""
+        user_bool = normalize_answer(user_answer)
+        if user_bool is None:
+            return False
+        return user_bool == self.correct_answers[question_id]
+
+    def outcomes(self, user_answers):
+        """
+        Classe les questions de la version selon la réponse donnée.
+        Retourne (ids corrects, ids faux, ids sans réponse).
+        """
+        given = {}
+        for question_id_str, user_answer in (user_answers or {}).items():
+            question_id = _to_int(question_id_str)
+            if question_id in self.correct_answers:
+                given[question_id] = normalize_answer(user_answer)
+
+        correct_ids, wrong_ids, unanswered_ids = [], [], []
+        for question_id, expected in self.correct_answers.items():
+            user_bool = given.get(question_id)
+            if user_bool is None:
+                unanswered_ids.append(question_id)
+            elif user_bool == expected:
+                correct_ids.append(question_id)
+            else:
+                wrong_ids.append(question_id)
+
+        return correct_ids, wrong_ids, unanswered_ids
+
+    def extra_answers(self, question_ids):
+        """
+        Réponses correctes des questions hors version parmi `question_ids`,
+        lues en une requête ({} sans appel à la base si toutes en font partie)
+        """
+        extra_ids = {qid for qid in question_ids if qid is not None and qid not in self.correct_answers}
+        if not extra_ids:
+            return {}
+        return dict(Question.objects.filter(id__in=extra_ids).values_list('id', 'reponse_correcte'))
+
+    def score(self, user_answers):
+        """
+        Note un dictionnaire de réponses {question_id: réponse}.
+        Une question existante hors de cette version compte comme
+        facultative; une question inexistante est ignorée.
+        """
+        given = [
+            (_to_int(question_id_str), user_answer)
+            for question_id_str, user_answer in (user_answers or {}).items()
+        ]
+        extra = self.extra_answers(question_id for question_id, _user_answer in given)
+
+        mandatory_correct = 0
+        optional_correct = 0
+
+        for question_id, user_answer in given:
+            expected = self.correct_answers.get(question_id, extra.get(question_id))
+            if expected is None:
+                continue
+
+            user_bool = normalize_answer(user_answer)
+            if user_bool is None or user_bool != expected:
+                continue
+
+            if question_id in self.mandatory_ids:
+                mandatory_correct += 1
+            else:
+                optional_correct += 1
+
+        return {
+            'mandatory_correct': mandatory_correct,
+            'optional_correct': optional_correct,
+            'total_correct': mandatory_correct + optional_correct,
+            'passed': mandatory_correct == self.mandatory_total,
+        }
+
+
+def compile_answer_key(test):
+    """Construit le corrigé d'un test en une seule requête"""
+    mandatory_ids = [qid for qid in map(_to_int, test.mandatory_questions or []) if qid is not None]
+    ordered_ids = [qid for qid in map(_to_int, test.ordre_questions or []) if qid is not None]
+
+    rows = Question.objects.filter(id__in=test_question_ids(test)).values_list('id', 'reponse_correcte', 'points')
+
+    correct_answers = {}
+    points = {}
+    for question_id, reponse_correcte, question_points in rows:
+        correct_answers[question_id] = reponse_correcte
+        points[question_id] = question_points
+
+    return AnswerKey(
+        test_id=test.id,
+        version=test.version,
+        total_questions=test.total_questions,
+        question_ids=[qid for qid in ordered_ids if qid in correct_answers],
+        correct_answers=correct_answers,
+        mandatory_ids=mandatory_ids,
+        points=points,
+    )
+
+
+def _cache_key(test, generation, stamp):
+    updated_at = test.updated_at.timestamp() if test.updated_at else 0
+    return f'{CACHE_PREFIX}:v{test.version}:{updated_at}:{generation}:{stamp}'
+
+
+def get_answer_key(test):
+    """Retourne le corrigé compilé du test (mémoire → cache Django → base)"""
+    key = _cache_key(test, current_generation(), questions_stamp(test))
+
+    answer_key = _local_keys.get(key)
+    if answer_key is not None:
+        return answer_key
+
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = compile_answer_key(test)
+        cache.set(key, answer_key, CACHE_TIMEOUT)
+
+    with _local_lock:
+        # Une seule entrée par version: les anciennes générations sont jetées
+        for stale in [k for k in _local_keys if k.startswith(f'{CACHE_PREFIX}:v{test.version}:')]:
+            del _local_keys[stale]
+        _local_keys[key] = answer_key
+
+    return answer_key
+
+
+def invalidate_answer_keys():
+    """Invalide tous les corrigés compilés (appelé à la sauvegarde d'une Question ou d'un Test)"""
+    with _local_lock:
+        _local_keys.clear()
@@ -4,3 +4,6 @@ class TestsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tests'
     verbose_name = "Tests"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,63 @@
+# tests/cache_utils.py
+"""
+Clés des caches dérivés des questions (corrigés compilés, paquets de
+questions).
+
+Le cache par défaut (LocMemCache, aucun CACHES configuré) est propre à
+chaque processus: le numéro de génération, incrémenté à chaque sauvegarde
+d'une Question ou d'un Test, n'invalide que les entrées du processus qui a
+sauvegardé. Les clés contiennent donc aussi `questions_stamp`, lu en base
+(dernière modification et nombre des questions du test): une question
+corrigée dans un autre processus change la clé partout, sans attendre
+l'expiration du cache.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import Question
+
+GENERATION_KEY = 'tests:generation'
+
+
+def current_generation():
+    return cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+
+
+def bump_generation():
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Clé absente (cache vidé): repartir sur une valeur jamais utilisée
+        cache.set(GENERATION_KEY, 2, timeout=None)
+        return 2
+
+
+def test_question_ids(test):
+    """Ids des questions du test (ordre et obligatoires), valeurs illisibles écartées"""
+    question_ids = set()
+    for question_id in list(test.ordre_questions or []) + list(test.mandatory_questions or []):
+        try:
+            question_ids.add(int(question_id))
+        except (TypeError, ValueError):
+            continue
+    return question_ids
+
+
+def questions_stamp(test):
+    """
+    Version en base des questions du test: une requête agrégée sur les clés
+    primaires (dernière modification, nombre de questions). Gardée sur
+    l'instance `test`, rechargée à chaque requête: une seule lecture même
+    si le corrigé et les questions sont demandés plusieurs fois.
+    """
+    stamp = getattr(test, '_questions_stamp', None)
+    if stamp is not None:
+        return stamp
+
+    versions = Question.objects.filter(id__in=test_question_ids(test)).aggregate(
+        last_modified=Max('updated_at'),
+        count=Count('id'),
+    )
+    last_modified = versions['last_modified'].timestamp() if versions['last_modified'] else 0
+    test._questions_stamp = stamp = f"{last_modified}-{versions['count']}"
+    return stamp
@@ -0,0 +1,37 @@
+# tests/functions.py
+"""
+Fonctions SQL JSON utilisées sur TestAttempt.user_answers.
+
+Elles permettent de modifier ou de mesurer le JSON des réponses directement
+en base (UPDATE ... SET user_answers = JSON_MERGE_PATCH(user_answers, ...)),
+sans lecture-modification-écriture côté Python. MySQL/MariaDB en production,
+SQLite (extension JSON1) en développement.
+"""
+from django.db.models import Func, IntegerField, JSONField
+
+
+class JSONMergePatch(Func):
+    """
+    Fusion RFC 7396 d'un objet JSON avec un patch: les clés du patch
+    remplacent celles de l'objet, une valeur null supprime la clé.
+    """
+    function = 'JSON_MERGE_PATCH'
+    arity = 2
+    output_field = JSONField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='json_patch', **extra_context)
+
+
+class JSONObjectLength(Func):
+    """Nombre de clés d'un objet JSON"""
+    function = 'JSON_LENGTH'
+    arity = 1
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='(SELECT COUNT(*) FROM json_each(%(expressions)s))',
+            **extra_context
+        )
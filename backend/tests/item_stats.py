@@ -0,0 +1,199 @@
+# tests/item_stats.py
+"""
+Analyse des questions (item analysis) tenue à jour en continu.
+
+Chaque soumission incrémente, par (version, question, langue), les
+compteurs de QuestionStats par un seul UPDATE ... SET x = x + 1 (F(),
+CASE selon le résultat de chaque question): deux requêtes par
+soumission, quel que soit le nombre de questions. La lecture des statistiques est une simple
+lecture de table, sans parcourir l'historique des tentatives.
+
+`rebuild_test_stats` reconstruit les compteurs depuis les tentatives
+terminées (commande `rebuild_question_stats`), par exemple après un
+recalcul des scores ou une correction du corrigé, sans interrompre les
+soumissions (lignes verrouillées, puis réécrites une à une).
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from .models import Test, TestAttempt, QuestionStats
+from .answer_key import get_answer_key, compile_answer_key
+from .rescoring import answer_matrices, DEFAULT_CHUNK_SIZE
+
+LANGUES = [code for code, _label in TestAttempt._meta.get_field('langue').choices]
+
+
+def _ensure_rows(answer_key, langue):
+    """Crée les lignes de compteurs manquantes (une requête)"""
+    QuestionStats.objects.bulk_create(
+        [
+            QuestionStats(
+                test_id=answer_key.test_id,
+                question_id=question_id,
+                langue=langue,
+                is_mandatory=question_id in answer_key.mandatory_ids,
+            )
+            for question_id in answer_key.correct_answers
+        ],
+        ignore_conflicts=True
+    )
+
+
+def record_attempt_stats(attempt, answer_key=None):
+    """
+    Reporte une tentative notée dans les compteurs de ses questions.
+    À appeler une seule fois par tentative, dans la transaction de notation.
+    """
+    if answer_key is None:
+        answer_key = get_answer_key(attempt.test)
+    if not answer_key.correct_answers:
+        return
+
+    correct_ids, wrong_ids, unanswered_ids = answer_key.outcomes(attempt.user_answers)
+    answered_ids = correct_ids + wrong_ids
+
+    _ensure_rows(answer_key, attempt.langue)
+
+    # Une seule requête pour toutes les questions: les lignes sont
+    # verrouillées en un passage, dans l'ordre de l'index, quelle que soit
+    # la soumission (deux UPDATE séparés peuvent s'interbloquer)
+    counters = {'seen_count': F('seen_count') + 1}
+    if answered_ids:
+        counters['answered_count'] = Case(
+            When(question_id__in=answered_ids, then=F('answered_count') + 1),
+            default=F('answered_count')
+        )
+    if correct_ids:
+        counters['correct_count'] = Case(
+            When(question_id__in=correct_ids, then=F('correct_count') + 1),
+            default=F('correct_count')
+        )
+
+    QuestionStats.objects.filter(
+        test_id=answer_key.test_id,
+        langue=attempt.langue,
+        question_id__in=answered_ids + unanswered_ids
+    ).update(**counters)
+
+
+def _aggregate_attempts(test, question_ids, expected, chunk_size):
+    """
+    Totaux par langue des tentatives terminées: {langue: [vues, répondues
+    (vecteur par question), correctes (vecteur)]}, et nombre de tentatives.
+    """
+    totals = {}
+    counted = 0
+    last_id = 0
+
+    attempts_qs = TestAttempt.objects.filter(
+        test=test,
+        completed_at__isnull=False
+    ).only('id', 'langue', 'user_answers').order_by('id')
+
+    while question_ids:
+        attempts = list(attempts_qs.filter(id__gt=last_id)[:chunk_size])
+        if not attempts:
+            break
+        last_id = attempts[-1].id
+
+        answered, given = answer_matrices(attempts, question_ids)
+        correct = answered & (given == expected)
+        langues = np.array([attempt.langue for attempt in attempts])
+
+        for langue in set(langues.tolist()):
+            mask = langues == langue
+            seen, answered_sum, correct_sum = totals.setdefault(
+                langue,
+                [0, np.zeros(len(question_ids), dtype=np.int64), np.zeros(len(question_ids), dtype=np.int64)]
+            )
+            totals[langue] = [
+                seen + int(mask.sum()),
+                answered_sum + answered[mask].sum(axis=0),
+                correct_sum + correct[mask].sum(axis=0),
+            ]
+
+        counted += len(attempts)
+
+    return totals, counted
+
+
+def rebuild_test_stats(test, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reconstruit les compteurs d'une version depuis ses tentatives terminées.
+    Retourne le nombre de tentatives prises en compte.
+
+    Sans course avec les incréments des soumissions: les lignes de
+    compteurs sont créées (toutes langues) puis verrouillées
+    (select_for_update) avant la lecture des tentatives. Une notation en
+    cours attend le verrou et incrémente après la reconstruction (elle
+    n'est pas encore lue); une notation validée avant est lue. Chaque
+    ligne est réécrite par UPDATE (bulk_update), sans DELETE de la table;
+    seules les lignes sans objet (question retirée, langue jamais passée)
+    sont supprimées.
+    """
+    answer_key = compile_answer_key(test)
+    question_ids = sorted(answer_key.correct_answers)
+    columns = {question_id: column for column, question_id in enumerate(question_ids)}
+    expected = np.array([answer_key.correct_answers[qid] for qid in question_ids], dtype=bool)
+
+    with transaction.atomic():
+        for langue in LANGUES:
+            _ensure_rows(answer_key, langue)
+        rows = list(QuestionStats.objects.select_for_update().filter(test=test))
+
+        # Tentatives lues après le verrou (première lecture non verrouillante de la transaction)
+        totals, counted = _aggregate_attempts(test, question_ids, expected, chunk_size)
+
+        updated = []
+        stale_ids = []
+        for row in rows:
+            column = columns.get(row.question_id)
+            if column is None or row.langue not in totals:
+                stale_ids.append(row.id)
+                continue
+            seen, answered_sum, correct_sum = totals[row.langue]
+            row.is_mandatory = row.question_id in answer_key.mandatory_ids
+            row.seen_count = seen
+            row.answered_count = int(answered_sum[column])
+            row.correct_count = int(correct_sum[column])
+            updated.append(row)
+
+        QuestionStats.objects.bulk_update(
+            updated, ['is_mandatory', 'seen_count', 'answered_count', 'correct_count'], batch_size=chunk_size
+        )
+        if stale_ids:
+            QuestionStats.objects.filter(id__in=stale_ids).delete()
+
+    return counted
+
+
+def rebuild_stats(tests=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Reconstruit les compteurs de plusieurs versions (toutes par défaut)"""
+    if tests is None:
+        tests = Test.objects.all()
+    return {test.version: rebuild_test_stats(test, chunk_size=chunk_size) for test in tests}
+
+
+def question_stats_payload(test, langue=None):
+    """Statistiques des questions d'une version, prêtes pour l'API"""
+    rows = QuestionStats.objects.filter(test=test).select_related('question')
+    if langue:
+        rows = rows.filter(langue=langue)
+
+    return [
+        {
+            'question_id': row.question_id,
+            'question_code': row.question.question_code,
+            'langue': row.langue,
+            'is_mandatory': row.is_mandatory,
+            'seen': row.seen_count,
+            'answered': row.answered_count,
+            'correct': row.correct_count,
+            'wrong': row.wrong_count,
+            'unanswered': row.unanswered_count,
+            'success_rate': row.success_rate,
+            'miss_rate': row.miss_rate,
+        }
+        for row in rows
+    ]
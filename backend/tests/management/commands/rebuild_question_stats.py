@@ -0,0 +1,36 @@
+# tests/management/commands/rebuild_question_stats.py
+from django.core.management.base import BaseCommand, CommandError
+
+from tests.models import Test
+from tests.item_stats import rebuild_stats
+from tests.rescoring import DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les statistiques par question depuis l'historique des tentatives"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--test-version', type=int, action='append', dest='versions',
+            help="Version du test à reconstruire (répétable). Par défaut: toutes."
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help="Nombre de tentatives chargées par paquet"
+        )
+
+    def handle(self, *args, **options):
+        tests = Test.objects.all().order_by('version')
+        if options['versions']:
+            tests = tests.filter(version__in=options['versions'])
+            if not tests.exists():
+                raise CommandError(f"Aucun test pour les versions {options['versions']}")
+
+        counted = rebuild_stats(tests, chunk_size=options['chunk_size'])
+
+        for version, attempts in counted.items():
+            self.stdout.write(f"Version {version}: {attempts} tentative(s) prise(s) en compte")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques reconstruites pour {len(counted)} version(s)"
+        ))
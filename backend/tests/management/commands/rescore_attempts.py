@@ -0,0 +1,66 @@
+# tests/management/commands/rescore_attempts.py
+from django.core.management.base import BaseCommand, CommandError
+
+from tests.models import Test
+from tests.rescoring import rescore_tests, DEFAULT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = ("Recalcule les scores des tentatives après une correction du corrigé "
+            "(certificats, utilisateurs HSE et statistiques des questions compris)")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--test-version', type=int, action='append', dest='versions',
+            help="Version du test à recalculer (répétable). Par défaut: toutes."
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help="Nombre de tentatives chargées et notées par paquet"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Calculer le diff sans rien écrire en base"
+        )
+
+    def handle(self, *args, **options):
+        tests = Test.objects.all().order_by('version')
+        if options['versions']:
+            tests = tests.filter(version__in=options['versions'])
+            if not tests.exists():
+                raise CommandError(f"Aucun test pour les versions {options['versions']}")
+
+        result = rescore_tests(
+            tests,
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run']
+        )
+
+        for version_result in result['by_version']:
+            self.stdout.write(
+                f"Version {version_result['version']}: "
+                f"{version_result['rescored']} tentative(s) recalculée(s), "
+                f"{version_result['changed']} changement(s) de réussite"
+            )
+
+        for change in result['changed']:
+            old = 'réussi' if change['old_passed'] else 'échoué'
+            new = 'réussi' if change['new_passed'] else 'échoué'
+            self.stdout.write(
+                f"  tentative #{change['attempt_id']} (V{change['test_version']}, "
+                f"utilisateur #{change['user_id']}): {old} → {new} "
+                f"({change['overall_score_percentage']}%)"
+            )
+
+        prefix = "[dry-run] " if result['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result['rescored']} tentative(s) recalculée(s), "
+            f"{len(result['changed'])} changement(s) de réussite"
+        ))
+        if not result['dry_run']:
+            self.stdout.write(
+                f"{result['certificates_issued']} certificat(s) émis, "
+                f"{result['certificates_revoked']} retiré(s), "
+                f"{result['hse_users_synced']} utilisateur(s) HSE mis à jour, "
+                f"statistiques des questions reconstruites"
+            )
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('langue', models.CharField(choices=[('ar', 'Arabe'), ('fr', 'Français'), ('en', 'Anglais')], max_length=2, verbose_name='Langue du test')),
+                ('is_mandatory', models.BooleanField(default=False, verbose_name='Question obligatoire')),
+                ('seen_count', models.IntegerField(default=0, verbose_name='Tentatives soumises')),
+                ('answered_count', models.IntegerField(default=0, verbose_name='Réponses données')),
+                ('correct_count', models.IntegerField(default=0, verbose_name='Réponses correctes')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='tests.question')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_stats', to='tests.test')),
+            ],
+            options={
+                'verbose_name': 'Statistiques de question',
+                'verbose_name_plural': 'Statistiques de questions',
+                'ordering': ['test', 'langue', 'question'],
+                'indexes': [models.Index(fields=['test', 'langue'], name='tests_quest_test_id_24b52e_idx')],
+                'unique_together': {('test', 'question', 'langue')},
+            },
+        ),
+    ]
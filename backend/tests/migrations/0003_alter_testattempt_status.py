@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0002_questionstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testattempt',
+            name='status',
+            field=models.CharField(choices=[('in_progress', 'En cours'), ('submitted', 'Soumis (correction en cours)'), ('passed', 'Réussi'), ('failed', 'Échoué')], default='in_progress', max_length=20, verbose_name='Statut'),
+        ),
+    ]
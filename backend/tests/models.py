@@ -4,6 +4,44 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
 
 # Create your models here.
+
+TRUE_ANSWERS = ['true', 'vrai', '1', 'yes', 'oui', 't']
+FALSE_ANSWERS = ['false', 'faux', '0', 'no', 'non', 'f']
+
+
+def normalize_answer(user_answer):
+    """
+    Convertit une réponse brute (bool, "true"/"false", 0/1, ou
+    {'answer': ...}) en booléen. Retourne None si la réponse est vide
+    ou illisible.
+    """
+    # Format détaillé: {'answer': bool, 'is_mandatory': bool}
+    if isinstance(user_answer, dict):
+        user_answer = user_answer.get('answer')
+    
+    if user_answer is None:
+        return None
+    
+    # user_answer sera maintenant un booléen direct (True/False)
+    # provenant des boutons cliqués
+    if isinstance(user_answer, bool):
+        return user_answer
+    
+    # Si c'est une chaîne "true"/"false" (venant du frontend)
+    if isinstance(user_answer, str):
+        user_answer = user_answer.lower().strip()
+        if user_answer in TRUE_ANSWERS:
+            return True
+        if user_answer in FALSE_ANSWERS:
+            return False
+        return None
+    
+    # Si c'est un entier (0/1)
+    if isinstance(user_answer, int):
+        return bool(user_answer)
+    
+    return None
+
    
 class Test(models.Model):
     """Test HSE avec questions et paramètres"""
@@ -117,37 +155,27 @@ class Test(models.Model):
         return ordered_questions
     
     def get_mandatory_questions(self):
-        """Récupère les questions obligatoires"""
+        """Récupère les questions obligatoires (une seule requête, ordre conservé)"""
         if not self.mandatory_questions:
             return Question.objects.none()
         
-        mandatory_questions_list = []
-        for qid in self.mandatory_questions:
-            try:
-                question = Question.objects.get(id=qid)
-                mandatory_questions_list.append(question)
-            except Question.DoesNotExist:
-                continue
-        
-        return mandatory_questions_list
+        return self._questions_by_ids(self.mandatory_questions)
     
     def get_optional_questions(self):
-        """Récupère les questions optionnelles"""
+        """Récupère les questions optionnelles (une seule requête, ordre conservé)"""
         if not self.ordre_questions:
             return Question.objects.none()
         
         mandatory_ids = set(self.mandatory_questions)
         optional_ids = [qid for qid in self.ordre_questions if qid not in mandatory_ids]
         
-        optional_questions_list = []
-        for qid in optional_ids:
-            try:
-                question = Question.objects.get(id=qid)
-                optional_questions_list.append(question)
-            except Question.DoesNotExist:
-                continue
-        
-        return optional_questions_list
+        return self._questions_by_ids(optional_ids)
+    
+    @staticmethod
+    def _questions_by_ids(question_ids):
+        """Questions dans l'ordre des ids donnés (ids inconnus ignorés)"""
+        questions = Question.objects.in_bulk(question_ids)
+        return [questions[qid] for qid in question_ids if qid in questions]
 
 
 class Question(models.Model):
@@ -225,33 +253,10 @@ class Question(models.Model):
 
     def check_answer(self, user_answer):
         """Vérifie si la réponse de l'utilisateur est correcte"""
-        if user_answer is None:
+        user_bool = normalize_answer(user_answer)
+        if user_bool is None:
             return False
-        
-        # user_answer sera maintenant un booléen direct (True/False)
-        # provenant des boutons cliqués
-        
-        # Si c'est déjà un booléen, utiliser directement
-        if isinstance(user_answer, bool):
-            return user_answer == self.reponse_correcte
-        
-        # Si c'est une chaîne "true"/"false" (venant du frontend)
-        if isinstance(user_answer, str):
-            user_answer = user_answer.lower().strip()
-            if user_answer in ['true', 'vrai', '1', 'yes', 'oui', 't']:
-                user_bool = True
-            elif user_answer in ['false', 'faux', '0', 'no', 'non', 'f']:
-                user_bool = False
-            else:
-                return False
-            return user_bool == self.reponse_correcte
-        
-        # Si c'est un entier (0/1)
-        if isinstance(user_answer, int):
-            user_bool = bool(user_answer)
-            return user_bool == self.reponse_correcte
-        
-        return False
+        return user_bool == self.reponse_correcte
     
     @property
     def reponse_correcte_display(self):
@@ -269,6 +274,7 @@ class TestAttempt(models.Model):
     
     STATUS_CHOICES = [
         ('in_progress', 'En cours'),
+        ('submitted', 'Soumis (correction en cours)'),
         ('passed', 'Réussi'),
         ('failed', 'Échoué'),
     ]
@@ -391,34 +397,11 @@ class TestAttempt(models.Model):
                 'passed': False
             }
         
-        mandatory_correct = 0
-        optional_correct = 0
-        
-        mandatory_ids = set(self.test.mandatory_questions)
-        
-        for question_id_str, user_answer in self.user_answers.items():
-            try:
-                question_id = int(question_id_str)
-                question = Question.objects.get(id=question_id)
-                
-                # Gérer le format des réponses
-                if isinstance(user_answer, dict):
-                    user_answer = user_answer.get('answer')
-                
-                if user_answer is None:
-                    continue
-                
-                is_correct = question.check_answer(user_answer)
-                
-                if question_id in mandatory_ids:
-                    if is_correct:
-                        mandatory_correct += 1
-                else:
-                    if is_correct:
-                        optional_correct += 1
-                        
-            except (Question.DoesNotExist, ValueError):
-                continue
+        # Corrigé compilé: aucune requête par question
+        from .answer_key import get_answer_key
+        scores = get_answer_key(self.test).score(self.user_answers)
+        mandatory_correct = scores['mandatory_correct']
+        optional_correct = scores['optional_correct']
         
         # Réussite: toutes les questions obligatoires correctes
         passed = (mandatory_correct == self.mandatory_total)
@@ -429,3 +412,62 @@ class TestAttempt(models.Model):
             'optional': optional_correct,
             'passed': passed
         }
+
+
+
+class QuestionStats(models.Model):
+    """
+    Compteurs d'analyse par question, pour une version et une langue.
+    Incrémentés (F()) à chaque soumission, reconstruits depuis l'historique
+    par `manage.py rebuild_question_stats`.
+    """
+    
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='question_stats')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='stats')
+    langue = models.CharField(
+        max_length=2,
+        choices=[
+            ('ar', 'Arabe'),
+            ('fr', 'Français'),
+            ('en', 'Anglais'),
+        ],
+        verbose_name="Langue du test"
+    )
+    
+    # Question obligatoire dans cette version
+    is_mandatory = models.BooleanField(default=False, verbose_name="Question obligatoire")
+    
+    # Compteurs
+    seen_count = models.IntegerField(default=0, verbose_name="Tentatives soumises")
+    answered_count = models.IntegerField(default=0, verbose_name="Réponses données")
+    correct_count = models.IntegerField(default=0, verbose_name="Réponses correctes")
+    
+    class Meta:
+        verbose_name = "Statistiques de question"
+        verbose_name_plural = "Statistiques de questions"
+        ordering = ['test', 'langue', 'question']
+        unique_together = ['test', 'question', 'langue']
+        indexes = [
+            models.Index(fields=['test', 'langue']),
+        ]
+    
+    def __str__(self):
+        return f"V{self.test.version} {self.langue} - {self.question.question_code}"
+    
+    @property
+    def wrong_count(self):
+        return self.answered_count - self.correct_count
+    
+    @property
+    def unanswered_count(self):
+        return self.seen_count - self.answered_count
+    
+    @property
+    def success_rate(self):
+        """Indice de facilité: part des participants ayant bien répondu"""
+        return round(self.correct_count / self.seen_count * 100, 2) if self.seen_count > 0 else 0
+    
+    @property
+    def miss_rate(self):
+        """Part des participants ayant mal répondu ou pas répondu"""
+        return round(100 - self.success_rate, 2) if self.seen_count > 0 else 0
@@ -0,0 +1,108 @@
+# tests/question_bundle.py
+"""
+Paquet de questions pré-sérialisé par (version de test, langue).
+
+Le JSON des questions affichées au démarrage d'un test est identique pour
+tous les participants d'une même version et d'une même langue: il est
+construit une fois, encodé en octets (et compressé en gzip si
+QUESTION_BUNDLE_GZIP est actif), puis gardé en mémoire et dans le cache
+Django. L'ETag est l'empreinte du contenu, ce qui permet aux tablettes de
+ne pas retélécharger des questions qu'elles ont déjà. Comme pour les
+corrigés, la clé contient la version en base des questions
+(tests/cache_utils.py), pour qu'une question modifiée dans un autre
+processus ne soit pas servie périmée.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .cache_utils import current_generation, questions_stamp
+
+CACHE_PREFIX = 'tests:question_bundle'
+# Langues des paquets (énoncés enonce_ar / enonce_fr / enonce_en)
+LANGUES = ('ar', 'fr', 'en')
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_local_bundles = {}
+_local_lock = threading.Lock()
+
+
+class QuestionBundle:
+    """Questions d'une version dans une langue, déjà encodées"""
+
+    def __init__(self, version, langue, data, count):
+        self.version = version
+        self.langue = langue
+        # JSON (liste de questions) encodé en UTF-8
+        self.data = data
+        self.count = count
+        self.etag = '"%s"' % hashlib.sha1(data).hexdigest()
+        self.gzipped = gzip.compress(data) if getattr(settings, 'QUESTION_BUNDLE_GZIP', True) else None
+
+
+def build_question_bundle(test, langue):
+    """Construit le paquet de questions (sans les réponses correctes)"""
+    mandatory_ids = {str(qid) for qid in (test.mandatory_questions or [])}
+
+    questions_data = []
+    for question in test.get_questions_in_order():
+        questions_data.append({
+            'id': question.id,
+            'question_code': question.question_code,
+            'enonce': question.get_enonce(langue),
+            'is_mandatory': str(question.id) in mandatory_ids,
+            'points': question.points,
+            'has_image': question.has_image,
+            'image_url': question.image.url if question.image else None
+        })
+
+    data = json.dumps(questions_data, cls=DjangoJSONEncoder).encode('utf-8')
+    return QuestionBundle(test.version, langue, data, len(questions_data))
+
+
+def _cache_key(test, langue, generation, stamp):
+    updated_at = test.updated_at.timestamp() if test.updated_at else 0
+    return f'{CACHE_PREFIX}:v{test.version}:{langue}:{updated_at}:{generation}:{stamp}'
+
+
+def get_question_bundle(test, langue):
+    """Retourne le paquet de questions (mémoire → cache Django → base)"""
+    key = _cache_key(test, langue, current_generation(), questions_stamp(test))
+
+    bundle = _local_bundles.get(key)
+    if bundle is not None:
+        return bundle
+
+    bundle = cache.get(key)
+    if bundle is None:
+        bundle = build_question_bundle(test, langue)
+        cache.set(key, bundle, CACHE_TIMEOUT)
+
+    with _local_lock:
+        prefix = f'{CACHE_PREFIX}:v{test.version}:{langue}:'
+        for stale in [k for k in _local_bundles if k.startswith(prefix)]:
+            del _local_bundles[stale]
+        _local_bundles[key] = bundle
+
+    return bundle
+
+
+def invalidate_question_bundles():
+    """Vide les paquets gardés en mémoire dans ce processus"""
+    with _local_lock:
+        _local_bundles.clear()
+
+
+def splice_json(payload, field, raw_json):
+    """
+    Encode `payload` puis y insère `raw_json` (octets déjà encodés) sous la
+    clé `field`, sans décoder ni ré-encoder le paquet.
+    """
+    head = json.dumps(payload, cls=DjangoJSONEncoder).encode('utf-8')
+    separator = b', ' if payload else b''
+    return head[:-1] + separator + json.dumps(field).encode('utf-8') + b': ' + raw_json + b'}'
@@ -0,0 +1,280 @@
+# tests/rescoring.py
+"""
+Recalcul en masse des scores des tentatives après une correction du corrigé.
+
+Les tentatives sont chargées par paquets, leurs `user_answers` sont
+converties en matrices booléennes NumPy (une ligne par tentative, une
+colonne par question) et tout le paquet est noté en une seule passe
+vectorisée contre le corrigé compilé, puis réécrit avec `bulk_update`.
+Comme à la soumission, une réponse à une question existante hors de la
+version compte comme facultative (colonnes ajoutées au paquet).
+
+Dans la même transaction que chaque paquet, ce qui découle de la réussite
+est remis en cohérence: certificats émis ou retirés quand la réussite
+change, HSEUser (score, réussite) des participants dont c'est la dernière
+tentative. Les statistiques des questions sont ensuite reconstruites.
+"""
+import numpy as np
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Test, TestAttempt, normalize_answer
+from .answer_key import compile_answer_key
+from certificats.issuing import issue_certificate
+from certificats.models import Certificate
+from hse_app.models import HSEUser
+
+DEFAULT_CHUNK_SIZE = 500
+
+SCORE_FIELDS = [
+    'mandatory_correct', 'mandatory_wrong', 'mandatory_total',
+    'optional_correct', 'optional_wrong', 'optional_total',
+    'mandatory_score_percentage', 'optional_score_percentage',
+    'overall_score_percentage', 'passed', 'status',
+]
+
+
+def answer_matrices(attempts, question_ids):
+    """
+    Convertit les réponses d'un paquet de tentatives en deux matrices
+    (n_tentatives x n_questions):
+    - answered: la question a reçu une réponse lisible
+    - given: la réponse donnée (True = Vrai)
+    """
+    columns = {question_id: index for index, question_id in enumerate(question_ids)}
+    answered = np.zeros((len(attempts), len(question_ids)), dtype=bool)
+    given = np.zeros((len(attempts), len(question_ids)), dtype=bool)
+
+    for row, attempt in enumerate(attempts):
+        for question_id_str, user_answer in (attempt.user_answers or {}).items():
+            try:
+                column = columns.get(int(question_id_str))
+            except (TypeError, ValueError):
+                continue
+            if column is None:
+                continue
+
+            user_bool = normalize_answer(user_answer)
+            if user_bool is None:
+                continue
+
+            answered[row, column] = True
+            given[row, column] = user_bool
+
+    return answered, given
+
+
+def answered_question_ids(attempts):
+    """Ids (entiers) de toutes les questions répondues dans le paquet"""
+    question_ids = set()
+    for attempt in attempts:
+        for question_id_str in (attempt.user_answers or {}):
+            try:
+                question_ids.add(int(question_id_str))
+            except (TypeError, ValueError):
+                continue
+    return question_ids
+
+
+def _percentages(correct, total):
+    if total <= 0:
+        return np.zeros(correct.shape)
+    return np.round(correct / total * 100, 2)
+
+
+def score_chunk(attempts, answer_key):
+    """Note un paquet de tentatives en une passe vectorisée"""
+    extra = answer_key.extra_answers(answered_question_ids(attempts))
+    correct_answers = {**extra, **answer_key.correct_answers}
+    question_ids = sorted(correct_answers)
+    answered, given = answer_matrices(attempts, question_ids)
+
+    expected = np.array([correct_answers[qid] for qid in question_ids], dtype=bool)
+    mandatory_mask = np.array([qid in answer_key.mandatory_ids for qid in question_ids], dtype=bool)
+
+    correct = answered & (given == expected)
+    mandatory_correct = (correct & mandatory_mask).sum(axis=1)
+    optional_correct = (correct & ~mandatory_mask).sum(axis=1)
+
+    mandatory_total = answer_key.mandatory_total
+    optional_total = answer_key.optional_total
+    total_questions = answer_key.total_questions
+
+    return {
+        'mandatory_correct': mandatory_correct,
+        'optional_correct': optional_correct,
+        'mandatory_percentage': _percentages(mandatory_correct, mandatory_total),
+        'optional_percentage': _percentages(optional_correct, optional_total),
+        'overall_percentage': _percentages(mandatory_correct + optional_correct, total_questions),
+        'passed': mandatory_correct == mandatory_total,
+    }
+
+
+def _apply_chunk(attempts, answer_key, scores):
+    """Reporte les scores sur les objets; retourne les changements de réussite"""
+    changes = []
+    mandatory_total = answer_key.mandatory_total
+    optional_total = answer_key.optional_total
+
+    for row, attempt in enumerate(attempts):
+        old_passed = attempt.passed
+        mandatory_correct = int(scores['mandatory_correct'][row])
+        optional_correct = int(scores['optional_correct'][row])
+
+        attempt.mandatory_correct = mandatory_correct
+        attempt.mandatory_wrong = mandatory_total - mandatory_correct
+        attempt.mandatory_total = mandatory_total
+        attempt.optional_correct = optional_correct
+        attempt.optional_wrong = optional_total - optional_correct
+        attempt.optional_total = optional_total
+        attempt.mandatory_score_percentage = float(scores['mandatory_percentage'][row])
+        attempt.optional_score_percentage = float(scores['optional_percentage'][row])
+        attempt.overall_score_percentage = float(scores['overall_percentage'][row])
+        attempt.passed = bool(scores['passed'][row])
+        attempt.status = 'passed' if attempt.passed else 'failed'
+
+        if attempt.passed != old_passed:
+            changes.append({
+                'attempt_id': attempt.id,
+                'user_id': attempt.user_id,
+                'test_version': answer_key.version,
+                'old_passed': old_passed,
+                'new_passed': attempt.passed,
+                'overall_score_percentage': attempt.overall_score_percentage,
+            })
+
+    return changes
+
+
+def _sync_certificates(test, attempts, changes):
+    """
+    Émet le certificat des tentatives devenues réussies, retire celui des
+    tentatives devenues échouées (le PDF est supprimé après validation).
+    Retourne (émis, retirés).
+    """
+    if not changes:
+        return 0, 0
+    by_id = {attempt.id: attempt for attempt in attempts}
+
+    issued = 0
+    for change in changes:
+        if change['new_passed']:
+            attempt = by_id[change['attempt_id']]
+            attempt.test = test
+            issue_certificate(attempt)
+            issued += 1
+
+    failed_ids = [change['attempt_id'] for change in changes if not change['new_passed']]
+    revoked = Certificate.objects.filter(test_attempt_id__in=failed_ids)
+    pdf_names = [name for name in revoked.values_list('pdf_file', flat=True) if name]
+    revoked_count, _ = revoked.delete()
+    if pdf_names:
+        transaction.on_commit(lambda: [default_storage.delete(name) for name in pdf_names])
+
+    return issued, revoked_count
+
+
+def _sync_hse_users(attempts):
+    """
+    Reporte score et réussite sur l'HSEUser des participants dont la
+    tentative du paquet est la dernière terminée (comme sync_hse_user).
+    """
+    latest_attempt = TestAttempt.objects.filter(
+        user_id=OuterRef('user_id'),
+        completed_at__isnull=False
+    ).order_by('-completed_at', '-id').values('id')[:1]
+
+    by_id = {attempt.id: attempt for attempt in attempts}
+    rows = TestAttempt.objects.filter(id__in=by_id).annotate(
+        latest_id=Subquery(latest_attempt)
+    ).filter(id=F('latest_id')).values_list('id', 'user__cin')
+    latest = {cin: by_id[attempt_id] for attempt_id, cin in rows}
+
+    hse_users = list(HSEUser.objects.filter(cin__in=latest).only('id', 'cin'))
+    now = timezone.now()
+    for hse_user in hse_users:
+        attempt = latest[hse_user.cin]
+        hse_user.score = attempt.overall_score_percentage
+        hse_user.reussite = attempt.passed
+        hse_user.updated_at = now
+    HSEUser.objects.bulk_update(hse_users, ['score', 'reussite', 'updated_at'])
+    return len(hse_users)
+
+
+def rescore_test(test, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Recalcule toutes les tentatives terminées d'une version de test, puis
+    (hors dry_run) certificats, HSEUser et statistiques des questions.
+    Retourne {'version', 'rescored', 'changed': [...], 'certificates_issued',
+    'certificates_revoked', 'hse_users_synced'}.
+    """
+    # Import local: item_stats dépend de ce module
+    from .item_stats import rebuild_test_stats
+
+    # Corrigé recompilé depuis la base, pas depuis le cache
+    answer_key = compile_answer_key(test)
+
+    attempts_qs = TestAttempt.objects.filter(
+        test=test,
+        completed_at__isnull=False
+    ).only('id', 'user_id', 'passed', 'user_answers').order_by('id')
+
+    rescored = 0
+    changed = []
+    issued = revoked = synced = 0
+    last_id = 0
+
+    while True:
+        attempts = list(attempts_qs.filter(id__gt=last_id)[:chunk_size])
+        if not attempts:
+            break
+        last_id = attempts[-1].id
+
+        scores = score_chunk(attempts, answer_key)
+        changes = _apply_chunk(attempts, answer_key, scores)
+        changed.extend(changes)
+
+        if not dry_run:
+            with transaction.atomic():
+                TestAttempt.objects.bulk_update(attempts, SCORE_FIELDS)
+                chunk_issued, chunk_revoked = _sync_certificates(test, attempts, changes)
+                issued += chunk_issued
+                revoked += chunk_revoked
+                synced += _sync_hse_users(attempts)
+
+        rescored += len(attempts)
+
+    if not dry_run:
+        rebuild_test_stats(test, chunk_size=chunk_size)
+
+    return {
+        'version': test.version,
+        'rescored': rescored,
+        'changed': changed,
+        'certificates_issued': issued,
+        'certificates_revoked': revoked,
+        'hse_users_synced': synced,
+    }
+
+
+def rescore_tests(tests=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """Recalcule les tentatives de plusieurs versions (toutes par défaut)"""
+    if tests is None:
+        tests = Test.objects.all()
+
+    results = [rescore_test(test, chunk_size=chunk_size, dry_run=dry_run) for test in tests]
+
+    return {
+        'dry_run': dry_run,
+        'rescored': sum(result['rescored'] for result in results),
+        'changed': [change for result in results for change in result['changed']],
+        'certificates_issued': sum(result['certificates_issued'] for result in results),
+        'certificates_revoked': sum(result['certificates_revoked'] for result in results),
+        'hse_users_synced': sum(result['hse_users_synced'] for result in results),
+        'by_version': [
+            {'version': result['version'], 'rescored': result['rescored'], 'changed': len(result['changed'])}
+            for result in results
+        ],
+    }
@@ -0,0 +1,19 @@
+# tests/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Test, Question
+from .cache_utils import bump_generation
+from .answer_key import invalidate_answer_keys
+from .question_bundle import invalidate_question_bundles
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Test)
+@receiver(post_delete, sender=Test)
+def invalidate_test_caches(sender, **kwargs):
+    """Une question ou un test a changé: corrigés et paquets de questions sont périmés"""
+    bump_generation()
+    invalidate_answer_keys()
+    invalidate_question_bundles()
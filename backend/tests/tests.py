@@ -1,3 +1,179 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+from django.utils import timezone
+
+from authentication.models import TestUser
+from tests.models import Test, Question, TestAttempt, QuestionStats
+from tests.answer_key import get_answer_key
+from tests.item_stats import record_attempt_stats, rebuild_test_stats
+from tests.question_bundle import get_question_bundle
+from tests.rescoring import rescore_test
+from tests.views_api import TestViewSet, TestAttemptViewSet, user_test_attempts
+from certificats.models import Certificate
+from hse_app.models import HSEUser
+from hse_app.testing import QueryBudgetMixin, build_dataset
+
+
+class TestsViewSetsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Budgets de requêtes SQL des vues tests/views_api.py"""
+
+    QUERY_BUDGETS = {
+        'tests_list': 1,
+        'tests_retrieve': 4,
+        'tests_results': 4,
+        'tests_question_stats': 2,
+        'attempts_list': 1,
+        'attempts_retrieve': 1,
+        'attempts_start': 3,
+        'attempts_submit': 11,
+        'user_test_attempts': 3,
+    }
+    EXPECTED_STATUS = {
+        'attempts_start': 201,
+    }
+
+    def endpoints(self, data):
+        pending = TestAttempt.objects.create(test=data.test, user=data.newcomer, langue='fr')
+        return {
+            'tests_list': self.api(TestViewSet.as_view({'get': 'list'}), data.staff),
+            'tests_retrieve': self.api(TestViewSet.as_view({'get': 'retrieve'}), data.staff, pk=data.test.id),
+            'tests_results': self.api(TestViewSet.as_view({'get': 'results'}), data.staff, pk=data.test.id),
+            'tests_question_stats': self.api(TestViewSet.as_view({'get': 'question_stats'}), data.staff, payload={'langue': 'fr'}, pk=data.test.id),
+            'attempts_list': self.api(TestAttemptViewSet.as_view({'get': 'list'}), data.participant),
+            'attempts_retrieve': self.api(TestAttemptViewSet.as_view({'get': 'retrieve'}), data.participant, pk=data.attempt.id),
+            'attempts_start': self.api(TestAttemptViewSet.as_view({'post': 'start'}), data.staff, method='post',
+                                       payload={'test_id': data.test.id, 'langue': 'fr'}),
+            'attempts_submit': self.api(TestAttemptViewSet.as_view({'post': 'submit'}), data.newcomer, method='post',
+                                        payload={'user_answers': data.answers}, pk=pending.id),
+            'user_test_attempts': self.api(user_test_attempts, data.participant),
+        }
+
+
+class AnswerKeyTests(TestCase):
+    """Notation par le corrigé compilé et invalidation de son cache"""
+
+    def setUp(self):
+        self.questions = Question.objects.bulk_create([
+            Question(question_code=f'K{index}', enonce_fr=f'Question {index}', reponse_correcte=True)
+            for index in range(4)
+        ])
+        in_test = [question.id for question in self.questions[:3]]
+        self.extra = self.questions[3]
+        self.test = Test.objects.create(version=7, ordre_questions=in_test, mandatory_questions=in_test[:1])
+
+    def test_answers_outside_version_count_as_optional(self):
+        answers = {str(question.id): True for question in self.questions}
+        answers['999999'] = True  # question inexistante: ignorée
+
+        scores = get_answer_key(self.test).score(answers)
+
+        self.assertEqual(scores['mandatory_correct'], 1)
+        self.assertEqual(scores['optional_correct'], 3)
+        self.assertTrue(scores['passed'])
+
+        # Recalcul en masse: même notation
+        user = TestUser.objects.create(cin='KEY001', username='user_KEY001', password='!')
+        attempt = TestAttempt.objects.create(test=self.test, user=user, langue='fr', user_answers=answers,
+                                             completed_at=timezone.now())
+        rescore_test(self.test)
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.mandatory_correct, attempt.optional_correct), (1, 3))
+
+    def test_key_follows_question_change_from_another_process(self):
+        question = self.questions[0]
+        answers = {str(question.id): True}
+        self.assertEqual(get_answer_key(self.test).score(answers)['mandatory_correct'], 1)
+        bundle = get_question_bundle(self.test, 'fr')
+
+        # UPDATE direct: ni signal ni génération incrémentée, comme une
+        # modification faite dans un autre processus
+        Question.objects.filter(id=question.id).update(
+            reponse_correcte=False,
+            enonce_fr='Question corrigée',
+            updated_at=question.updated_at + timedelta(seconds=1),
+        )
+
+        # Requête suivante: test relu depuis la base
+        test = Test.objects.get(id=self.test.id)
+        self.assertEqual(get_answer_key(test).score(answers)['mandatory_correct'], 0)
+        self.assertNotEqual(get_question_bundle(test, 'fr').etag, bundle.etag)
+
+
+class RescoringTests(TestCase):
+    """Recalcul des scores: certificats, HSEUser et statistiques remis en cohérence"""
+
+    def setUp(self):
+        self.data = build_dataset(4)
+        self.question = Question.objects.get(id=self.data.test.mandatory_questions[0])
+
+    def test_rescore_syncs_dependents(self):
+        passed = self.data.attempt  # réussie, avec certificat
+        failed = TestAttempt.objects.filter(test=self.data.test, passed=False).select_related('user').first()
+        wrong = not self.question.reponse_correcte
+        # Réponses alignées sur le corrigé, sauf la 1re obligatoire pour `passed`
+        correct = {str(question.id): question.reponse_correcte for question in Question.objects.all()}
+        TestAttempt.objects.filter(test=self.data.test).update(user_answers=correct)
+        TestAttempt.objects.filter(id=passed.id).update(user_answers={**correct, str(self.question.id): wrong})
+        newly_passed = TestAttempt.objects.filter(test=self.data.test, passed=False).count()
+
+        result = rescore_test(self.data.test)
+
+        self.assertEqual(result['certificates_revoked'], 1)
+        self.assertEqual(result['certificates_issued'], newly_passed)
+        self.assertFalse(Certificate.objects.filter(test_attempt=passed).exists())
+        self.assertTrue(Certificate.objects.filter(test_attempt=failed).exists())
+        self.assertFalse(HSEUser.objects.get(cin=passed.user.cin).reussite)
+        self.assertTrue(HSEUser.objects.get(cin=failed.user.cin).reussite)
+
+        stats = QuestionStats.objects.get(test=self.data.test, question=self.question, langue='fr')
+        self.assertEqual(stats.correct_count, TestAttempt.objects.filter(test=self.data.test).count() - 1)
+
+
+class ItemStatsRebuildTests(TestCase):
+    """Reconstruction des statistiques: mêmes compteurs que les incréments, lignes réécrites en place"""
+
+    def test_rebuild_matches_increments(self):
+        data = build_dataset(4)
+        attempt = TestAttempt.objects.create(test=data.test, user=data.newcomer, langue='ar',
+                                             user_answers=data.answers, completed_at=timezone.now())
+        record_attempt_stats(attempt)
+        incremental = {
+            (row.id, row.question_id, row.langue): (row.seen_count, row.answered_count, row.correct_count)
+            for row in QuestionStats.objects.filter(test=data.test)
+        }
+
+        rebuild_test_stats(data.test)
+
+        rebuilt = {
+            (row.id, row.question_id, row.langue): (row.seen_count, row.answered_count, row.correct_count)
+            for row in QuestionStats.objects.filter(test=data.test)
+        }
+        self.assertEqual(rebuilt, incremental)
+
+
+class AttemptSubmitTests(TestCase):
+    """Soumission par l'API REST: une tentative n'est notée et comptée qu'une fois"""
+
+    def test_second_submit_is_rejected_and_not_counted(self):
+        data = build_dataset(4)
+        attempt = TestAttempt.objects.create(test=data.test, user=data.newcomer, langue='fr')
+        view = TestAttemptViewSet.as_view({'post': 'submit'})
+
+        def submit():
+            request = APIRequestFactory().post('/', {'user_answers': data.answers}, format='json')
+            force_authenticate(request, user=data.newcomer)
+            return view(request, pk=attempt.id)
+
+        def seen():
+            return dict(QuestionStats.objects.filter(test=data.test, langue='fr').values_list('question_id', 'seen_count'))
+
+        before = seen()
+        self.assertEqual(submit().status_code, 200)
+        after = seen()
+        self.assertTrue(after)
+        self.assertEqual(after, {question_id: before.get(question_id, 0) + 1 for question_id in after})
 
-# Create your tests here.
+        self.assertEqual(submit().status_code, 400)
+        self.assertEqual(seen(), after)
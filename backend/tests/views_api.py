@@ -3,9 +3,11 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.utils import timezone
 
 from .models import Test, TestAttempt, Question
+from .item_stats import record_attempt_stats, question_stats_payload
 from .serializers_api import (
     TestListSerializer, TestDetailSerializer, TestCreateUpdateSerializer,
     TestAttemptListSerializer, TestAttemptDetailSerializer,
@@ -29,6 +31,7 @@ class TestViewSet(viewsets.ModelViewSet):
     - PATCH /api/tests/{id}/ - Modification partielle (Admin seulement)
     - DELETE /api/tests/{id}/ - Supprimer un test (Admin seulement)
     - GET /api/tests/{id}/results/ - Résultats du test
+    - GET /api/tests/{id}/question-stats/ - Analyse des questions (Admin seulement)
     """
     
     queryset = Test.objects.filter(is_active=True)
@@ -69,7 +72,7 @@ class TestViewSet(viewsets.ModelViewSet):
     def results(self, request, pk=None):
         """Récupérer les résultats d'un test"""
         test = self.get_object()
-        attempts = TestAttempt.objects.filter(test=test, status='passed').order_by('-completed_at')
+        attempts = TestAttempt.objects.filter(test=test, status='passed').select_related('test', 'user').order_by('-completed_at')
         
         serializer = TestAttemptListSerializer(attempts, many=True)
         
@@ -84,6 +87,29 @@ class TestViewSet(viewsets.ModelViewSet):
             'pass_rate': round((passed_attempts / total_attempts * 100) if total_attempts > 0 else 0, 1),
             'results': serializer.data
         })
+    
+    @action(detail=True, methods=['get'], url_path='question-stats')
+    def question_stats(self, request, pk=None):
+        """Taux de réussite / d'échec par question (compteurs incrémentaux)"""
+        if not request.user.is_staff:
+            return Response({
+                'success': False,
+                'error': 'Accès refusé'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        test = self.get_object()
+        langue = request.query_params.get('langue')
+        questions = question_stats_payload(test, langue)
+        
+        # Les questions les plus ratées en premier
+        questions.sort(key=lambda item: item['miss_rate'], reverse=True)
+        
+        return Response({
+            'success': True,
+            'test_version': test.version,
+            'langue': langue,
+            'questions': questions
+        })
 
 
 # =============================================================================
@@ -115,7 +141,7 @@ class TestAttemptViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Retourner uniquement les tentatives de l'utilisateur actuel"""
-        return TestAttempt.objects.filter(user=self.request.user).order_by('-started_at')
+        return TestAttempt.objects.filter(user=self.request.user).select_related('test', 'user').order_by('-started_at')
     
     @action(detail=False, methods=['post'])
     def start(self, request):
@@ -177,38 +203,45 @@ class TestAttemptViewSet(viewsets.ModelViewSet):
                 'error': 'Accès refusé'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Vérifier que la tentative est en cours
-        if attempt.status != 'in_progress':
-            return Response({
-                'success': False,
-                'error': 'Cette tentative n\'est pas en cours'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         user_answers = serializer.validated_data['user_answers']
         time_taken = serializer.validated_data.get('time_taken_seconds', 0)
         
-        # Stocker les réponses
-        attempt.user_answers = user_answers
-        attempt.time_taken_seconds = time_taken
-        attempt.completed_at = timezone.now()
-        
-        # Calculer les scores
-        scores = attempt.calculate_scores()
-        
-        attempt.mandatory_correct = scores['mandatory']
-        attempt.optional_correct = scores['optional']
-        attempt.passed = scores['passed']
-        attempt.status = 'passed' if scores['passed'] else 'failed'
-        
-        # Calculer les pourcentages
-        attempt.mandatory_score_percentage = (scores['mandatory'] / attempt.mandatory_total * 100) if attempt.mandatory_total > 0 else 0
-        attempt.optional_score_percentage = (scores['optional'] / attempt.optional_total * 100) if attempt.optional_total > 0 else 0
-        attempt.overall_score_percentage = ((scores['mandatory'] + scores['optional']) / (attempt.mandatory_total + attempt.optional_total) * 100) if (attempt.mandatory_total + attempt.optional_total) > 0 else 0
-        
-        attempt.save()
+        with transaction.atomic():
+            # Relire la tentative verrouillée: deux soumissions simultanées
+            # ne peuvent pas passer toutes les deux la vérification du statut
+            # (et compter deux fois dans les statistiques)
+            attempt = TestAttempt.objects.select_for_update(of=('self',)).select_related('test').get(pk=attempt.pk)
+            
+            # Vérifier que la tentative est en cours
+            if attempt.status != 'in_progress':
+                return Response({
+                    'success': False,
+                    'error': 'Cette tentative n\'est pas en cours'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Stocker les réponses
+            attempt.user_answers = user_answers
+            attempt.time_taken_seconds = time_taken
+            attempt.completed_at = timezone.now()
+            
+            # Calculer les scores
+            scores = attempt.calculate_scores()
+            
+            attempt.mandatory_correct = scores['mandatory']
+            attempt.optional_correct = scores['optional']
+            attempt.passed = scores['passed']
+            attempt.status = 'passed' if scores['passed'] else 'failed'
+            
+            # Calculer les pourcentages
+            attempt.mandatory_score_percentage = (scores['mandatory'] / attempt.mandatory_total * 100) if attempt.mandatory_total > 0 else 0
+            attempt.optional_score_percentage = (scores['optional'] / attempt.optional_total * 100) if attempt.optional_total > 0 else 0
+            attempt.overall_score_percentage = ((scores['mandatory'] + scores['optional']) / (attempt.mandatory_total + attempt.optional_total) * 100) if (attempt.mandatory_total + attempt.optional_total) > 0 else 0
+            
+            attempt.save()
+            record_attempt_stats(attempt)
         
         # Mettre à jour le score de l'utilisateur HSE si lié
         try:
@@ -234,7 +267,7 @@ class TestAttemptViewSet(viewsets.ModelViewSet):
 @permission_classes([permissions.IsAuthenticated])
 def user_test_attempts(request):
     """Récupérer toutes les tentatives de l'utilisateur"""
-    attempts = TestAttempt.objects.filter(user=request.user).order_by('-started_at')
+    attempts = TestAttempt.objects.filter(user=request.user).select_related('test', 'user').order_by('-started_at')
     
     serializer = TestAttemptListSerializer(attempts, many=True)
     
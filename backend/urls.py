@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.http import HttpResponseRedirect
 from authentication import views
+from hse_app.urls import participant_urlpatterns
 
 # Fonction pour rediriger vers le front-end React
 def redirect_to_front(request):
@@ -19,7 +20,8 @@ urlpatterns = [
     # AUTHENTIFICATION API
     path('api/auth/', include('authentication.urls')),
 
-    # HSE API
+    # HSE API (parcours participant d'abord: le routeur capte users/<pk>/)
+    path('api/hse/', include(participant_urlpatterns)),
     path('api/hse/', include('hse_app.urls_api')),
 
     # TESTS API
@@ -4,6 +4,7 @@ import axios from "axios";
 export default function Database() {
   const [selectedFile, setSelectedFile] = useState(null);
   const [tableData, setTableData] = useState([]);
+  const [upload, setUpload] = useState(null);
 
   const triggerFileDialog = () => {
     document.getElementById("excelInput").click();
@@ -33,6 +34,7 @@ export default function Database() {
 
       if (res.data.success) {
         setTableData(res.data.data);
+        setUpload(res.data);
       } else {
         alert("Réponse backend : " + JSON.stringify(res.data, null, 2));
         console.log("🔥 Réponse complète du backend :", res.data);
@@ -43,6 +45,17 @@ export default function Database() {
     }
   };
 
+  // Pages suivantes du fichier gardé côté serveur (rows_url)
+  const loadMore = async () => {
+    const res = await axios.get(`http://127.0.0.1:8000${upload.rows_url}`, {
+      params: { page: upload.pagination.page + 1 },
+    });
+    if (res.data.success) {
+      setTableData((rows) => [...rows, ...res.data.data]);
+      setUpload(res.data);
+    }
+  };
+
   return (
     <div className="min-h-screen bg-gradient-to-br from-green-50 to-green-300 p-10">
 
@@ -151,6 +164,15 @@ export default function Database() {
           {tableData.length === 0 && (
             <p className="text-gray-500 italic">Aucune donnée importée.</p>
           )}
+
+          {upload && upload.pagination.has_next && (
+            <button
+              onClick={loadMore}
+              className="mt-4 bg-green-700 text-white px-4 py-2 rounded-lg"
+            >
+              Charger plus ({tableData.length} / {upload.pagination.total_count})
+            </button>
+          )}
         </div>
 
       </div>